@@ -1,3 +1,8 @@
+import click
+import copy
+import functools
+import os
+from apscheduler.schedulers.background import BackgroundScheduler
 from flask import Flask
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
@@ -25,35 +30,43 @@ login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
 login_manager.login_message = 'Faça login para acessar.'
 
-def create_app(config_class=Config):
-    app = Flask(__name__)
-    app.config.from_object(config_class)
+def start_background_jobs(app):
+    """
+    Registra os jobs do APScheduler e inicia o scheduler e o motor de conclusões.
+    Chamado pelo create_app (SCHEDULER_IN_WEB) ou pelo comando 'flask run-worker'.
+    Idempotente: não faz nada se o scheduler já estiver rodando neste processo.
+    """
+    if scheduler.running:
+        return
 
-    # Inicializa as extensões com a aplicação
-    db.init_app(app)
-    login_manager.init_app(app)
-    bcrypt.init_app(app)
-    migrate.init_app(app, db)
-    bootstrap.init_app(app)
-
-    from app.background_tasks import (run_core_status_updates, replenish_resources, 
+    from app.background_tasks import (run_core_status_updates, 
                                   check_vehicle_validity, cleanup_expired_market_orders)
 
-    scheduler.init_app(app)
-    scheduler.start()
-    # 1. JOB DE RECARGA DE RECURSOS (6 HORAS) - MANTIDO SEPARADO
-    if not scheduler.get_job('resource_replenishment'):
-        scheduler.add_job(id='resource_replenishment', 
-                          func=replenish_resources, 
-                          args=[app], 
-                          trigger='interval', 
-                          hours=6,
-                          name='Recarga de Reservas de Recursos')
-                          
-    # 2. JOB MESTRE DE STATUS (CONSOLIDA OS 3 JOBS DE 60 SEGUNDOS)
+    # Com eleição de líder o scheduler nasce pausado: só o processo líder o retoma,
+    # e os jobs só conseguem fazer commit enquanto a concessão dele valer (fencing)
+    eleicao_de_lider = app.config.get('SCHEDULER_LEADER_ELECTION', False)
+    from app.leader_election import leader_election
+    protegido = leader_election.fenced if eleicao_de_lider else (lambda job: job)
+
+    # 'gunicorn --preload': o create_app roda no master, e as threads iniciadas aqui não
+    # atravessam o fork dos workers. Cada worker recomeça os jobs com o seu próprio estado.
+    # Registrado antes do init_app, que consome as configurações de executores e jobstores.
+    global _reinicio_apos_fork_registrado
+    if not _reinicio_apos_fork_registrado:
+        configuracao = {chave: copy.deepcopy(app.config[chave])
+                        for chave in ('SCHEDULER_EXECUTORS', 'SCHEDULER_JOBSTORES') if chave in app.config}
+        os.register_at_fork(after_in_child=functools.partial(_reiniciar_jobs_apos_fork, app, configuracao))
+        _reinicio_apos_fork_registrado = True
+
+    if scheduler.app is not app:
+        scheduler.init_app(app)
+    scheduler.start(paused=eleicao_de_lider)
+    # As reservas das regiões se recarregam sob demanda (Regiao.calcular_reserva), sem job
+
+    # 1. JOB MESTRE DE STATUS (CONSOLIDA OS 3 JOBS DE 60 SEGUNDOS)
     if not scheduler.get_job('core_status_update'):
         scheduler.add_job(id='core_status_update', 
-                          func=run_core_status_updates, 
+                          func=protegido(run_core_status_updates), 
                           args=[app],
                           trigger='interval', 
                           seconds=60, # Frequência de 1 minuto
@@ -61,7 +74,7 @@ def create_app(config_class=Config):
     
     if not scheduler.get_job('vehicle_validity_check'):
         scheduler.add_job(id='vehicle_validity_check', 
-                          func=check_vehicle_validity, 
+                          func=protegido(check_vehicle_validity), 
                           args=[app],
                           trigger='interval', 
                           hours=1, # 1 hora para testes
@@ -69,11 +82,108 @@ def create_app(config_class=Config):
     
     if not scheduler.get_job('market_order_cleanup'):
         scheduler.add_job(id='market_order_cleanup', 
-                        func=cleanup_expired_market_orders, 
+                        func=protegido(cleanup_expired_market_orders), 
                         args=[app],
                         trigger='interval', 
                         minutes=15, # Roda a cada 15 minutos
                         name='Limpeza de Ordens de Mercado Expiradas')
+
+    # 2. MOTOR DE CONCLUSÕES (treinos, viagens, colheitas... no prazo exato)
+    from app.completion_engine import completion_engine
+    completion_engine.init_app(app, proteger=protegido)
+
+    def iniciar_motor_de_conclusoes():
+        if app.config.get('COMPLETION_ENGINE') != 'heap':
+            return
+        try:
+            completion_engine.start()
+        except Exception as e:
+            # Sem o motor (ex: banco ainda não criado), o tick volta a varrer os prazos
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Motor de conclusões não iniciado: {e}")
+
+    def assumir_jobs():
+        scheduler.resume()
+        iniciar_motor_de_conclusoes()
+
+    def liberar_jobs():
+        if scheduler.running:
+            scheduler.pause()
+        completion_engine.shutdown()
+
+    if eleicao_de_lider:
+        # Vários workers: o líder (concessão no banco) roda os jobs e o motor; os demais esperam
+        leader_election.init_app(app, ao_assumir=assumir_jobs, ao_perder=liberar_jobs)
+        leader_election.start()
+    else:
+        iniciar_motor_de_conclusoes()
+
+_reinicio_apos_fork_registrado = False
+
+def _reiniciar_jobs_apos_fork(app, configuracao):
+    """
+    Roda no processo filho logo após o fork. Descarta o scheduler, a eleição de líder e o
+    motor de conclusões herdados (as threads deles ficaram no pai) e os inicia de novo:
+    nova identidade na eleição, nova thread de renovação, heap recarregado do banco.
+    """
+    from app.completion_engine import completion_engine
+    from app.leader_election import leader_election
+
+    # Conexões abertas pelo pai não podem ser usadas pelo filho
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    # O APScheduler não reinicia depois de parado: o worker monta um novo com a mesma configuração
+    app.config.update(copy.deepcopy(configuracao))
+    scheduler._scheduler = BackgroundScheduler()
+    scheduler._load_config()
+    leader_election.reset_after_fork()
+    completion_engine.reset_after_fork()
+    start_background_jobs(app)
+
+def _em_comando_cli():
+    """True dentro de um comando do 'flask' (db upgrade, init-db, gen-world...), exceto o servidor 'flask run'."""
+    contexto = click.get_current_context(silent=True)
+    return contexto is not None and contexto.info_name != 'run'
+
+def create_app(config_class=Config):
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    # Inicializa as extensões com a aplicação
+    db.init_app(app)
+    login_manager.init_app(app)
+    bcrypt.init_app(app)
+    migrate.init_app(app, db)
+    bootstrap.init_app(app)
+
+    # SQLite: BEGIN explícito, para que os SAVEPOINTs fiquem dentro da transação do lote
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            from app.transacoes import habilitar_savepoints_sqlite
+            habilitar_savepoints_sqlite(db.engine)
+
+    # Jobs em segundo plano: só no 'flask run-worker', ou no processo web se SCHEDULER_IN_WEB
+    # (nunca nos outros comandos do 'flask', que não devem disputar o banco com o tick)
+    if app.config.get('SCHEDULER_IN_WEB', False) and not _em_comando_cli():
+        start_background_jobs(app)
+
+    # Métricas do tick (buffer circular + espelho no banco para o painel do admin)
+    from app.tick_metrics import tick_metrics
+    tick_metrics.init_app(app)
+
+    # Livro de ofertas em memória (carregado do MarketOrder na primeira consulta)
+    from app.order_book import order_book
+    order_book.init_app(app)
+
+    # Escada de profundidade do mercado (níveis de preço em cache, invalidados por nível)
+    from app.market_depth import market_depth
+    market_depth.init_app(app)
+
+    # 4. GRAVADOR DO HISTÓRICO (INSERTs em lote, fora das transações do jogo)
+    if app.config.get('HISTORY_WRITE_MODE') == 'buffered':
+        from app.history_writer import history_writer
+        history_writer.init_app(app)
+        history_writer.start()
         
     ACAO_MAP = {
         'MINERACAO': 'Mineração',
@@ -169,6 +279,11 @@ def create_app(config_class=Config):
 
     from app import cli_commands
     app.cli.add_command(cli_commands.init_db_command)
+    app.cli.add_command(cli_commands.run_worker_command)
+    app.cli.add_command(cli_commands.bench_indexes_command)
+    app.cli.add_command(cli_commands.gen_world_command)
+    app.cli.add_command(cli_commands.bench_tick_command)
+    app.cli.add_command(cli_commands.rebuild_region_indices_command)
 
     with app.app_context():       
         #db.create_all()
@@ -5,6 +5,7 @@ from app.auth import bp
 from app.auth.forms import RegistrationForm, LoginForm
 from app.models import Jogador, Regiao, Armazem, TipoVeiculo, Veiculo
 from urllib.parse import urlparse as url_parse
+from datetime import datetime, timedelta
 from config import Config
 
 footer = {'ano': Config.ANO_ATUAL, 'versao': Config.VERSAO_APP}
@@ -57,6 +58,7 @@ def register():
                     velocidade=rodotrem_tipo.velocidade,
                     custo_tonelada_km=rodotrem_tipo.custo_tonelada_km,
                     validade_dias=rodotrem_tipo.validade_dias,
+                    data_expiracao=datetime.utcnow() + timedelta(days=rodotrem_tipo.validade_dias),
                     nivel_especializacao_req=rodotrem_tipo.nivel_especializacao_req
                 )
                 db.session.add(veiculo_inicial)
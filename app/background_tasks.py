@@ -1,423 +1,355 @@
 from flask import current_app
 from app import db
 from app.models import (Jogador, TreinamentoAtivo, Regiao, RecursoNaMina, 
-                        Veiculo, HistoricoAcao, MarketOrder, ArmazemRecurso,
+                        Veiculo, Armazem, HistoricoAcao, MarketOrder, ArmazemRecurso,
                         CampoAgricola, PlantioAtivo, ProductionJob)
-from app.services import manufacturing_service
+from app.services import completion_service
+from app.services.history_service import record_history_many
+from app.services.player_service import regenerate_energy_bulk
+from app.completion_engine import completion_engine
+from app.tick_metrics import tick_metrics
+from app.utils import SQL_DIALETOS_SUPORTADOS
+from config import Config
 from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, or_, and_
 from sqlalchemy.orm import joinedload
 from math import ceil
 
-MAX_ENERGIA = 200
-ENERGIA_POR_MINUTO = 1
+MAX_ENERGIA = Config.MAX_ENERGIA
+ENERGIA_POR_MINUTO = Config.ENERGIA_POR_MINUTO
 
 def check_vehicle_validity(app):
-    """Verifica a validade dos veículos e remove os expirados."""
+    """
+    Remove os veículos vencidos (data_expiracao indexada) com um DELETE em lote
+    e registra o aviso no histórico de cada dono com um INSERT em lote.
+    """
     with app.app_context():
         from app import db 
-        
-        # Data de corte: Veículos comprados (data_compra) + validade_dias < NOW
-        veiculos_expirados = Veiculo.query.filter(
-            Veiculo.data_compra + timedelta(days=Veiculo.validade_dias) <= datetime.utcnow()
-        ).all()
 
-        if veiculos_expirados:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Iniciando a remoção de {len(veiculos_expirados)} veículos expirados.")
-            
-            for veiculo in veiculos_expirados:
-                # 1. REGISTRA NO HISTÓRICO
-                hist = HistoricoAcao(
-                    jogador_id=veiculo.armazem.jogador_id,
-                    tipo_acao='VEICULO_VENCIDO',
-                    descricao=f"Veículo '{veiculo.nome}' expirou e foi removido da frota.",
-                    dinheiro_delta=0.0,
-                    gold_delta=0.0
-                )
-                db.session.add(hist)
-                db.session.delete(veiculo)
-            
+        now = datetime.utcnow()
+        limite = current_app.config.get('VEICULO_EXPIRACAO_LOTE', 1000)
+        total = 0
+
+        while True:
+            vencidos = db.session.execute(
+                select(Veiculo.id, Veiculo.nome, Armazem.jogador_id)
+                .join(Armazem, Armazem.id == Veiculo.armazem_id)
+                .where(Veiculo.data_expiracao <= now)
+                .order_by(Veiculo.data_expiracao)
+                .limit(limite)
+            ).all()
+
+            if not vencidos:
+                break
+
             try:
+                db.session.execute(
+                    delete(Veiculo).where(Veiculo.id.in_([v.id for v in vencidos]))
+                    .execution_options(synchronize_session=False)
+                )
+                record_history_many([{
+                    'jogador_id': v.jogador_id,
+                    'tipo_acao': 'VEICULO_VENCIDO',
+                    'descricao': f"Veículo '{v.nome}' expirou e foi removido da frota.",
+                } for v in vencidos])
                 db.session.commit()
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] SUCCESSO: Veículos expirados deletados.")
             except Exception as e:
                 db.session.rollback()
                 print(f"Erro ao deletar veículos expirados: {e}")
+                break
 
-def replenish_resources(app):
-    """Recarrega as reservas de recursos (ouro) das regiões a cada 6 horas."""
-    with app.app_context():
-        todas_regioes = Regiao.query.all()
-        
-        for regiao in todas_regioes:
-            # Recarrega a reserva para o valor máximo (ou implemente uma lógica de recarga parcial)
-            if regiao.reserva_ouro < regiao.reserva_ouro_max:
-                regiao.reserva_ouro = regiao.reserva_ouro_max
-                db.session.add(regiao)
+            total += len(vencidos)
+            if len(vencidos) < limite:
+                break
 
-        try:
-            db.session.commit()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Reservas de recursos recarregadas.")
-        except Exception as e:
-            db.session.rollback()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro ao recarregar recursos: {e}")
+        if total:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] SUCCESSO: {total} veículos expirados deletados.")
 
 def update_region_indices(app):
     """
-    Calcula e atualiza os índices de todas as regiões (Educacao, Saude, Desenvolvimento, Imposto).
+    Atualiza os índices de todas as regiões (Educacao, Saude, Desenvolvimento, Imposto)
+    a partir das somas mantidas por delta. Não faz nada se nenhuma soma mudou.
     """
-    with app.app_context():
+    with app.app_context(), tick_metrics.fase('update_region_indices') as fase:
         from app import db 
-        from app.models import Jogador, Regiao 
-        
-        # 1. OBTER DADOS GLOBAIS DE HABILIDADE DOS JOGADORES RESIDENTES
-        jogadores_residentes = Jogador.query.filter(
-            Jogador.regiao_residencia_id.isnot(None)
-        ).all()
-        
-        habilidades_por_regiao = {}
-        
-        # Totais Globais
-        total_global = {'educacao': 0.0, 'saude': 0.0, 'filantropia': 0.0}
-        
-        for jogador in jogadores_residentes:
-            residencia_id = jogador.regiao_residencia_id
-            
-            if residencia_id not in habilidades_por_regiao:
-                habilidades_por_regiao[residencia_id] = {'educacao': 0.0, 'saude': 0.0, 'filantropia': 0.0}
-            
-            # Soma as habilidades na localização e globalmente
-            habilidades_por_regiao[residencia_id]['educacao'] += jogador.habilidade_educacao
-            habilidades_por_regiao[residencia_id]['saude'] += jogador.habilidade_saude
-            habilidades_por_regiao[residencia_id]['filantropia'] += jogador.habilidade_filantropia
-            
-            total_global['educacao'] += jogador.habilidade_educacao
-            total_global['saude'] += jogador.habilidade_saude
-            total_global['filantropia'] += jogador.habilidade_filantropia
-
-        # Soma total dos 3 índices globalmente (necessário para o ID)
-        soma_global_id = total_global['educacao'] + total_global['saude'] + total_global['filantropia']
-        
-        # 2. CALCULAR PROPORÇÕES E ATUALIZAR REGIÕES
-        todas_regioes = Regiao.query.all()
-
-        for regiao in todas_regioes:
-            regiao_id = regiao.id
-            
-            # Habilidades da Localização (ou 0 se vazia)
-            habilidades_regiao = habilidades_por_regiao.get(regiao_id, {'educacao': 0.0, 'saude': 0.0, 'filantropia': 0.0})
-            
-            # --- CÁLCULO DAS PROPORÇÕES (0.00 a 1.00) ---
-            
-            # Índice de Educação
-            if total_global['educacao'] > 0:
-                regiao.indice_educacao = habilidades_regiao['educacao'] / total_global['educacao']
-            else:
-                regiao.indice_educacao = 0.0
-                
-            # Índice de Saúde
-            if total_global['saude'] > 0:
-                regiao.indice_saude = habilidades_regiao['saude'] / total_global['saude']
-            else:
-                regiao.indice_saude = 0.0
-
-            # Índice de Filantropia
-            if total_global['filantropia'] > 0:
-                regiao.indice_filantropia = habilidades_regiao['filantropia'] / total_global['filantropia']
-            else:
-                regiao.indice_filantropia = 0.0
-                
-            # --- CÁLCULO DO ÍNDICE DE DESENVOLVIMENTO (ID) ---
-            
-            soma_regiao_id = (
-                habilidades_regiao['educacao'] + 
-                habilidades_regiao['saude'] + 
-                habilidades_regiao['filantropia']
-            )
-            
-            if soma_global_id > 0:
-                # ID = (Soma Localização / Soma Global) * 10
-                indice_dev = (soma_regiao_id / soma_global_id) * 10 
-                indice_dev = max(1.0, min(10.0, indice_dev)) 
-            else:
-                indice_dev = 1.0 
-                
-            regiao.indice_desenvolvimento = indice_dev
-            
-            # 3. Calcular Imposto (Taxa)
-            regiao.calcular_taxa_imposto() 
-            
-            db.session.add(regiao)
+        from app.services import region_service
 
         try:
-            db.session.commit()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Índices de Regiões atualizados. ID Global: {soma_global_id:.2f}")
+            recalculadas = region_service.recalcular_indices_regionais()
+            fase.linhas_alteradas += recalculadas
+            with fase.commit():
+                db.session.commit()
+            if recalculadas:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Índices de {recalculadas} Regiões atualizados.")
         except Exception as e:
             db.session.rollback()
+            fase.erro(e)
             print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro ao atualizar índices regionais: {e}")
 
-def regenerate_player_status(app):
+def _regenerate_energy_python(now):
     """
-    Função de background para regenerar energia e atualizar status dos jogadores.
+    Regeneração de energia jogador a jogador (modo 'python').
+    O bônus de saúde vem da região atual; sem região, regenera na taxa base.
     """
-    with app.app_context():
-        from app import db
-        from app.models import Jogador, TreinamentoAtivo, ViagemAtiva, PedidoResidencia, Armazem, ArmazemRecurso, TransporteAtivo
-        from datetime import datetime, timedelta
-        # 2. Busca todos os jogadores
-        jogadores = Jogador.query.all()
+    jogadores = Jogador.query.filter(Jogador.energia < MAX_ENERGIA).all()
+    
+    for jogador in jogadores:
+        regiao_atual = jogador.regiao_atual
+        multiplicador_saude = 1.0 + (regiao_atual.indice_saude if regiao_atual else 0.0)
+        energia_ganha_por_minuto_efetiva = ENERGIA_POR_MINUTO * multiplicador_saude
+
+        # Tempo decorrido desde a última atualização
+        time_difference: timedelta = now - jogador.last_status_update
+        minutes_passed = int(time_difference.total_seconds() // 60)
+
+        if minutes_passed > 0:
+            energia_a_somar = int(minutes_passed * energia_ganha_por_minuto_efetiva)
+            jogador.energia = int(min(jogador.energia + energia_a_somar, MAX_ENERGIA))
+
+            # Volta o timestamp o tempo que não foi usado na regeneração
+            # Ex: se passaram 65 segundos (1 min regenerado), o last_status_update
+            # fica 5 segundos atrás, para que ele espere os 55 segundos restantes.
+            time_remainder = time_difference.total_seconds() % 60
+            jogador.last_status_update = now - timedelta(seconds=time_remainder)
+            db.session.add(jogador)
+
+    return len(jogadores)
+
+def regenerate_energy(now):
+    """
+    Regenera a energia de todos os jogadores abaixo de MAX_ENERGIA.
+    Não faz commit: o chamador (tick) é dono da transação.
+    Retorna o número de jogadores atualizados (modo 'bulk') ou avaliados (modo 'python').
+    No modo 'lazy' não faz nada: a energia é calculada na leitura (Jogador.energia_atual)
+    e gravada pelos serviços antes do gasto (Jogador.materializar_energia).
+    """
+    modo = current_app.config.get('ENERGY_REGEN_MODE', 'bulk')
+    if modo == 'lazy':
+        return 0
+    
+    dialect_name = db.session.get_bind().dialect.name
+    
+    if modo == 'bulk' and dialect_name in SQL_DIALETOS_SUPORTADOS:
+        return regenerate_energy_bulk(now, dialect_name)
+    
+    return _regenerate_energy_python(now)
+
+def _proximo_lote(tipo, now, depois_de, limite):
+    """
+    Próximo lote de entidades vencidas do tipo, em ordem de (prazo, id), a partir
+    da última chave processada. A paginação por chave garante que uma entidade que
+    falhou (e continua vencida) não seja relida no mesmo tick.
+    """
+    modelo, coluna, _ = completion_service.TIMED_ENTITIES[tipo]
+    prazo = getattr(modelo, coluna)
 
-        production_jobs_concluidos = ProductionJob.query.filter(
-            ProductionJob.data_fim <= datetime.utcnow()
-        ).all()
-        
-        for job in production_jobs_concluidos:
-            jogador_job = Jogador.query.get(job.jogador_id)
-            
-            if jogador_job:
-                try:
-                    manufacturing_service.complete_manufacturing_jobs(job, jogador_job)
-                except Exception as e:
-                    db.session.rollback()
-                    print(f"ERRO ao concluir Job de Produção ID {job.id}: {e}")
-            else:
-                db.session.delete(job)
+    consulta = (modelo.query.options(*completion_service.load_options(tipo))
+                .filter(prazo <= now, completion_service.sem_quarentena(tipo)))
+    if depois_de is not None:
+        ultimo_prazo, ultimo_id = depois_de
+        consulta = consulta.filter(or_(prazo > ultimo_prazo, and_(prazo == ultimo_prazo, modelo.id > ultimo_id)))
 
-        for jogador in jogadores:
-            
-            regiao_atual = jogador.regiao_atual
-            if not regiao_atual: continue
+    return consulta.order_by(prazo, modelo.id).limit(limite).all()
 
-            # --- 1. CÁLCULO DO BÔNUS DE SAÚDE ---
-            multiplicador_saude = 1.0 + regiao_atual.indice_saude 
-            energia_ganha_por_minuto_efetiva = ENERGIA_POR_MINUTO * multiplicador_saude
-            
-            if jogador.energia < MAX_ENERGIA:
-                time_difference: timedelta = datetime.utcnow() - jogador.last_status_update
-                minutes_passed = int(time_difference.total_seconds() // 60)
-                
-                if minutes_passed > 0:
-                    energia_regenerada = minutes_passed * energia_ganha_por_minuto_efetiva
-                    energia_a_somar = int(energia_regenerada)
-                    nova_energia = min(jogador.energia + energia_a_somar, MAX_ENERGIA)
-                    time_remainder = time_difference.total_seconds() % 60
-                    
-                    jogador.energia = int(nova_energia)
-                    jogador.last_status_update = datetime.utcnow() - timedelta(seconds=time_remainder) 
-                    
-                    db.session.add(jogador)
-
-        plantios_concluidos = PlantioAtivo.query.filter(
-            PlantioAtivo.data_fim <= datetime.utcnow()
-        ).all()
+def _concluir_lote(itens, now, fase=None):
+    """
+    Conclui uma lista de (tipo, entidade) e faz o commit do lote. Os tipos com
+    conclusão em lote (BULK_HANDLERS) rodam de uma vez em um SAVEPOINT; se o lote
+    falhar, ou para os demais tipos, cada entidade roda no seu próprio SAVEPOINT:
+    se ela falhar, só ela é desfeita e vai para falha_conclusao; o resto do lote é
+    gravado. Retorna {tipo: concluídas} (vazio se o commit falhar).
+    """
+    por_tipo = {}
+    for tipo, entidade in itens:
+        por_tipo.setdefault(tipo, []).append(entidade)
+
+    ok = {}
+    for tipo, entidades in por_tipo.items():
+        bulk = completion_service.BULK_HANDLERS.get(tipo)
+        if bulk:
+            entidade_ids = [entidade.id for entidade in entidades]
+            try:
+                with db.session.begin_nested():
+                    bulk(entidades, now)
+                ok[tipo] = entidade_ids
+                continue
+            except Exception as e:
+                print(f"ERRO na conclusão em lote de {tipo} ({len(entidades)}), concluindo uma a uma: {e}")
 
-        for plantio in plantios_concluidos:
-            jogador_plantou = plantio.jogador
-            campo = plantio.campo
+        handler = completion_service.TIMED_ENTITIES[tipo][2]
+        for entidade in entidades:
+            entidade_id = entidade.id
+            try:
+                with db.session.begin_nested():
+                    handler(entidade)
+                ok.setdefault(tipo, []).append(entidade_id)
+            except Exception as e:
+                if fase:
+                    fase.erro(e)
+                try:
+                    with db.session.begin_nested():
+                        quarentena = completion_service.registrar_falha(tipo, entidade_id, e, now)
+                except Exception:
+                    # Sem como registrar a falha (ex: banco travado): a entidade é tentada no próximo tick
+                    quarentena = False
+                print(f"ERRO ao concluir {tipo} ID {entidade_id}{' (em quarentena)' if quarentena else ''}: {e}")
+
+    try:
+        for tipo, ids in ok.items():
+            completion_service.limpar_falhas(tipo, ids)
+        if fase:
+            with fase.commit():
+                db.session.commit()
+        else:
+            db.session.commit()
+    except Exception as e:
+        # Falha no commit do lote: desfaz só este lote; os anteriores já estão gravados
+        db.session.rollback()
+        if fase:
+            fase.erro(e)
+        print(f"ERRO no commit de um lote de conclusões ({len(itens)}): {e}")
+        return {}
 
-            if not jogador_plantou or not campo:
-                db.session.delete(plantio)
+    return {tipo: len(ids) for tipo, ids in ok.items()}
+
+def complete_due_entities(now, fase=None):
+    """
+    Conclui (por varredura) todas as entidades temporizadas vencidas:
+    produção, colheitas, treinos, viagens, residências e transportes.
+    Cada tipo é processado em lotes de TICK_CHUNK_SIZE, com um commit por lote
+    (transações e locks curtos), ver _concluir_lote.
+    Retorna {tipo: quantidade concluída}.
+    """
+    limite = current_app.config.get('TICK_CHUNK_SIZE', 500)
+    concluidos = {}
+    
+    for tipo, (modelo, coluna, handler) in completion_service.TIMED_ENTITIES.items():
+        concluidos[tipo] = 0
+        depois_de = None
+
+        while True:
+            lote = _proximo_lote(tipo, now, depois_de, limite)
+            if not lote:
+                break
+            depois_de = (getattr(lote[-1], coluna), lote[-1].id)
+            if fase:
+                fase.linhas_lidas += len(lote)
+
+            concluidos[tipo] += _concluir_lote([(tipo, entidade) for entidade in lote], now, fase).get(tipo, 0)
+
+            if len(lote) < limite:
+                break
+    
+    return concluidos
+
+# ------------------ MODO DE RECUPERAÇÃO (ATRASO ACUMULADO) ------------------
+
+def count_overdue(now):
+    """Conclusões vencidas (fora da quarentena) por tipo: {tipo: quantidade}."""
+    atrasados = {}
+    for tipo, (modelo, coluna, _) in completion_service.TIMED_ENTITIES.items():
+        atrasados[tipo] = db.session.execute(
+            select(func.count()).select_from(modelo)
+            .where(getattr(modelo, coluna) <= now, completion_service.sem_quarentena(tipo))
+        ).scalar()
+    return atrasados
+
+def drain_overdue(now, fase=None, total=None, continuar=None):
+    """
+    Conclui todas as entidades vencidas até 'now' na ordem global de prazo
+    (data_fim / data_aprovacao), misturando os tipos, em lotes de TICK_CHUNK_SIZE
+    com um commit por lote e uma linha de progresso por lote.
+    'continuar' (opcional) é consultado antes de cada lote para interromper a
+    recuperação (ex: desligamento do motor). Retorna o número de conclusões.
+    """
+    limite = current_app.config.get('TICK_CHUNK_SIZE', 500)
+    ordem = {tipo: posicao for posicao, tipo in enumerate(completion_service.TIMED_ENTITIES)}
+    chaves = {tipo: None for tipo in completion_service.TIMED_ENTITIES}   # Última chave lida por tipo
+    lidos = concluidos = 0
+
+    while chaves and (continuar is None or continuar()):
+        # O próximo lote global sai dos próximos 'limite' de cada tipo
+        candidatos = []
+        for tipo in list(chaves):
+            lote = _proximo_lote(tipo, now, chaves[tipo], limite)
+            if not lote:
+                del chaves[tipo]
                 continue
+            coluna = completion_service.TIMED_ENTITIES[tipo][1]
+            candidatos.extend((getattr(entidade, coluna), ordem[tipo], entidade.id, tipo, entidade) for entidade in lote)
+        if not candidatos:
+            break
 
-            dono_campo = campo.proprietario
-
-            # 1. Calcular XP (Regra 1)
-            # Damos 15 XP por cada 10 energia usados (ex: 100 energia = 150 XP)
-            # (Precisamos estimar a energia gasta, pois não salvamos ela)
-            # Vamos usar um valor fixo por enquanto, ou baseado na quantidade
-            xp_ganho = current_app.config['FARMING_XP_PER_10_ENERGY'] * (plantio.quantidade_produzida / current_app.config['MILHO_POR_ENERGIA'])
-            jogador_plantou.experiencia_trabalho += xp_ganho
-
-            # 2. Calcular Divisão do Lucro
-            lucro_dono = 0.0
-
-            # Se quem plantou não é o dono, o dono ganha uma taxa
-            if jogador_plantou.id != dono_campo.id:
-                lucro_dono = plantio.quantidade_produzida * campo.taxa_lucro
-
-            lucro_jogador = plantio.quantidade_produzida - lucro_dono
-
-            # 3. Criar RecursoNaMina para o Jogador que Plantou
-            expiracao_min = current_app.config['RECURSO_NA_MINA_EXPIRACAO_MIN']
-
-            recurso_jogador = RecursoNaMina(
-                jogador_id=jogador_plantou.id,
-                regiao_id=campo.regiao_id,
-                tipo_recurso='milho',
-                quantidade=lucro_jogador,
-                data_expiracao = datetime.utcnow() + timedelta(minutes=expiracao_min)
-            )
-            db.session.add(recurso_jogador)
-
-            # 4. Criar RecursoNaMina para o Dono (se houver lucro)
-            if lucro_dono > 0:
-                recurso_dono = RecursoNaMina(
-                    jogador_id=dono_campo.id,
-                    regiao_id=campo.regiao_id,
-                    tipo_recurso='milho',
-                    quantidade=lucro_dono,
-                    data_expiracao = datetime.utcnow() + timedelta(minutes=expiracao_min)
-                )
-                db.session.add(recurso_dono)
-                db.session.add(HistoricoAcao(jogador_id=dono_campo.id, tipo_acao='TAXA_COLHEITA', descricao=f"Recebeu {lucro_dono:.0f}t de Milho (taxa) de {campo.nome}."))
+        candidatos.sort(key=lambda candidato: candidato[:3])
+        lote = candidatos[:limite]
+        for prazo, _, entidade_id, tipo, _ in lote:
+            chaves[tipo] = (prazo, entidade_id)
 
+        concluidos += sum(_concluir_lote([(tipo, entidade) for _, _, _, tipo, entidade in lote], now, fase).values())
+        lidos += len(lote)
+        if fase:
+            fase.linhas_lidas += len(lote)
 
-            db.session.add(HistoricoAcao(jogador_id=jogador_plantou.id, tipo_acao='COLHEITA', descricao=f"Colheu {lucro_jogador:.0f}t de Milho em {campo.nome}."))
-            
-            # --- NOVO: Lógica de Descanso PÓS-COLHEITA ---
-            # Se o campo atingiu 0 usos, inicia o período de descanso AGORA.
-            if campo.usos_restantes <= 0:
-                tempo_descanso_h = current_app.config['FARMING_FIELD_REST_HOURS']
-                campo.data_descanso_fim = datetime.utcnow() + timedelta(hours=tempo_descanso_h)
-                db.session.add(campo) # Adiciona o campo de volta para salvar a data de descanso
-            
-            # 5. Deletar o plantio
-            db.session.delete(plantio)
+        progresso = f"{lidos}/{total} ({lidos * 100 // total}%)" if total else str(lidos)
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Recuperação: {progresso} conclusões processadas, "
+              f"prazos até {lote[-1][0]:%d/%m %H:%M}.")
 
-        treinos_concluidos = TreinamentoAtivo.query.filter(
-            TreinamentoAtivo.data_fim <= datetime.utcnow()
-        ).all()
-        
-        for treino in treinos_concluidos:
-            jogador = Jogador.query.get(treino.jogador_id) # Acessa o jogador pelo ID
-            
-            if jogador:
-                # 1. Aumenta o nível da habilidade
-                skill_attr = f'habilidade_{treino.habilidade}'
-                # O Nível Alvo é o que deve ser aplicado
-                setattr(jogador, skill_attr, treino.nivel_alvo) 
-                
-                # 2. Adiciona XP (Exemplo)
-                jogador.experiencia += 500
-
-                if jogador.check_level_up():
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] NÍVEL UP: Jogador {jogador.username} alcançou Nível {jogador.nivel}!")
-                
-                # --- REGISTRO NO HISTÓRICO ---
-                
-                if treino.habilidade.startswith('armazem_'):
-                    tipo_acao = 'ARMAZEM_UPGRADE'
-                    nome_melhoria = treino.habilidade.replace('armazem_', '').capitalize()
-                    descricao_acao = f"Melhoria de Armazém ({nome_melhoria}) para Nv {treino.nivel_alvo:.0f} concluída."
-                else:
-                    tipo_acao = 'TREINO'
-                    nome_habilidade = treino.habilidade.capitalize()
-                    descricao_acao = f"Treinamento de {nome_habilidade} concluído. XP ganha: 500."
-                    
-                hist = HistoricoAcao(
-                    jogador_id=jogador.id,
-                    tipo_acao=tipo_acao,
-                    descricao=descricao_acao,
-                    dinheiro_delta=0.0,
-                    gold_delta=0.0
-                )
-                db.session.add(hist)
-                # -----------------------------
+    return concluidos
 
-                # Adiciona o jogador para salvar a XP/Nível
-                db.session.add(jogador) 
-                                
-            # 3. Remove o registro de treino ativo (mesmo que o jogador seja None)
-            db.session.delete(treino)
+def catch_up_backlog(app, continuar=None):
+    """
+    Modo de recuperação após uma parada (deploy, queda): se houver pelo menos
+    TICK_CATCHUP_THRESHOLD conclusões vencidas, drena todas em ordem de prazo
+    (drain_overdue) antes de voltar à cadência normal. Sem atraso, custa só as
+    contagens. Retorna o número de conclusões feitas na recuperação.
+    """
+    with app.app_context(), tick_metrics.fase('catch_up') as fase:
+        try:
+            now = datetime.utcnow()
+            atrasados = count_overdue(now)
+            total = sum(atrasados.values())
+            if total < current_app.config.get('TICK_CATCHUP_THRESHOLD', 1000):
+                return 0
+
+            detalhes = ', '.join(f"{tipo}: {quantidade}" for tipo, quantidade in atrasados.items() if quantidade)
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] MODO DE RECUPERAÇÃO: {total} conclusões atrasadas ({detalhes}).")
+
+            inicio = datetime.utcnow()
+            concluidos = drain_overdue(now, fase, total, continuar)
+            fase.linhas_alteradas += concluidos
+
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Recuperação concluída: {concluidos}/{total} "
+                  f"em {(datetime.utcnow() - inicio).total_seconds():.1f}s. Voltando à cadência normal.")
+            return concluidos
+        finally:
+            db.session.remove()
 
-        viagens_concluidas = ViagemAtiva.query.filter(
-            ViagemAtiva.data_fim <= datetime.utcnow()
-        ).all()
-        
-        for viagem in viagens_concluidas:
-            jogador = Jogador.query.get(viagem.jogador_id)
-            
-            if jogador:
-                # 1. Move o jogador para o novo destino
-                jogador.regiao_atual_id = viagem.destino_id
-                
-                # 2. Informação para o log
-                destino_nome = Regiao.query.get(viagem.destino_id).nome
-                print(f"Viagem concluída: Jogador {jogador.username} moveu-se para {destino_nome}.")
-                db.session.add(jogador)
-                
-            # 3. Remove o registro de viagem ativa
-            db.session.delete(viagem)
-
-        pedidos_aprovados = PedidoResidencia.query.filter(
-            PedidoResidencia.data_aprovacao <= datetime.utcnow()
-        ).all()
-        
-        for pedido in pedidos_aprovados:
-            jogador = Jogador.query.get(pedido.jogador_id)
-            regiao_destino = Regiao.query.get(pedido.regiao_destino_id)
-            
-            if jogador and regiao_destino:
-                # 1. Altera a residência do jogador
-                jogador.regiao_residencia_id = regiao_destino.id
-                print(f"Residência de {jogador.username} aprovada para {regiao_destino.nome}.")
-                db.session.add(jogador)
-            
-            # 2. Remove o registro de pedido ativo
-            db.session.delete(pedido)
-        
-        transportes_concluidos = TransporteAtivo.query.filter(
-            TransporteAtivo.data_fim <= datetime.utcnow()
-        ).all()
+def regenerate_player_status(app):
+    """
+    Função de background para regenerar energia e atualizar status dos jogadores.
+    No modo COMPLETION_ENGINE='heap', as conclusões ficam com o motor de conclusões
+    (que dispara cada uma no seu prazo); aqui ele só agenda os prazos próximos que
+    ainda não estão no heap (ver CompletionEngine.reconcile).
+    No modo 'poll' as conclusões são gravadas em lotes (ver complete_due_entities) e a
+    energia em uma transação à parte: uma conclusão com erro não atrasa a energia de ninguém.
+    """
+    with app.app_context(), tick_metrics.fase('regenerate_player_status') as fase:
+        now = datetime.utcnow()
+        concluidos = {}
         
-        for transporte in transportes_concluidos:
-            jogador = Jogador.query.get(transporte.jogador_id)
-            armazem = jogador.armazem
-            
-            if jogador and armazem:
-                # 1. Credita o recurso no Armazém
-                recurso = armazem.recursos.filter_by(tipo=transporte.tipo_recurso).first()
-                if not recurso:
-                    recurso = ArmazemRecurso(armazem_id=armazem.id, tipo=transporte.tipo_recurso, quantidade=0.0)
-                    db.session.add(recurso)
-
-                recurso.quantidade += transporte.quantidade
-                
-                # 2. Log
-                print(f"Transporte concluído: {transporte.quantidade:.0f} {transporte.tipo_recurso} creditados no armazém de {jogador.username}.")
-                db.session.add(armazem)
-                
-            # 3. Remove o registro de transporte ativo
-            db.session.delete(transporte)
-
-        for jogador in jogadores:
-            
-            # Cálculo da regeneração de ENERGIA
-            
-            # Se a energia já está no máximo, não há o que fazer
-            if jogador.energia >= MAX_ENERGIA:
-                continue
+        try:
+            if current_app.config.get('COMPLETION_ENGINE') == 'heap' and completion_engine.running:
+                fase.linhas_lidas += completion_engine.reconcile()
+            else:
+                concluidos = complete_due_entities(now, fase)
+                fase.linhas_alteradas += sum(concluidos.values())
 
-            # Tempo decorrido desde a última atualização
-            time_difference: timedelta = datetime.utcnow() - jogador.last_status_update
+            # Regeneração de ENERGIA (set-based ou loop, conforme ENERGY_REGEN_MODE)
+            fase.linhas_alteradas += regenerate_energy(now)
             
-            # Minutos completos passados
-            minutes_passed = int(time_difference.total_seconds() // 60)
-
-            if minutes_passed > 0:
-                # 1 Energia por minuto * Minutos passados
-                energia_regenerada = minutes_passed * ENERGIA_POR_MINUTO
-                
-                # Calcula a nova energia (limitada ao máximo)
-                nova_energia = min(jogador.energia + energia_regenerada, MAX_ENERGIA)
-                
-                # Calcula o tempo que ainda deve ser considerado para a próxima regeneração
-                # Subtrai o tempo usado para a regeneração atual
-                time_remainder = time_difference.total_seconds() % 60
-                
-                # 3. Atualiza o jogador
-                jogador.energia = nova_energia
-                
-                # Atualiza o timestamp (voltando o tempo que não foi usado na regeneração)
-                # Ex: se passaram 65 segundos (1 min regenerado), atualizamos o last_status_update
-                # para 5 segundos atrás, para que ele espere os 55 segundos restantes.
-                jogador.last_status_update = datetime.utcnow() - timedelta(seconds=time_remainder) 
-
-                db.session.add(jogador)
-        
-        # 4. Salva as alterações no banco de dados
-        try:
-            db.session.commit()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Status/Treinos processados. Concluídos: {len(treinos_concluidos)}")
+            with fase.commit():
+                db.session.commit()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Status/Treinos processados. Concluídos: {concluidos.get('treino', 0)}")
         except Exception as e:
             db.session.rollback()
             print(f"[{datetime.now().strftime('%H:%M:%S')}] ERRO NO COMMIT DE BACKGROUND: {e}")
@@ -425,39 +357,88 @@ def regenerate_player_status(app):
         finally:
             db.session.remove()
 
+def _expirar_lote_de_recursos(now, limite):
+    """
+    Apaga até 'limite' RecursoNaMina vencidos em um único DELETE e retorna as
+    linhas apagadas (jogador_id, tipo_recurso, quantidade) para o log agregado.
+    Os IDs do lote são lidos antes (o MySQL/MariaDB não aceita LIMIT em subconsulta
+    de IN). Usa DELETE ... RETURNING quando o banco suporta (SQLite 3.35+,
+    PostgreSQL); senão lê as linhas do lote e apaga por elas.
+    """
+    colunas = (RecursoNaMina.id, RecursoNaMina.jogador_id, RecursoNaMina.tipo_recurso, RecursoNaMina.quantidade)
+    ids = db.session.execute(
+        select(RecursoNaMina.id)
+        .where(RecursoNaMina.data_expiracao <= now)
+        .order_by(RecursoNaMina.data_expiracao)
+        .limit(limite)
+    ).scalars().all()
+    if not ids:
+        return []
+
+    if db.session.get_bind().dialect.delete_returning:
+        return db.session.execute(
+            delete(RecursoNaMina).where(RecursoNaMina.id.in_(ids)).returning(*colunas)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    linhas = db.session.execute(select(*colunas).where(RecursoNaMina.id.in_(ids))).all()
+    db.session.execute(
+        delete(RecursoNaMina).where(RecursoNaMina.id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    return linhas
+
 def clean_expired_resources(app):
-    """Deleta recursos minerados que expiraram (não foram agendados em 15 minutos)."""
-    with app.app_context():
+    """
+    Deleta recursos minerados que expiraram (não foram agendados a tempo).
+    Apaga em lotes de RECURSO_EXPIRACAO_LOTE linhas (um DELETE + commit por lote)
+    e registra um resumo por tipo de recurso em vez de uma linha por pilha.
+    """
+    with app.app_context(), tick_metrics.fase('clean_expired_resources') as fase:
         from app import db # Acessa a instância do DB
-        
-        expired_resources = RecursoNaMina.query.filter(
-            RecursoNaMina.data_expiracao <= datetime.utcnow()
-        ).all()
 
-        if expired_resources:
-            for recurso in expired_resources:
-                # CORREÇÃO: Usar 'tipo_recurso' em vez de 'tipo'
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] RECURSO EXPIRADO: {recurso.quantidade:.0f}t de {recurso.tipo_recurso} de Jogador {recurso.jogador_id} deletado.")
-                db.session.delete(recurso)
-            
+        now = datetime.utcnow()
+        limite = current_app.config.get('RECURSO_EXPIRACAO_LOTE', 1000)
+        resumo = {}   # tipo_recurso -> [pilhas, toneladas]
+
+        while True:
             try:
-                db.session.commit()
+                apagados = _expirar_lote_de_recursos(now, limite)
+                with fase.commit():
+                    db.session.commit()
             except Exception as e:
                 db.session.rollback()
+                fase.erro(e)
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro ao deletar recursos expirados: {e}")
+                break
+
+            fase.linhas_lidas += len(apagados)
+            fase.linhas_alteradas += len(apagados)
+            for recurso in apagados:
+                item = resumo.setdefault(recurso.tipo_recurso, [0, 0.0])
+                item[0] += 1
+                item[1] += recurso.quantidade or 0.0
+
+            if len(apagados) < limite:
+                break
+
+        if resumo:
+            detalhes = ', '.join(f"{tipo}: {pilhas} pilhas / {toneladas:.0f}t" for tipo, (pilhas, toneladas) in sorted(resumo.items()))
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] RECURSOS EXPIRADOS deletados ({detalhes}).")
 
 def update_farming_status(app):
     """
     Verifica campos agrícolas que terminaram o descanso
     e reseta seus usos.
     """
-    with app.app_context():
+    with app.app_context(), tick_metrics.fase('update_farming_status') as fase:
         from app import db
 
         campos_descansados = CampoAgricola.query.filter(
             CampoAgricola.data_descanso_fim.isnot(None),
             CampoAgricola.data_descanso_fim <= datetime.utcnow()
         ).all()
+        fase.linhas_lidas += len(campos_descansados)
 
         if not campos_descansados:
             return
@@ -470,76 +451,64 @@ def update_farming_status(app):
             db.session.add(campo)
 
         try:
-            db.session.commit()
+            with fase.commit():
+                db.session.commit()
+            fase.linhas_alteradas += len(campos_descansados)
         except Exception as e:
             db.session.rollback()
+            fase.erro(e)
             print(f"Erro ao resetar campos: {e}")
 
 def run_core_status_updates(app):
     """
     Função mestra para executar todos os jobs de alta frequência (60 segundos).
+    Cada fase é medida em tick_metrics (painel em /manage/tick_metrics).
+    Um tick em modo de recuperação pode passar de 60s; o APScheduler pula as
+    execuções sobrepostas e a cadência normal volta quando o atraso acaba.
     """
-    # 1. Regeneração de Status e Conclusão de Treino/Viagem/Plantio (CRÍTICO)
-    regenerate_player_status(app)
+    with tick_metrics.tick():
+        # 0. Recuperação de atraso (após uma parada). No modo 'heap' quem drena é o motor de conclusões
+        if not (app.config.get('COMPLETION_ENGINE') == 'heap' and completion_engine.running):
+            catch_up_backlog(app)
+
+        # 1. Regeneração de Status e Conclusão de Treino/Viagem/Plantio (CRÍTICO)
+        regenerate_player_status(app)
 
-    # 2. Atualização de Índices Regionais (Necessário para taxas/bônus)
-    update_region_indices(app)
+        # 2. Atualização de Índices Regionais (Necessário para taxas/bônus)
+        update_region_indices(app)
 
-    # 3. Limpeza de Recursos Expirados (Manutenção)
-    clean_expired_resources(app)
+        # 3. Limpeza de Recursos Expirados (Manutenção)
+        clean_expired_resources(app)
 
-    # 4. Atualização de Campos Agrícolas (Resetar descanso)
-    update_farming_status(app)
+        # 4. Atualização de Campos Agrícolas (Resetar descanso)
+        update_farming_status(app)
 
 def cleanup_expired_market_orders(app):
     """
     Encontra ordens de mercado expiradas (status ATIVO mas data_expiracao passou)
     e devolve o escrow (dinheiro ou itens) para o criador da ordem.
+    Trabalha em lotes de MARKET_EXPIRY_BATCH ordens (ver market_service.expire_orders).
     """
     with app.app_context():
         from app import db
-        
-        expired_orders = MarketOrder.query.filter(
-            MarketOrder.status == 'ACTIVE',
-            MarketOrder.data_expiracao <= datetime.utcnow()
-        ).all()
-        
-        if not expired_orders:
-            # Nada a fazer
-            return
+        from app.services import market_service
 
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Limpando {len(expired_orders)} ordens de mercado expiradas...")
-        
-        for order in expired_orders:
-            order.status = 'EXPIRED'
-            
+        now = datetime.utcnow()
+        limite = current_app.config.get('MARKET_EXPIRY_BATCH', 1000)
+        total = 0
+
+        while True:
             try:
-                if order.order_type == 'SELL':
-                    # A ordem era de VENDA. Devolve os ITENS reservados.
-                    recurso = ArmazemRecurso.query.filter_by(
-                        armazem_id=order.jogador.armazem.id,
-                        tipo=order.resource_type
-                    ).first()
-                    
-                    if recurso:
-                        recurso.quantidade_reservada = max(0, recurso.quantidade_reservada - order.quantity_remaining)
-                        db.session.add(recurso)
-                        
-                elif order.order_type == 'BUY':
-                    # Devolve dinheiro reservado
-                    custo_reservado = order.quantity_remaining * order.price_per_unit
-                    order.jogador.dinheiro_reservado = max(0, order.jogador.dinheiro_reservado - custo_reservado)
-                    db.session.add(order.jogador)
-                    
-                db.session.add(order)
-                
+                expiradas = market_service.expire_orders(now, limite)
+                db.session.commit()
             except Exception as e:
-                print(f"Erro ao processar expiração da Ordem ID {order.id}: {e}")
-                # Não paramos o loop, tentamos a próxima
-        
-        try:
-            db.session.commit()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Limpeza de ordens concluída.")
-        except Exception as e:
-            db.session.rollback()
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro ao commitar limpeza de ordens: {e}")
+                db.session.rollback()
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro ao commitar limpeza de ordens: {e}")
+                break
+
+            total += len(expiradas)
+            if len(expiradas) < limite:
+                break
+
+        if total:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Limpeza de ordens concluída: {total} ordens expiradas.")
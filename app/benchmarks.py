@@ -0,0 +1,355 @@
+import contextlib
+import io
+import math
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, func, select, insert, text
+from app import db
+from app.models import (Jogador, Regiao, Armazem, ArmazemRecurso, Veiculo,
+                        TreinamentoAtivo, ViagemAtiva, PedidoResidencia, TransporteAtivo,
+                        PlantioAtivo, ProductionJob, RecursoNaMina, MarketOrder,
+                        CampoAgricola, HistoricoAcao)
+
+# ------------------ BENCHMARK: ÍNDICES DAS CONSULTAS DO TICK ------------------
+
+# Índices criados na migração 'deadline and lookup indexes'
+INDICES_DO_TICK = [
+    ('treinamento_ativo', 'ix_treinamento_ativo_data_fim'),
+    ('viagem_ativa', 'ix_viagem_ativa_data_fim'),
+    ('pedido_residencia', 'ix_pedido_residencia_data_aprovacao'),
+    ('transporte_ativo', 'ix_transporte_ativo_data_fim'),
+    ('plantio_ativo', 'ix_plantio_ativo_data_fim'),
+    ('production_job', 'ix_production_job_data_fim'),
+    ('recurso_na_mina', 'ix_recurso_na_mina_data_expiracao'),
+    ('recurso_na_mina', 'ix_recurso_na_mina_jogador_regiao_tipo'),
+    ('market_order', 'ix_market_order_data_expiracao'),
+    ('market_order', 'ix_market_order_book'),
+    ('campo_agricola', 'ix_campo_agricola_data_descanso_fim'),
+    ('historico_acao', 'ix_historico_acao_jogador_timestamp'),
+]
+
+def _popular_tabelas_do_tick(conn, n_linhas, now):
+    """Insere n_linhas em cada tabela consultada pelo tick (~1% vencidas)."""
+    rnd = random.Random(42)
+    n_jogadores = max(1, n_linhas // 10)
+
+    def prazo():
+        # 1% vencido, o resto espalhado nas próximas 72 horas
+        if rnd.random() < 0.01:
+            return now - timedelta(minutes=rnd.randint(1, 60))
+        return now + timedelta(minutes=rnd.randint(1, 72 * 60))
+
+    def jogador():
+        return rnd.randint(1, n_jogadores)
+
+    recursos = ['ferro', 'milho', 'gold']
+    linhas = {
+        TreinamentoAtivo: [dict(jogador_id=i, habilidade='saude', nivel_alvo=1.0, data_fim=prazo()) for i in range(1, n_linhas + 1)],
+        ViagemAtiva: [dict(jogador_id=i, destino_id=1, data_fim=prazo()) for i in range(1, n_linhas + 1)],
+        PedidoResidencia: [dict(jogador_id=i, regiao_destino_id=1, data_aprovacao=prazo()) for i in range(1, n_linhas + 1)],
+        TransporteAtivo: [dict(jogador_id=jogador(), veiculo_id=1, regiao_origem_id=1, regiao_destino_id=1,
+                               tipo_recurso='ferro', quantidade=10.0, data_fim=prazo()) for _ in range(n_linhas)],
+        PlantioAtivo: [dict(jogador_id=jogador(), campo_id=1, quantidade_produzida=10.0, data_fim=prazo()) for _ in range(n_linhas)],
+        ProductionJob: [dict(jogador_id=jogador(), empresa_id=1, recipe_id=1, quantity_multiplier=1, data_fim=prazo()) for _ in range(n_linhas)],
+        RecursoNaMina: [dict(jogador_id=jogador(), regiao_id=rnd.randint(1, 20), tipo_recurso=rnd.choice(recursos),
+                             quantidade=10.0, data_expiracao=prazo()) for _ in range(n_linhas)],
+        MarketOrder: [dict(jogador_id=jogador(), regiao_id=1, order_type=rnd.choice(['BUY', 'SELL']),
+                           resource_type=rnd.choice(recursos), quantity=10.0, quantity_remaining=10.0,
+                           price_per_unit=float(rnd.randint(1, 5000)),
+                           status='ACTIVE' if rnd.random() < 0.3 else 'COMPLETED', data_expiracao=prazo()) for _ in range(n_linhas)],
+        CampoAgricola: [dict(nome=f'Campo {i}', regiao_id=1, proprietario_id=jogador(),
+                             data_descanso_fim=prazo() if rnd.random() < 0.2 else None) for i in range(n_linhas)],
+        HistoricoAcao: [dict(jogador_id=jogador(), tipo_acao='MINERACAO', descricao='bench',
+                             timestamp=now - timedelta(minutes=rnd.randint(0, 100000))) for _ in range(n_linhas)],
+    }
+    for modelo, valores in linhas.items():
+        conn.execute(insert(modelo), valores)
+    return n_jogadores
+
+def _consultas_do_tick(now, n_jogadores):
+    """As consultas que o tick / telas quentes fazem hoje."""
+    return {
+        'treinos vencidos': select(TreinamentoAtivo.id).where(TreinamentoAtivo.data_fim <= now),
+        'viagens vencidas': select(ViagemAtiva.id).where(ViagemAtiva.data_fim <= now),
+        'residências aprovadas': select(PedidoResidencia.id).where(PedidoResidencia.data_aprovacao <= now),
+        'transportes vencidos': select(TransporteAtivo.id).where(TransporteAtivo.data_fim <= now),
+        'colheitas vencidas': select(PlantioAtivo.id).where(PlantioAtivo.data_fim <= now),
+        'produções vencidas': select(ProductionJob.id).where(ProductionJob.data_fim <= now),
+        'recursos expirados': select(RecursoNaMina.id).where(RecursoNaMina.data_expiracao <= now),
+        'campos descansados': select(CampoAgricola.id).where(CampoAgricola.data_descanso_fim.isnot(None),
+                                                            CampoAgricola.data_descanso_fim <= now),
+        'ordens expiradas': select(MarketOrder.id).where(MarketOrder.status == 'ACTIVE',
+                                                        MarketOrder.data_expiracao <= now),
+        'recurso na mina (jogador)': select(RecursoNaMina.id).where(RecursoNaMina.jogador_id == n_jogadores // 2,
+                                                                   RecursoNaMina.regiao_id == 3,
+                                                                   RecursoNaMina.tipo_recurso == 'ferro'),
+        'livro de ofertas (top 50)': select(MarketOrder.id).where(MarketOrder.status == 'ACTIVE',
+                                                                 MarketOrder.order_type == 'SELL',
+                                                                 MarketOrder.resource_type == 'ferro')
+                                                           .order_by(MarketOrder.price_per_unit.asc()).limit(50),
+        'histórico do jogador (top 20)': select(HistoricoAcao.id).where(HistoricoAcao.jogador_id == n_jogadores // 2)
+                                                               .order_by(HistoricoAcao.timestamp.desc()).limit(20),
+    }
+
+def _medir(conn, consultas, repeticoes):
+    """Mediana (ms) de cada consulta."""
+    resultado = {}
+    for nome, consulta in consultas.items():
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            conn.execute(consulta).fetchall()
+            tempos.append((time.perf_counter() - inicio) * 1000.0)
+        resultado[nome] = statistics.median(tempos)
+    return resultado
+
+def bench_tick_indexes(tamanhos=(10000, 100000), repeticoes=5, echo=print):
+    """
+    Mede as consultas do tick em um SQLite temporário, sem e com os índices de prazo.
+    Retorna {tamanho: {consulta: (ms_sem_indice, ms_com_indice)}}.
+    """
+    relatorio = {}
+    for n_linhas in tamanhos:
+        fd, caminho = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        engine = create_engine(f'sqlite:///{caminho}')
+        try:
+            now = datetime.utcnow()
+            db.metadata.create_all(engine)
+            with engine.begin() as conn:
+                n_jogadores = _popular_tabelas_do_tick(conn, n_linhas, now)
+
+            consultas = _consultas_do_tick(now, n_jogadores)
+
+            with engine.begin() as conn:
+                for _, indice in INDICES_DO_TICK:
+                    conn.execute(text(f'DROP INDEX IF EXISTS {indice}'))
+                conn.execute(text('ANALYZE'))
+                antes = _medir(conn, consultas, repeticoes)
+
+            with engine.begin() as conn:
+                for tabela, indice in INDICES_DO_TICK:
+                    for idx in db.metadata.tables[tabela].indexes:
+                        if idx.name == indice:
+                            idx.create(conn)
+                conn.execute(text('ANALYZE'))
+                depois = _medir(conn, consultas, repeticoes)
+        finally:
+            engine.dispose()
+            os.remove(caminho)
+
+        relatorio[n_linhas] = {nome: (antes[nome], depois[nome]) for nome in consultas}
+
+        echo(f"\n--- {n_linhas} linhas por tabela (mediana de {repeticoes} execuções, ms) ---")
+        echo(f"{'consulta':<32}{'sem índice':>12}{'com índice':>12}")
+        total_antes = total_depois = 0.0
+        for nome, (ms_antes, ms_depois) in relatorio[n_linhas].items():
+            echo(f"{nome:<32}{ms_antes:>12.2f}{ms_depois:>12.2f}")
+            total_antes += ms_antes
+            total_depois += ms_depois
+        echo(f"{'TOTAL':<32}{total_antes:>12.2f}{total_depois:>12.2f}")
+
+    return relatorio
+
+# ------------------ MUNDO SINTÉTICO ------------------
+
+def generate_world(conn, n_regioes, n_jogadores, fracao_vencida=0.05, now=None, seed=42):
+    """
+    Insere um mundo sintético coerente: regiões, jogadores (com Armazem, recursos e
+    um Veiculo), treinos, viagens, pedidos de residência, transportes, campos com
+    plantios, recursos na mina e ordens de mercado com o escrow correspondente.
+    'fracao_vencida' das linhas temporizadas já nasce vencida (o que o tick processa).
+    Os IDs continuam a partir dos existentes, então também serve para um banco em uso.
+    Usa INSERTs em lote na conexão informada; não faz commit. Retorna {tabela: linhas}.
+    """
+    now = now or datetime.utcnow()
+    rnd = random.Random(seed)
+    recursos = ['ferro', 'milho', 'gold']
+    habilidades = ['educacao', 'saude', 'filantropia']
+
+    def proximo_id(modelo):
+        return (conn.execute(select(func.max(modelo.id))).scalar() or 0) + 1
+
+    def prazo():
+        if rnd.random() < fracao_vencida:
+            return now - timedelta(minutes=rnd.randint(1, 60))
+        return now + timedelta(minutes=rnd.randint(1, 72 * 60))
+
+    def amostra(fracao):
+        return [j for j in jogadores if rnd.random() < fracao]
+
+    r0, j0, a0, v0, c0 = (proximo_id(m) for m in (Regiao, Jogador, Armazem, Veiculo, CampoAgricola))
+    regioes = list(range(r0, r0 + n_regioes))
+    jogadores = list(range(j0, j0 + n_jogadores))
+    residencia = {j: rnd.choice(regioes) for j in jogadores}
+
+    linhas = {}
+    linhas[Regiao] = [dict(id=r, nome=f'Regiao Sintetica {r}', latitude=rnd.uniform(-30, -5), longitude=rnd.uniform(-55, -35),
+                           last_reserve_update=now) for r in regioes]
+    linhas[Jogador] = [dict(id=j, username=f'bench_{j}', password_hash='!', dinheiro=1000000.0, gold=100.0,
+                            energia=rnd.randint(0, 200), experiencia=0, experiencia_trabalho=0,
+                            habilidade_educacao=rnd.randint(0, 10), habilidade_saude=rnd.randint(0, 10),
+                            habilidade_filantropia=rnd.randint(0, 10),
+                            regiao_residencia_id=residencia[j], regiao_atual_id=residencia[j],
+                            last_status_update=now - timedelta(minutes=rnd.randint(0, 120))) for j in jogadores]
+    linhas[Armazem] = [dict(id=a0 + i, jogador_id=j, regiao_id=residencia[j]) for i, j in enumerate(jogadores)]
+    linhas[ArmazemRecurso] = [dict(armazem_id=a0 + i, tipo=tipo, quantidade=float(rnd.randint(100, 10000)))
+                              for i in range(n_jogadores) for tipo in recursos]
+
+    veiculos = []
+    for i, j in enumerate(jogadores):
+        validade = rnd.randint(4, 8)
+        vencido = rnd.random() < fracao_vencida
+        compra = now - timedelta(days=validade, hours=rnd.randint(1, 24)) if vencido else now - timedelta(hours=rnd.randint(0, 72))
+        veiculos.append(dict(id=v0 + i, armazem_id=a0 + i, nome='Caminhão 3/4', tipo_veiculo='caminhao_3_4', capacidade=3,
+                             velocidade=1.0, custo_tonelada_km=10.0, validade_dias=validade, data_compra=compra,
+                             data_expiracao=compra + timedelta(days=validade)))
+    linhas[Veiculo] = veiculos
+    veiculo_de = {j: v0 + i for i, j in enumerate(jogadores)}
+
+    linhas[TreinamentoAtivo] = [dict(jogador_id=j, habilidade=rnd.choice(habilidades), nivel_alvo=float(rnd.randint(11, 20)),
+                                     data_fim=prazo()) for j in amostra(0.3)]
+    linhas[ViagemAtiva] = [dict(jogador_id=j, destino_id=rnd.choice(regioes), data_fim=prazo()) for j in amostra(0.1)]
+    linhas[PedidoResidencia] = [dict(jogador_id=j, regiao_destino_id=rnd.choice(regioes), data_aprovacao=prazo())
+                                for j in amostra(0.05)]
+    linhas[TransporteAtivo] = [dict(jogador_id=j, veiculo_id=veiculo_de[j], regiao_origem_id=rnd.choice(regioes),
+                                    regiao_destino_id=residencia[j], tipo_recurso=rnd.choice(['ferro', 'milho']),
+                                    quantidade=float(rnd.randint(1, 3)), data_fim=prazo()) for j in amostra(0.3)]
+
+    campos = list(range(c0, c0 + max(1, n_jogadores // 10)))
+    linhas[CampoAgricola] = [dict(id=c, nome=f'Campo Sintetico {c}', regiao_id=rnd.choice(regioes),
+                                  proprietario_id=rnd.choice(jogadores), usos_restantes=rnd.randint(0, 6),
+                                  data_descanso_fim=prazo() if rnd.random() < 0.2 else None) for c in campos]
+    linhas[PlantioAtivo] = [dict(jogador_id=j, campo_id=rnd.choice(campos), quantidade_produzida=float(rnd.randint(10, 200)),
+                                 data_fim=prazo()) for j in amostra(0.2)]
+    linhas[RecursoNaMina] = [dict(jogador_id=j, regiao_id=residencia[j], tipo_recurso=rnd.choice(recursos),
+                                  quantidade=float(rnd.randint(1, 50)), data_expiracao=prazo()) for j in amostra(0.3)]
+
+    # Ordens ativas com o escrow (dinheiro/itens reservados) que a expiração devolve
+    ordens = []
+    for j in amostra(0.5):
+        for _ in range(rnd.randint(1, 3)):
+            quantidade = float(rnd.randint(1, 100))
+            ordens.append(dict(jogador_id=j, regiao_id=residencia[j], order_type=rnd.choice(['BUY', 'SELL']),
+                               resource_type=rnd.choice(recursos), quantity=quantidade, quantity_remaining=quantidade,
+                               price_per_unit=float(rnd.randint(100, 5000)), status='ACTIVE',
+                               data_criacao=now - timedelta(hours=rnd.randint(1, 72)), data_expiracao=prazo()))
+    linhas[MarketOrder] = ordens
+
+    for modelo, valores in linhas.items():
+        if valores:
+            conn.execute(insert(modelo), valores)
+
+    reservado = {}
+    for ordem in ordens:
+        if ordem['order_type'] == 'BUY':
+            reservado[ordem['jogador_id']] = reservado.get(ordem['jogador_id'], 0.0) + ordem['quantity'] * ordem['price_per_unit'] * 1.1
+    for jogador_id, valor in reservado.items():
+        conn.execute(Jogador.__table__.update().where(Jogador.id == jogador_id).values(dinheiro_reservado=valor))
+    armazem_de = {j: a0 + i for i, j in enumerate(jogadores)}
+    for ordem in ordens:
+        if ordem['order_type'] == 'SELL':
+            conn.execute(ArmazemRecurso.__table__.update()
+                         .where(ArmazemRecurso.armazem_id == armazem_de[ordem['jogador_id']],
+                                ArmazemRecurso.tipo == ordem['resource_type'])
+                         .values(quantidade_reservada=ArmazemRecurso.quantidade_reservada + ordem['quantity']))
+
+    return {modelo.__tablename__: len(valores) for modelo, valores in linhas.items()}
+
+# ------------------ BENCHMARK: JOBS EM SEGUNDO PLANO ------------------
+
+def _percentil(valores, p):
+    """Percentil pelo método do posto mais próximo (ex: p=95)."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100.0 * len(ordenados)) - 1)]
+
+def bench_tick(tamanhos=(1000, 10000), n_regioes=20, repeticoes=5, fracao_vencida=0.05, echo=print):
+    """
+    Mede run_core_status_updates, cleanup_expired_market_orders e check_vehicle_validity
+    sobre um mundo sintético (generate_world) em um SQLite temporário, para cada número
+    de jogadores em 'tamanhos'. Cada repetição parte de uma cópia limpa do mesmo mundo.
+    O histórico é gravado na transação dos jobs (modo 'sync'), então os tempos incluem
+    os INSERTs que o modo 'buffered' faria depois, fora do tick.
+    Retorna {tamanho: {job: {'p50_ms', 'p95_ms', 'sql'}}} ('sql' = mediana de comandos SQL).
+    """
+    from app import create_app
+    from app.background_tasks import (run_core_status_updates, cleanup_expired_market_orders,
+                                      check_vehicle_validity)
+    from app.history_writer import history_writer
+    from config import Config
+
+    jobs = {
+        'run_core_status_updates': run_core_status_updates,
+        'cleanup_expired_market_orders': cleanup_expired_market_orders,
+        'check_vehicle_validity': check_vehicle_validity,
+    }
+
+    # O gravador de histórico é global e aponta para o banco deste processo: é
+    # desligado e o benchmark grava o histórico na própria transação (modo 'sync')
+    history_writer.shutdown()
+
+    relatorio = {}
+    for n_jogadores in tamanhos:
+        pasta = tempfile.mkdtemp(prefix='bench_tick_')
+        modelo_db = os.path.join(pasta, 'mundo.db')
+        trabalho_db = os.path.join(pasta, 'trabalho.db')
+        try:
+            engine = create_engine(f'sqlite:///{modelo_db}')
+            db.metadata.create_all(engine)
+            with engine.begin() as conn:
+                contagens = generate_world(conn, n_regioes, n_jogadores, fracao_vencida)
+            engine.dispose()
+
+            class BenchConfig(Config):
+                SQLALCHEMY_DATABASE_URI = f'sqlite:///{trabalho_db}'
+                SCHEDULER_IN_WEB = False
+                HISTORY_WRITE_MODE = 'sync'
+                COMPLETION_ENGINE = 'poll'
+
+            app = create_app(BenchConfig)
+            medidas = {nome: {'tempos': [], 'sql': []} for nome in jobs}
+
+            for _ in range(repeticoes):
+                with app.app_context():
+                    db.engine.dispose()
+                    shutil.copyfile(modelo_db, trabalho_db)
+                    motor = db.engine
+
+                for nome, job in jobs.items():
+                    comandos = [0]
+
+                    def contar(*_):
+                        comandos[0] += 1
+
+                    event.listen(motor, 'before_cursor_execute', contar)
+                    try:
+                        # Os jobs imprimem uma linha por entidade; fora do relatório
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            inicio = time.perf_counter()
+                            job(app)
+                            medidas[nome]['tempos'].append((time.perf_counter() - inicio) * 1000.0)
+                    finally:
+                        event.remove(motor, 'before_cursor_execute', contar)
+                    medidas[nome]['sql'].append(comandos[0])
+
+            with app.app_context():
+                db.engine.dispose()
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+        relatorio[n_jogadores] = {nome: {'p50_ms': _percentil(m['tempos'], 50), 'p95_ms': _percentil(m['tempos'], 95),
+                                         'sql': int(statistics.median(m['sql']))} for nome, m in medidas.items()}
+
+        echo(f"\n--- {n_jogadores} jogadores, {n_regioes} regiões ({repeticoes} execuções, {fracao_vencida:.0%} vencido) ---")
+        echo('Mundo: ' + ', '.join(f"{tabela}={quantidade}" for tabela, quantidade in contagens.items()))
+        echo(f"{'job':<32}{'p50 (ms)':>12}{'p95 (ms)':>12}{'SQL':>8}")
+        for nome, medida in relatorio[n_jogadores].items():
+            echo(f"{nome:<32}{medida['p50_ms']:>12.2f}{medida['p95_ms']:>12.2f}{medida['sql']:>8}")
+
+    return relatorio
+
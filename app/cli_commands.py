@@ -1,5 +1,6 @@
 import click
 from flask.cli import with_appcontext
+from datetime import datetime, timedelta
 from app import db
 from app.models import Jogador, Regiao, Empresa, Armazem, Veiculo, TipoVeiculo
 
@@ -131,6 +132,7 @@ def init_db_command():
                 velocidade=caminhao_3_4_tipo.velocidade,
                 custo_tonelada_km=caminhao_3_4_tipo.custo_tonelada_km,
                 validade_dias=caminhao_3_4_tipo.validade_dias,
+                data_expiracao=datetime.utcnow() + timedelta(days=caminhao_3_4_tipo.validade_dias),
                 nivel_especializacao_req=caminhao_3_4_tipo.nivel_especializacao_req
             )
             db.session.add(veiculo_inicial)
@@ -145,4 +147,75 @@ def init_db_command():
             print(f"Erro ao criar Armazém/Veículo: {e}")
     
     print("--- DADOS INICIAIS PROCESSADOS ---")
-    
\ No newline at end of file
+
+@click.command('bench-indexes')
+@click.option('--sizes', default='10000,100000', help='Linhas por tabela, separadas por vírgula.')
+@click.option('--repeat', default=5, help='Execuções por consulta (usa a mediana).')
+@with_appcontext
+def bench_indexes_command(sizes, repeat):
+    """Mede as consultas do tick sem e com os índices de prazo (SQLite temporário)."""
+    from app.benchmarks import bench_tick_indexes
+
+    tamanhos = [int(t) for t in sizes.split(',') if t.strip()]
+    bench_tick_indexes(tamanhos, repeticoes=repeat, echo=click.echo)
+
+@click.command('gen-world')
+@click.option('--regions', default=10, help='Regiões a criar.')
+@click.option('--players', default=1000, help='Jogadores a criar (com armazém, veículo, treinos, transportes...).')
+@click.option('--overdue', default=0.05, help='Fração das linhas temporizadas que já nasce vencida.')
+@click.option('--seed', default=42, help='Semente do gerador aleatório.')
+@with_appcontext
+def gen_world_command(regions, players, overdue, seed):
+    """Gera um mundo sintético no banco configurado (jogadores 'bench_N', sem senha válida)."""
+    from app.benchmarks import generate_world
+
+    contagens = generate_world(db.session.connection(), regions, players, fracao_vencida=overdue, seed=seed)
+    db.session.commit()
+    print('Mundo sintético criado: ' + ', '.join(f"{tabela}={quantidade}" for tabela, quantidade in contagens.items()))
+
+@click.command('bench-tick')
+@click.option('--sizes', default='1000,10000', help='Número de jogadores, separados por vírgula.')
+@click.option('--regions', default=20, help='Regiões do mundo sintético.')
+@click.option('--repeat', default=5, help='Execuções de cada job (p50/p95).')
+@click.option('--overdue', default=0.05, help='Fração das linhas temporizadas que já nasce vencida.')
+@with_appcontext
+def bench_tick_command(sizes, regions, repeat, overdue):
+    """Mede os jobs em segundo plano sobre um mundo sintético (SQLite temporário)."""
+    from app.benchmarks import bench_tick
+
+    tamanhos = [int(t) for t in sizes.split(',') if t.strip()]
+    bench_tick(tamanhos, n_regioes=regions, repeticoes=repeat, fracao_vencida=overdue, echo=click.echo)
+
+@click.command('rebuild-region-indices')
+@with_appcontext
+def rebuild_region_indices_command():
+    """Recalcula as somas regionais a partir dos jogadores e atualiza os índices."""
+    from app.services import region_service
+
+    regioes = region_service.reconstruir_agregados()
+    region_service.recalcular_indices_regionais()
+    db.session.commit()
+    print(f"Agregados e índices de {regioes} regiões reconstruídos.")
+
+@click.command('run-worker')
+@with_appcontext
+def run_worker_command():
+    """Roda os jobs em segundo plano (tick, limpezas, motor de conclusões) neste processo."""
+    import signal
+    import threading
+    from flask import current_app
+    from app import scheduler, start_background_jobs
+
+    app = current_app._get_current_object()
+    start_background_jobs(app)
+
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+    signal.signal(signal.SIGINT, lambda *_: parar.set())
+
+    print(f"Worker em execução ({len(scheduler.get_jobs())} jobs). Ctrl+C para encerrar.")
+    while not parar.wait(1):
+        pass
+
+    print("Encerrando o worker...")
+    scheduler.shutdown(wait=True)
@@ -0,0 +1,266 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.transacoes import PendentesDaTransacao
+
+class CompletionEngine:
+    """
+    Motor de conclusões das entidades temporizadas (treinos, viagens, colheitas...).
+
+    Mantém um heap com os prazos pendentes e uma thread que dorme até o próximo
+    vencimento, concluindo cada entidade no momento exato (em vez de esperar o
+    próximo tick de 60s). O heap é reconstruído do banco ao iniciar (até um
+    horizonte) e alimentado pelos INSERTs confirmados (commit) nesta mesma
+    aplicação. O reconcile(), chamado a cada tick, varre os prazos que estão para
+    vencer e agenda o que faltar (linhas de outros processos, além do horizonte...).
+    """
+
+    # Ao falhar, tenta concluir de novo depois deste intervalo
+    RETRY_APOS_ERRO = timedelta(seconds=60)
+    # O reconcile() (a cada tick de 60s) agenda o que vence até este tempo à frente
+    JANELA_RECONCILE = timedelta(seconds=90)
+
+    def __init__(self):
+        self.app = None
+        self._heap = []                 # (prazo, tipo, id)
+        self._agendados = {}            # (tipo, id) -> prazo vigente
+        self._cond = threading.Condition()
+        self._thread = None
+        self._rodando = False
+        self.proteger = None            # Envolve a thread de disparo (ex: leader_election.fenced)
+
+    def init_app(self, app, proteger=None):
+        self.app = app
+        self.proteger = proteger
+
+    @property
+    def running(self):
+        return self._rodando
+
+    # ------------------ CICLO DE VIDA ------------------
+    def start(self):
+        """Reconstrói o heap a partir do banco e inicia a thread de disparo."""
+        if self._rodando:
+            return
+        self.rebuild()
+        self._rodando = True
+        alvo = self.proteger(self._run) if self.proteger else self._run
+        self._thread = threading.Thread(target=alvo, name='completion-engine', daemon=True)
+        self._thread.start()
+
+    def reset_after_fork(self):
+        """Descarta o heap e a thread herdados do processo pai (o start() recarrega do banco)."""
+        self._heap = []
+        self._agendados = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._rodando = False
+
+    def shutdown(self):
+        with self._cond:
+            self._rodando = False
+            self._cond.notify_all()
+
+    def rebuild(self):
+        """
+        Recarrega do banco os prazos pendentes até COMPLETION_ENGINE_HORIZON_SECONDS
+        à frente (usado na inicialização). Os mais distantes entram pelo reconcile()
+        quando se aproximarem; entidades em quarentena ficam de fora.
+        """
+        from app.services.completion_service import TIMED_ENTITIES, sem_quarentena
+
+        with self._cond:
+            self._heap = []
+            self._agendados = {}
+
+        with self.app.app_context():
+            from app import db
+            horizonte = datetime.utcnow() + timedelta(seconds=self.app.config.get('COMPLETION_ENGINE_HORIZON_SECONDS', 3600))
+            for tipo, (modelo, coluna, _) in TIMED_ENTITIES.items():
+                prazo = getattr(modelo, coluna)
+                linhas = db.session.execute(
+                    select(modelo.id, prazo).where(prazo <= horizonte, sem_quarentena(tipo))
+                ).all()
+                for entidade_id, prazo_entidade in linhas:
+                    self.schedule(tipo, entidade_id, prazo_entidade)
+
+    def reconcile(self, now=None):
+        """
+        Agenda as entidades que vencem até JANELA_RECONCILE à frente e ainda não estão
+        no heap: criadas por outros processos (mesmo que confirmadas fora da ordem dos
+        ids), além do horizonte carregado no rebuild() ou perdidas por qualquer outro
+        motivo. Varredura pelo índice do prazo, sem as entidades em quarentena.
+        Retorna o número de entidades agendadas. Deve ser chamado dentro de um app context.
+        """
+        from app import db
+        from app.services.completion_service import TIMED_ENTITIES, sem_quarentena
+
+        limite = (now or datetime.utcnow()) + self.JANELA_RECONCILE
+        novos = 0
+        for tipo, (modelo, coluna, _) in TIMED_ENTITIES.items():
+            prazo = getattr(modelo, coluna)
+            linhas = db.session.execute(
+                select(modelo.id, prazo).where(prazo <= limite, sem_quarentena(tipo))
+            ).all()
+            for entidade_id, prazo_entidade in linhas:
+                # Já agendada (talvez para uma nova tentativa após erro): mantém o agendamento
+                with self._cond:
+                    if (tipo, entidade_id) in self._agendados:
+                        continue
+                self.schedule(tipo, entidade_id, prazo_entidade)
+                novos += 1
+        return novos
+
+    # ------------------ AGENDAMENTO ------------------
+    def schedule(self, tipo, entidade_id, prazo):
+        """Agenda (ou reagenda) a conclusão de uma entidade."""
+        if prazo is None:
+            return
+        with self._cond:
+            chave = (tipo, entidade_id)
+            if self._agendados.get(chave) == prazo:
+                return
+            self._agendados[chave] = prazo
+            heapq.heappush(self._heap, (prazo, tipo, entidade_id))
+
+            # Acorda a thread se este passou a ser o próximo prazo
+            if self._heap[0][2] == entidade_id and self._heap[0][1] == tipo:
+                self._cond.notify()
+
+    def pending(self):
+        """Número de conclusões agendadas."""
+        with self._cond:
+            return len(self._agendados)
+
+    def next_deadline(self):
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self):
+        """Espera até haver prazos vencidos e os retira do heap. Retorna [] ao desligar."""
+        with self._cond:
+            while self._rodando:
+                agora = datetime.utcnow()
+                if self._heap and self._heap[0][0] <= agora:
+                    vencidos = []
+                    while self._heap and self._heap[0][0] <= agora:
+                        prazo, tipo, entidade_id = heapq.heappop(self._heap)
+                        # Entradas antigas (reagendadas) são descartadas aqui
+                        if self._agendados.get((tipo, entidade_id)) == prazo:
+                            del self._agendados[(tipo, entidade_id)]
+                            vencidos.append((tipo, entidade_id))
+                    if vencidos:
+                        return vencidos
+                    continue
+
+                espera = (self._heap[0][0] - agora).total_seconds() if self._heap else None
+                self._cond.wait(timeout=espera)
+            return []
+
+    def _recuperar_atraso(self):
+        """
+        Após uma parada, drena o atraso acumulado em lotes, em ordem de prazo
+        (catch_up_backlog), em vez de disparar uma transação por entidade.
+        Retorna o número de conclusões feitas.
+        """
+        from app.background_tasks import catch_up_backlog
+
+        try:
+            return catch_up_backlog(self.app, continuar=lambda: self._rodando)
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] ERRO na recuperação de atraso: {e}")
+            return 0
+
+    def _run(self):
+        # O heap ainda tem as entidades drenadas na recuperação: recarrega só o que sobrou
+        if self._recuperar_atraso() and self._rodando:
+            self.rebuild()
+
+        from app.services.completion_service import BULK_HANDLERS
+
+        while self._rodando:
+            # Prazos do mesmo tipo vencendo juntos (ex: colheitas da mesma hora) vão em lote
+            em_lote = {}
+            for tipo, entidade_id in self._pop_due():
+                if tipo in BULK_HANDLERS:
+                    em_lote.setdefault(tipo, []).append(entidade_id)
+                else:
+                    self._fire(tipo, entidade_id)
+            for tipo, entidade_ids in em_lote.items():
+                if len(entidade_ids) > 1:
+                    self._fire_lote(tipo, entidade_ids)
+                else:
+                    self._fire(tipo, entidade_ids[0])
+
+    def _fire_lote(self, tipo, entidade_ids):
+        """Conclui várias entidades do tipo em uma transação; se falhar, uma a uma."""
+        from app import db
+        from app.services.completion_service import complete_due_many, limpar_falhas
+
+        with self.app.app_context():
+            try:
+                limpar_falhas(tipo, complete_due_many(tipo, entidade_ids))
+                db.session.commit()
+                return
+            except Exception as e:
+                db.session.rollback()
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] ERRO na conclusão em lote de {tipo} "
+                      f"({len(entidade_ids)}), concluindo uma a uma: {e}")
+
+        for entidade_id in entidade_ids:
+            self._fire(tipo, entidade_id)
+
+    def _fire(self, tipo, entidade_id):
+        """
+        Conclui uma entidade em sua própria transação. Em caso de erro registra a
+        falha (falha_conclusao) e tenta de novo após RETRY_APOS_ERRO, até a quarentena.
+        """
+        from app import db
+        from app.services.completion_service import complete_due, limpar_falhas, registrar_falha
+
+        with self.app.app_context():
+            try:
+                if complete_due(tipo, entidade_id):
+                    limpar_falhas(tipo, [entidade_id])
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                try:
+                    quarentena = registrar_falha(tipo, entidade_id, e)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    quarentena = False
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] ERRO ao concluir {tipo} ID {entidade_id}"
+                      f"{' (em quarentena)' if quarentena else ''}: {e}")
+                if not quarentena:
+                    self.schedule(tipo, entidade_id, datetime.utcnow() + self.RETRY_APOS_ERRO)
+
+completion_engine = CompletionEngine()
+
+# ------------------ ALIMENTAÇÃO PELOS INSERTS ------------------
+# As entidades novas são guardadas no flush e só entram no heap após o commit da
+# transação externa (um rollback descarta a lista; um SAVEPOINT desfeito, só a parte dele).
+
+def _agendar_apos_commit(pendentes):
+    for tipo, entidade_id, prazo in pendentes:
+        completion_engine.schedule(tipo, entidade_id, prazo)
+
+_pendentes = PendentesDaTransacao('completion_engine_pendentes', _agendar_apos_commit)
+
+def _tipos_por_modelo():
+    from app.services.completion_service import TIMED_ENTITIES
+    return {modelo: (tipo, coluna) for tipo, (modelo, coluna, _) in TIMED_ENTITIES.items()}
+
+@event.listens_for(Session, 'after_flush')
+def _coletar_entidades_temporizadas(session, flush_context):
+    if not completion_engine.running:
+        return
+    tipos = _tipos_por_modelo()
+    for obj in list(session.new) + list(session.dirty):
+        info = tipos.get(type(obj))
+        if info:
+            tipo, coluna = info
+            _pendentes.atual(session).append((tipo, obj.id, getattr(obj, coluna)))
@@ -3,9 +3,10 @@ from flask_login import login_required, current_user
 from app import db
 from app.utils import calculate_distance_km, format_currency_python
 from app.models import (Regiao, Jogador, ViagemAtiva, PedidoResidencia, Empresa, 
-                        Armazem, ArmazemRecurso, HistoricoAcao, TransporteAtivo, 
+                        Armazem, ArmazemRecurso, TransporteAtivo, 
                         Veiculo, RecursoNaMina, CampoAgricola, PlantioAtivo)
 from app.services import mining_service, player_service, farming_service, logistics_service, manufacturing_service
+from app.services.history_service import record_history
 from app.game_actions import bp
 from app.game_actions.forms import OpenCompanyForm, OpenCampoForm
 from datetime import datetime, timedelta
@@ -205,14 +206,13 @@ def open_company_view():
                 f"Abertura de Empresa Privada '{form.nome.data}'. Custo: R${custo_money:,.0f} e G{custo_gold:.2f}."
             )
             
-            hist = HistoricoAcao(
+            record_history(
                 jogador_id=jogador.id,
                 tipo_acao='COMPRA_EMPRESA',
                 descricao=descricao_acao,
                 dinheiro_delta=-custo_money,
                 gold_delta=-custo_gold
             )
-            db.session.add(hist)
 
             db.session.commit()
             
@@ -253,11 +253,11 @@ def mine_gold(empresa_id):
         flash("Você está em viagem e não pode trabalhar!", 'warning')
         return redirect(url_for('map.view_map'))
 
-    if energia_gasta < 10 or jogador.energia < energia_gasta:
-        flash(f'Você precisa de no mínimo 10 energia e tem {jogador.energia}.', 'danger')
+    if energia_gasta < 10 or jogador.energia_atual < energia_gasta:
+        flash(f'Você precisa de no mínimo 10 energia e tem {jogador.energia_atual}.', 'danger')
         return redirect(url_for('work.work_dashboard'))
 
-    if regiao.reserva_ouro <= 0:
+    if regiao.reserva_ouro_atual <= 0:
         flash('As reservas de ouro desta região estão esgotadas!', 'danger')
         return redirect(url_for('work.work_dashboard'))
 
@@ -306,11 +306,11 @@ def mine_iron(empresa_id):
         flash("Você está em viagem e não pode trabalhar!", 'warning')
         return redirect(url_for('map.view_map'))
         
-    if energia_gasta < 10 or jogador.energia < energia_gasta:
-        flash(f'Você precisa de no mínimo 10 energia e tem {jogador.energia}.', 'danger')
+    if energia_gasta < 10 or jogador.energia_atual < energia_gasta:
+        flash(f'Você precisa de no mínimo 10 energia e tem {jogador.energia_atual}.', 'danger')
         return redirect(url_for('work.work_dashboard'))
         
-    if regiao.reserva_ferro <= 0:
+    if regiao.reserva_ferro_atual <= 0:
         flash('As reservas de ferro desta região estão esgotadas!', 'danger')
         return redirect(url_for('work.work_dashboard'))
 
@@ -0,0 +1,157 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from app.transacoes import PendentesDaTransacao
+
+class HistoryWriter:
+    """
+    Gravação em segundo plano (write-behind) do HistoricoAcao.
+
+    As entradas confirmadas (após o commit da transação que as gerou) ficam em um
+    buffer em memória e são gravadas em lotes com um único INSERT executemany,
+    fora da transação do jogo. O lote é gravado quando atinge HISTORY_BATCH_SIZE
+    entradas, a cada HISTORY_FLUSH_SECONDS e no encerramento do processo.
+
+    Com 'gunicorn --preload' o start() roda no master, antes do fork: cada worker
+    herda o gravador sem a thread. O primeiro enqueue() em outro PID inicia a dele.
+
+    Uma queda abrupta do processo (kill -9) perde no máximo o buffer pendente.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.tamanho_lote = 500
+        self.intervalo = 2.0
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._lock_gravacao = threading.Lock()
+        self._thread = None
+        self._rodando = False
+        self._pid = None                # Processo dono da thread (ver _garantir_thread)
+        self._lock_pid = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.tamanho_lote = app.config.get('HISTORY_BATCH_SIZE', self.tamanho_lote)
+        self.intervalo = app.config.get('HISTORY_FLUSH_SECONDS', self.intervalo)
+
+    @property
+    def running(self):
+        return self._rodando
+
+    # ------------------ CICLO DE VIDA ------------------
+    def start(self):
+        if self._rodando:
+            return
+        if self._pid is None:
+            # Os handlers do atexit são herdados no fork: basta registrar uma vez
+            atexit.register(self.shutdown)
+        self._pid = os.getpid()
+        self._rodando = True
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def _garantir_thread(self):
+        """Num processo filho (fork) a thread do pai não existe: descarta o estado herdado e inicia a deste PID."""
+        with self._lock_pid:
+            if not self._rodando or self._pid == os.getpid():
+                return
+            # O buffer herdado é do pai, que o grava; locks podem ter sido copiados travados
+            self._buffer = []
+            self._cond = threading.Condition()
+            self._lock_gravacao = threading.Lock()
+            self._thread = None
+            self._rodando = False
+            self.start()
+
+    def shutdown(self):
+        """Para a thread e grava o que ainda estiver no buffer."""
+        with self._cond:
+            self._rodando = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.intervalo + 5)
+        self.flush()
+
+    # ------------------ BUFFER ------------------
+    def enqueue(self, entradas):
+        """Adiciona entradas já confirmadas ao buffer (dicts com as colunas do HistoricoAcao)."""
+        if not entradas:
+            return
+        self._garantir_thread()
+        with self._cond:
+            self._buffer.extend(entradas)
+            if len(self._buffer) >= self.tamanho_lote:
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def flush(self):
+        """Grava todo o buffer em lotes. Retorna o número de entradas gravadas."""
+        from app import db
+        from app.models import HistoricoAcao
+
+        with self._lock_gravacao:
+            with self._cond:
+                entradas, self._buffer = self._buffer, []
+            if not entradas or self.app is None:
+                return 0
+
+            gravadas = 0
+            with self.app.app_context():
+                for inicio in range(0, len(entradas), self.tamanho_lote):
+                    lote = entradas[inicio:inicio + self.tamanho_lote]
+                    try:
+                        with db.engine.begin() as conn:
+                            conn.execute(insert(HistoricoAcao), lote)
+                        gravadas += len(lote)
+                    except Exception as e:
+                        # Um registro inválido (ex: jogador excluído) não derruba o lote inteiro
+                        print(f"[{datetime.now().strftime('%H:%M:%S')}] ERRO ao gravar lote de histórico ({len(lote)}): {e}")
+                        gravadas += self._gravar_individualmente(lote)
+            return gravadas
+
+    def _gravar_individualmente(self, lote):
+        from app import db
+        from app.models import HistoricoAcao
+
+        gravadas = 0
+        for entrada in lote:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(HistoricoAcao), [entrada])
+                gravadas += 1
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Histórico descartado (jogador {entrada.get('jogador_id')}): {e}")
+        return gravadas
+
+    def _run(self):
+        proxima = time.monotonic() + self.intervalo
+        while True:
+            with self._cond:
+                while self._rodando and len(self._buffer) < self.tamanho_lote:
+                    espera = proxima - time.monotonic()
+                    if espera <= 0:
+                        break
+                    self._cond.wait(timeout=espera)
+                if not self._rodando:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] ERRO no gravador de histórico: {e}")
+            proxima = time.monotonic() + self.intervalo
+
+history_writer = HistoryWriter()
+
+# ------------------ ENTRADAS DA TRANSAÇÃO ------------------
+# record_history guarda as entradas na transação atual; só entram no buffer após o
+# commit da transação externa (um rollback descarta a lista, como aconteceria com
+# o INSERT; um SAVEPOINT desfeito descarta só as entradas dele).
+
+pendentes_historico = PendentesDaTransacao('historico_pendente', history_writer.enqueue)
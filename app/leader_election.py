@@ -0,0 +1,176 @@
+import atexit
+import functools
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+class LeaderElection:
+    """
+    Eleição de líder entre processos (workers do gunicorn) por concessão no banco.
+
+    Cada processo tenta, a cada SCHEDULER_LEASE_SECONDS / 3, tomar ou renovar a
+    linha 'scheduler' da tabela scheduler_lease com um UPDATE condicional
+    (dono = eu OU concessão expirada). Como o UPDATE é atômico, só um processo
+    vence. Se o líder morrer, a concessão expira e outro processo assume no
+    próximo ciclo. Funciona igual em SQLite, PostgreSQL e MySQL.
+
+    Um erro ao renovar (ex: "database is locked") não derruba o líder: ele só deixa
+    a liderança quando a última renovação bem-sucedida expira. Os jobs envolvidos
+    por fenced() não conseguem fazer commit depois disso (ver _exigir_lideranca).
+    """
+
+    NOME_CONCESSAO = 'scheduler'
+
+    def __init__(self):
+        self.app = None
+        self.identidade = None          # Definida no start() (de novo em cada worker: ver reset_after_fork)
+        self.duracao = timedelta(seconds=30)
+        self.ao_assumir = None
+        self.ao_perder = None
+        self._lider = False
+        self._valida_ate = datetime.min # Expiração da última concessão tomada/renovada com sucesso
+        self._local = threading.local() # Marca as threads que estão rodando um job (fenced)
+        self._parar = threading.Event()
+        self._thread = None
+
+    def init_app(self, app, ao_assumir=None, ao_perder=None):
+        self.app = app
+        self.duracao = timedelta(seconds=app.config.get('SCHEDULER_LEASE_SECONDS', 30))
+        self.ao_assumir = ao_assumir
+        self.ao_perder = ao_perder
+
+    @property
+    def is_leader(self):
+        """Líder com a concessão ainda válida (não basta ter sido eleito: ela pode ter expirado)."""
+        return self._lider and datetime.utcnow() < self._valida_ate
+
+    def fenced(self, funcao):
+        """Envolve um job: os commits feitos durante ele exigem a concessão ainda válida."""
+        @functools.wraps(funcao)
+        def job(*args, **kwargs):
+            self._local.protegido = True
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                self._local.protegido = False
+        return job
+
+    # ------------------ CICLO DE VIDA ------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        self.identidade = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def reset_after_fork(self):
+        """
+        Descarta o estado herdado do processo pai. No filho de um fork só existe a thread
+        que fez o fork: a de renovação ficou no pai, assim como a identidade e a concessão
+        (que são dele). Depois disto o start() sorteia uma identidade nova e cria a thread.
+        """
+        self.identidade = None
+        self._lider = False
+        self._valida_ate = datetime.min
+        self._local = threading.local()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def shutdown(self):
+        """Para de concorrer e libera a concessão (outro processo assume sem esperar a expiração)."""
+        self._parar.set()
+        if self._lider:
+            self._mudar_estado(False)
+            self._liberar()
+            self._valida_ate = datetime.min
+
+    def _run(self):
+        intervalo = self.duracao.total_seconds() / 3
+        while not self._parar.is_set():
+            lider = self.try_acquire()
+            if lider is None:
+                # Renovação indisponível: continua líder enquanto a última concessão valer
+                lider = self._lider and datetime.utcnow() < self._valida_ate
+            self._mudar_estado(lider)
+            self._parar.wait(intervalo)
+
+    # ------------------ CONCESSÃO ------------------
+    def try_acquire(self):
+        """
+        Toma ou renova a concessão. Retorna True se este processo é o líder, False se
+        outro é, e None se não foi possível saber (erro no banco).
+        """
+        from app import db
+        from app.models import SchedulerLease
+
+        agora = datetime.utcnow()
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    resultado = conn.execute(
+                        update(SchedulerLease)
+                        .where(SchedulerLease.nome == self.NOME_CONCESSAO,
+                               (SchedulerLease.dono == self.identidade) | (SchedulerLease.expira_em < agora))
+                        .values(dono=self.identidade, expira_em=agora + self.duracao)
+                    )
+                    if resultado.rowcount == 1:
+                        self._valida_ate = agora + self.duracao
+                        return True
+
+                # Primeira execução: a linha ainda não existe
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(insert(SchedulerLease).values(
+                            nome=self.NOME_CONCESSAO, dono=self.identidade, expira_em=agora + self.duracao
+                        ))
+                    self._valida_ate = agora + self.duracao
+                    return True
+                except IntegrityError:
+                    return False
+        except Exception as e:
+            # Sem banco (ou banco travado): tenta de novo no próximo ciclo
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Eleição de líder indisponível: {e}")
+            return None
+
+    def _liberar(self):
+        from app import db
+        from app.models import SchedulerLease
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        update(SchedulerLease)
+                        .where(SchedulerLease.nome == self.NOME_CONCESSAO, SchedulerLease.dono == self.identidade)
+                        .values(expira_em=datetime.utcnow())
+                    )
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro ao liberar a liderança: {e}")
+
+    def _mudar_estado(self, lider):
+        if lider == self._lider:
+            return
+        self._lider = lider
+        callback = self.ao_assumir if lider else self.ao_perder
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Processo {self.identidade} "
+              f"{'assumiu' if lider else 'perdeu'} a liderança dos jobs.")
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Erro na troca de liderança: {e}")
+
+leader_election = LeaderElection()
+
+@event.listens_for(Session, 'before_commit')
+def _exigir_lideranca(session):
+    """Fencing: um job de um líder que perdeu a concessão não grava nada (o commit falha e o job faz rollback)."""
+    if getattr(leader_election._local, 'protegido', False) and not leader_election.is_leader:
+        raise RuntimeError(f"Processo {leader_election.identidade} não é mais o líder: commit do job cancelado.")
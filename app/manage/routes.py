@@ -1,12 +1,15 @@
-from flask import render_template, redirect, url_for, flash
+from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
 from app.manage import bp
 from app.manage.forms import (RegionForm, PlayerForm, CompanyAdminForm, PlayerEditForm, RegionEditForm, CompanyEditForm, TipoVeiculoForm, ProductionRecipeForm)
 from werkzeug.security import generate_password_hash
+from datetime import datetime, timedelta
 
 from app.manage.forms import RegionForm, PlayerForm, CompanyAdminForm
-from app.models import Regiao, Jogador, Empresa, TipoVeiculo, ProductionRecipe, Veiculo
+from app.models import Regiao, Jogador, Empresa, TipoVeiculo, ProductionRecipe, Veiculo, FalhaConclusao
+from app.services import region_service
+from app.tick_metrics import tick_metrics
 from functools import wraps
 from config import Config
 
@@ -41,6 +44,46 @@ def manage_dashboard():
                            production_recipes=production_recipes,
                            **footer)
 
+@bp.route('/tick_metrics')
+@admin_required
+def view_tick_metrics():
+    """Tempos por fase dos últimos ticks do job de status (60s)."""
+    registros = tick_metrics.recent(limite=request.args.get('limite', 60, type=int))
+    falhas = FalhaConclusao.query.order_by(FalhaConclusao.ultima_falha.desc()).limit(100).all()
+
+    return render_template('manage/tick_metrics.html',
+                           title='Métricas do Tick',
+                           registros=registros,
+                           resumo=tick_metrics.summary(registros),
+                           falhas=falhas,
+                           max_tentativas=Config.TICK_MAX_TENTATIVAS,
+                           **footer)
+
+@bp.route('/completion_failure/<int:id>/release', methods=['POST'])
+@admin_required
+def release_completion_failure(id):
+    """Apaga a falha: a entidade sai da quarentena e volta a ser concluída pelo tick."""
+    falha = FalhaConclusao.query.get_or_404(id)
+    try:
+        db.session.delete(falha)
+        db.session.commit()
+        flash(f'{falha.tipo} ID {falha.entidade_id} liberado para nova tentativa.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erro ao liberar a falha: {e}', 'danger')
+    return redirect(url_for('manage.view_tick_metrics'))
+
+@bp.route('/tick_metrics.json')
+@admin_required
+def tick_metrics_json():
+    """Mesmos dados do painel, em JSON (para monitoração externa)."""
+    registros = tick_metrics.recent(limite=request.args.get('limite', 60, type=int))
+
+    return jsonify({
+        'resumo': tick_metrics.summary(registros),
+        'ticks': [dict(registro, inicio=registro['inicio'].isoformat()) for registro in registros],
+    })
+
 @bp.route('/create_region', methods=['GET', 'POST'])
 @admin_required 
 def create_region():
@@ -91,6 +134,8 @@ def create_region():
 @admin_required
 def edit_region(region_id):
     regiao = Regiao.query.get_or_404(region_id)
+    # O formulário mostra (e grava) as reservas já recarregadas, reiniciando a recarga
+    regiao.materializar_reservas()
     form = RegionEditForm(obj=regiao) 
 
     if form.validate_on_submit():
@@ -153,6 +198,7 @@ def create_player():
                     velocidade=rodotrem_tipo.velocidade,
                     custo_tonelada_km=rodotrem_tipo.custo_tonelada_km,
                     validade_dias=rodotrem_tipo.validade_dias,
+                    data_expiracao=datetime.utcnow() + timedelta(days=rodotrem_tipo.validade_dias),
                     nivel_especializacao_req=rodotrem_tipo.nivel_especializacao_req
                 )
                 db.session.add(veiculo_inicial)
@@ -172,13 +218,19 @@ def create_player():
 @admin_required
 def edit_player(player_id):
     jogador = Jogador.query.get_or_404(player_id)
+    jogador.materializar_energia() # O formulário mostra (e grava) a energia atual
     form = PlayerEditForm(obj=jogador)
     veiculos_do_jogador = Veiculo.query.filter_by(armazem_id=jogador.armazem.id).all()
 
     if form.validate_on_submit():
         try:
+            residencia_anterior = jogador.regiao_residencia_id
+
             # Atualiza todos os campos do formulário (exceto a senha)
             form.populate_obj(jogador) 
+
+            # Mantém os agregados regionais se a residência mudou
+            region_service.registrar_mudanca_residencia(jogador, residencia_anterior, jogador.regiao_residencia_id)
             
             # Atualiza a senha se for fornecida
             if form.new_password.data:
@@ -290,6 +342,9 @@ def delete_data(model_name, id):
     nome = getattr(objeto, 'username', getattr(objeto, 'nome', f'ID {id}')) # Nome amigável
     
     try:
+        if isinstance(objeto, Jogador):
+            region_service.registrar_remocao_jogador(objeto)
+
         # Nota: O SQLAlchemy deve cuidar de Foreign Keys com cascade, mas é bom testar
         db.session.delete(objeto)
         db.session.commit()
@@ -2,16 +2,18 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, FloatField, SubmitField, SelectField
 from wtforms.validators import DataRequired, NumberRange
 
+# Lista de recursos que podem ser negociados
+# (Pode ser populada dinamicamente no futuro, por enquanto 'gold', 'ferro' e 'milho')
+RECURSOS_NEGOCIAVEIS = [
+    ('gold', 'Gold (Kg)'),
+    ('ferro', 'Ferro (ton)'),
+    ('milho', 'Milho (ton)'),
+]
+
 class MarketOrderForm(FlaskForm):
     """Formulário genérico para criar uma ordem de Venda ou Compra."""
-    
-    # Lista de recursos que podem ser negociados
-    # (Pode ser populada dinamicamente no futuro, por enquanto 'gold' e 'ferro')
-    resource_type = SelectField('Recurso', choices=[
-        ('gold', 'Gold (Kg)'),
-        ('ferro', 'Ferro (ton)'),
-        ('milho', 'Milho (ton)'),
-    ], validators=[DataRequired()])
+
+    resource_type = SelectField('Recurso', choices=RECURSOS_NEGOCIAVEIS, validators=[DataRequired()])
 
     quantity = FloatField('Quantidade', validators=[
         DataRequired(), 
@@ -24,4 +26,26 @@ class MarketOrderForm(FlaskForm):
     ])
     
     submit_sell = SubmitField('Criar Ordem de Venda')
-    submit_buy = SubmitField('Criar Ordem de Compra')
\ No newline at end of file
+    submit_buy = SubmitField('Criar Ordem de Compra')
+
+class MarketSweepForm(FlaskForm):
+    """Varredura: executa várias ordens do livro de uma vez, até um preço limite."""
+
+    resource_type = SelectField('Recurso', choices=RECURSOS_NEGOCIAVEIS, validators=[DataRequired()])
+
+    side = SelectField('Operação', choices=[
+        ('BUY', 'Comprar (das ordens de venda)'),
+        ('SELL', 'Vender (para as ordens de compra)'),
+    ], validators=[DataRequired()])
+
+    quantity = FloatField('Quantidade', validators=[
+        DataRequired(),
+        NumberRange(min=1, message="A quantidade deve ser de pelo menos 1.")
+    ])
+
+    limit_price = FloatField('Preço Limite (R$)', validators=[
+        DataRequired(),
+        NumberRange(min=1, message="O preço deve ser de pelo menos R$ 1.")
+    ])
+
+    submit_sweep = SubmitField('Executar Varredura')
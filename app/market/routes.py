@@ -1,15 +1,36 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app import db
 from app.market import bp
-from app.models import Jogador, MarketOrder
-from app.market.forms import MarketOrderForm
-from app.services import market_service
+from app.models import Jogador, MarketOrder, Regiao
+from app.market.forms import MarketOrderForm, MarketSweepForm
+from app.services import market_service, trade_service
+from app.market_depth import market_depth
 from config import Config
 from sqlalchemy import or_
 
 footer = {'ano': Config.ANO_ATUAL, 'versao': Config.VERSAO_APP}
 
+RECURSOS_MERCADO = ('gold', 'ferro', 'milho')
+
+def _ler_cursor(valor):
+    """Cursor de página 'preço_id' (ex: '128.0_1438') -> (128.0, 1438); inválido vira None."""
+    try:
+        preco, ordem_id = valor.split('_')
+        return (float(preco), int(ordem_id))
+    except (AttributeError, ValueError):
+        return None
+
+def _escrever_cursor(cursor):
+    return f"{cursor[0]!r}_{cursor[1]}" if cursor else None
+
+def _filtros_mercado():
+    """Filtros de recurso e região da query string (valores desconhecidos são ignorados)."""
+    resource_type = request.args.get('resource_type')
+    if resource_type not in RECURSOS_MERCADO:
+        resource_type = None
+    return resource_type, request.args.get('regiao_id', type=int)
+
 @bp.route('/', methods=['GET', 'POST'])
 @login_required
 def view_market():
@@ -54,28 +75,39 @@ def view_market():
         return redirect(url_for('market.view_market'))
 
     # --- Lógica de MOSTRAR MERCADO (GET) ---
+    # Uma página de cada lado, com filtros e paginação por chave (preço, id)
+    resource_type, regiao_id = _filtros_mercado()
+    tamanho_pagina = current_app.config['MARKET_PAGE_SIZE']
     
     # 1. Ordens de Venda (As mais baratas primeiro)
-    sell_orders = MarketOrder.query.filter(
-        MarketOrder.order_type == 'SELL',
-        MarketOrder.status == 'ACTIVE',
-        MarketOrder.jogador_id != jogador.id # Não mostrar suas próprias ordens de venda
-    ).order_by(MarketOrder.price_per_unit.asc()).all()
+    sell_orders, proxima_venda = market_service.list_orders(
+        'SELL', resource_type=resource_type, regiao_id=regiao_id,
+        excluir_jogador_id=jogador.id, # Não mostrar suas próprias ordens de venda
+        apos=_ler_cursor(request.args.get('apos_venda')), limite=tamanho_pagina
+    )
 
     # 2. Ordens de Compra (As mais caras primeiro)
-    buy_orders = MarketOrder.query.filter(
-        MarketOrder.order_type == 'BUY',
-        MarketOrder.status == 'ACTIVE',
-        MarketOrder.jogador_id != jogador.id # Não mostrar suas próprias ordens de compra
-    ).order_by(MarketOrder.price_per_unit.desc()).all()
+    buy_orders, proxima_compra = market_service.list_orders(
+        'BUY', resource_type=resource_type, regiao_id=regiao_id,
+        excluir_jogador_id=jogador.id, # Não mostrar suas próprias ordens de compra
+        apos=_ler_cursor(request.args.get('apos_compra')), limite=tamanho_pagina
+    )
 
-    # 3. Minhas Ordens Ativas
+    # 3. Profundidade: melhor compra/venda de cada recurso e a escada do recurso filtrado
+    melhores_precos = {recurso: market_depth.best(recurso) for recurso in RECURSOS_MERCADO}
+    escada = None
+    if resource_type:
+        niveis = current_app.config['MARKET_DEPTH_LEVELS']
+        escada = {'compra': market_depth.ladder(resource_type, 'BUY', niveis),
+                  'venda': market_depth.ladder(resource_type, 'SELL', niveis)}
+
+    # 4. Minhas Ordens Ativas
     my_active_orders = MarketOrder.query.filter(
         MarketOrder.jogador_id == jogador.id,
         MarketOrder.status == 'ACTIVE'
     ).order_by(MarketOrder.data_criacao.desc()).all()
     
-    # 4. Saldo Disponível (calculando o que está reservado)
+    # 5. Saldo Disponível (calculando o que está reservado)
     recursos_armazem = {r.tipo: (r.quantidade - r.quantidade_reservada) for r in jogador.armazem.recursos.all()}
     dinheiro_disponivel = jogador.dinheiro - jogador.dinheiro_reservado
 
@@ -88,8 +120,76 @@ def view_market():
                            my_active_orders=my_active_orders,
                            recursos_armazem=recursos_armazem,
                            dinheiro_disponivel=dinheiro_disponivel,
+                           regioes=Regiao.query.order_by(Regiao.nome).all(),
+                           recursos_mercado=RECURSOS_MERCADO,
+                           filtro_recurso=resource_type,
+                           filtro_regiao=regiao_id,
+                           proxima_venda=_escrever_cursor(proxima_venda),
+                           proxima_compra=_escrever_cursor(proxima_compra),
+                           aba=request.args.get('aba', 'venda'),
+                           sweep_form=MarketSweepForm(prefix='sweep'),
+                           melhores_precos=melhores_precos,
+                           escada=escada,
                            **footer)
 
+@bp.route('/orders.json')
+@login_required
+def orders_json():
+    """
+    Uma página do livro em JSON: ?side=SELL|BUY&resource_type=&regiao_id=&apos=&limite=
+    'proxima' é o cursor para o parâmetro 'apos' da página seguinte (null no fim).
+    """
+    side = request.args.get('side', 'SELL').upper()
+    if side not in ('SELL', 'BUY'):
+        return jsonify({'erro': "side deve ser SELL ou BUY."}), 400
+
+    resource_type, regiao_id = _filtros_mercado()
+    limite = min(max(request.args.get('limite', current_app.config['MARKET_PAGE_SIZE'], type=int), 1), 200)
+    ordens, proxima = market_service.list_orders(
+        side, resource_type=resource_type, regiao_id=regiao_id,
+        apos=_ler_cursor(request.args.get('apos')), limite=limite
+    )
+
+    return jsonify({
+        'ordens': [{
+            'id': ordem.id,
+            'jogador': ordem.jogador.username,
+            'regiao_id': ordem.regiao_id,
+            'order_type': ordem.order_type,
+            'resource_type': ordem.resource_type,
+            'price_per_unit': ordem.price_per_unit,
+            'quantity_remaining': ordem.quantity_remaining,
+            'data_expiracao': ordem.data_expiracao.isoformat(),
+        } for ordem in ordens],
+        'proxima': _escrever_cursor(proxima),
+    })
+
+@bp.route('/depth.json')
+@login_required
+def depth_json():
+    """Escada de profundidade de um recurso: ?resource_type=ferro&niveis=10"""
+    resource_type, _ = _filtros_mercado()
+    if not resource_type:
+        return jsonify({'erro': f"resource_type deve ser um de: {', '.join(RECURSOS_MERCADO)}."}), 400
+
+    niveis = min(max(request.args.get('niveis', current_app.config['MARKET_DEPTH_LEVELS'], type=int), 1), 100)
+    compra = market_depth.ladder(resource_type, 'BUY', niveis)
+    venda = market_depth.ladder(resource_type, 'SELL', niveis)
+
+    def _niveis(escada):
+        return [{'price_per_unit': preco, 'quantity': quantidade, 'ordens': ordens} for preco, quantidade, ordens in escada]
+
+    melhor_compra = compra[0][0] if compra else None
+    melhor_venda = venda[0][0] if venda else None
+    return jsonify({
+        'resource_type': resource_type,
+        'melhor_compra': melhor_compra,
+        'melhor_venda': melhor_venda,
+        'spread': melhor_venda - melhor_compra if compra and venda else None,
+        'compra': _niveis(compra),
+        'venda': _niveis(venda),
+    })
+
 @bp.route('/fill/<int:order_id>', methods=['POST'])
 @login_required
 def fill_order(order_id):
@@ -121,6 +221,40 @@ def fill_order(order_id):
 
     return redirect(url_for('market.view_market'))
 
+@bp.route('/sweep', methods=['POST'])
+@login_required
+def sweep_orders():
+    """Varredura: executa várias ordens do livro até a quantidade/preço limite, em um único commit."""
+    jogador = Jogador.query.get(current_user.id)
+    form = MarketSweepForm(prefix='sweep')
+
+    if not form.validate_on_submit():
+        for erros in form.errors.values():
+            flash(erros[0], 'danger')
+        return redirect(url_for('market.view_market'))
+
+    try:
+        success, message = market_service.sweep_orders(
+            taker_jogador=jogador,
+            resource_type=form.resource_type.data,
+            side=form.side.data,
+            quantity=form.quantity.data,
+            limit_price=form.limit_price.data
+        )
+
+        if success:
+            db.session.commit()
+            flash(message, 'success')
+        else:
+            db.session.rollback()
+            flash(message, 'danger')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Erro ao processar varredura: {e}", 'danger')
+
+    return redirect(url_for('market.view_market', resource_type=form.resource_type.data))
+
 @bp.route('/cancel/<int:order_id>', methods=['POST'])
 @login_required
 def cancel_order(order_id):
@@ -144,3 +278,31 @@ def cancel_order(order_id):
         flash(f"Erro ao cancelar ordem: {e}", 'danger')
 
     return redirect(url_for('market.view_market'))
+
+@bp.route('/candles.json')
+@login_required
+def candles_json():
+    """Velas OHLCV de um recurso para gráficos: ?resource_type=ferro&intervalo=1h&limite=100"""
+    resource_type, _ = _filtros_mercado()
+    intervalo = request.args.get('intervalo', '1h')
+    if not resource_type or intervalo not in trade_service.INTERVALOS_VELA:
+        return jsonify({'erro': f"Informe resource_type ({', '.join(RECURSOS_MERCADO)}) e intervalo "
+                                f"({', '.join(trade_service.INTERVALOS_VELA)})."}), 400
+
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 1000)
+    velas = trade_service.get_candles(resource_type, intervalo, limite)
+
+    return jsonify({
+        'resource_type': resource_type,
+        'intervalo': intervalo,
+        'velas': [{
+            'inicio': vela.inicio.isoformat(),
+            'abertura': vela.abertura,
+            'maxima': vela.maxima,
+            'minima': vela.minima,
+            'fechamento': vela.fechamento,
+            'volume': vela.volume,
+            'valor': vela.valor,
+            'negocios': vela.negocios,
+        } for vela in velas],
+    })
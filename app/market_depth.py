@@ -0,0 +1,111 @@
+import threading
+import time
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.transacoes import PendentesDaTransacao
+
+class MarketDepth:
+    """
+    Escada de profundidade do mercado: por recurso e lado, a quantidade restante e
+    o número de ordens ATIVAS em cada preço (SUM/COUNT agrupados por preço).
+
+    Cada (recurso, lado) é carregado uma vez com um GROUP BY e depois mantido por
+    nível: as transações que criam, executam, cancelam ou expiram ordens marcam só
+    os preços tocados, que são recalculados (WHERE price IN ...) na próxima leitura.
+    Mudanças feitas por outros processos (ex: limpeza no 'flask run-worker') não
+    chegam aqui; por isso cada lado é recarregado inteiro a cada MARKET_DEPTH_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.ttl = 30.0
+        self._niveis = {}               # (recurso, tipo) -> {preço: (quantidade, ordens)}
+        self._carregado_em = {}         # (recurso, tipo) -> time.monotonic() da carga completa
+        self._sujos = {}                # (recurso, tipo) -> preços a recalcular
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('MARKET_DEPTH_TTL_SECONDS', self.ttl)
+
+    # ------------------ INVALIDAÇÃO ------------------
+    def invalidate(self, niveis):
+        """Marca níveis (recurso, tipo, preço) para recálculo; lados ainda não carregados são ignorados."""
+        with self._lock:
+            for recurso, tipo, preco in niveis:
+                if (recurso, tipo) in self._niveis:
+                    self._sujos.setdefault((recurso, tipo), set()).add(preco)
+
+    def clear(self):
+        with self._lock:
+            self._niveis, self._carregado_em, self._sujos = {}, {}, {}
+
+    # ------------------ LEITURA ------------------
+    def _consulta(self, recurso, tipo):
+        from app.models import MarketOrder
+
+        return (select(MarketOrder.price_per_unit, func.sum(MarketOrder.quantity_remaining), func.count(MarketOrder.id))
+                .where(MarketOrder.status == 'ACTIVE', MarketOrder.order_type == tipo, MarketOrder.resource_type == recurso)
+                .group_by(MarketOrder.price_per_unit))
+
+    def _atualizar(self, recurso, tipo):
+        from app import db
+        from app.models import MarketOrder
+
+        chave = (recurso, tipo)
+        with self._lock:
+            carregado_em = self._carregado_em.get(chave)
+            vencido = carregado_em is None or time.monotonic() - carregado_em > self.ttl
+            sujos = self._sujos.pop(chave, set())
+
+        if vencido:
+            linhas = db.session.execute(self._consulta(recurso, tipo)).all()
+            with self._lock:
+                self._niveis[chave] = {preco: (quantidade, ordens) for preco, quantidade, ordens in linhas}
+                self._carregado_em[chave] = time.monotonic()
+        elif sujos:
+            linhas = db.session.execute(
+                self._consulta(recurso, tipo).where(MarketOrder.price_per_unit.in_(sujos))
+            ).all()
+            with self._lock:
+                niveis = self._niveis[chave]
+                for preco in sujos:
+                    niveis.pop(preco, None)
+                for preco, quantidade, ordens in linhas:
+                    niveis[preco] = (quantidade, ordens)
+
+    def ladder(self, recurso, tipo, limite=20):
+        """Os 'limite' melhores níveis de um lado: [(preço, quantidade, ordens)], do melhor para o pior."""
+        self._atualizar(recurso, tipo)
+        with self._lock:
+            niveis = sorted(self._niveis[(recurso, tipo)].items(), reverse=(tipo == 'BUY'))
+        return [(preco, quantidade, ordens) for preco, (quantidade, ordens) in niveis[:limite]]
+
+    def best(self, recurso):
+        """(melhor compra, melhor venda) do recurso; None se o lado estiver vazio."""
+        compra = self.ladder(recurso, 'BUY', limite=1)
+        venda = self.ladder(recurso, 'SELL', limite=1)
+        return (compra[0][0] if compra else None, venda[0][0] if venda else None)
+
+market_depth = MarketDepth()
+
+# ------------------ NÍVEIS TOCADOS PELAS TRANSAÇÕES ------------------
+# Os níveis das ordens alteradas são guardados no flush e só são invalidados após
+# o commit da transação externa (um SAVEPOINT desfeito descarta só os níveis dele).
+# Alterações em lote por SQL (ex: expire_orders) usam invalidate_after_commit.
+
+_pendentes = PendentesDaTransacao('market_depth_niveis', market_depth.invalidate, nova=set, somar=set.update)
+
+def invalidate_after_commit(session, niveis):
+    """Invalida os níveis (recurso, tipo, preço) quando a transação atual for confirmada."""
+    _pendentes.atual(session).update(niveis)
+
+@event.listens_for(Session, 'after_flush')
+def _coletar_niveis(session, flush_context):
+    from app.models import MarketOrder
+
+    niveis = {(obj.resource_type, obj.order_type, obj.price_per_unit)
+              for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+              if isinstance(obj, MarketOrder)}
+    if niveis:
+        invalidate_after_commit(session, niveis)
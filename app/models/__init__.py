@@ -3,6 +3,7 @@ from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -57,6 +58,45 @@ class Jogador(db.Model, UserMixin):
                                    uselist=False, 
                                    lazy='select')
     
+    # ------------------ ENERGIA (CÁLCULO SOB DEMANDA) ------------------
+    def calcular_energia(self, now=None):
+        """
+        Calcula a energia regenerada desde last_status_update, sem gravar.
+        Mesma regra do tick: minutos completos * taxa * (1 + índice de saúde da região atual).
+        Retorna (energia, novo_last_status_update).
+        """
+        now = now or datetime.utcnow()
+        energia = self.energia or 0
+        
+        if energia >= Config.MAX_ENERGIA or self.last_status_update is None:
+            return energia, now
+
+        minutos = int((now - self.last_status_update).total_seconds() // 60)
+        if minutos <= 0:
+            return energia, self.last_status_update
+
+        regiao = self.regiao_atual
+        multiplicador_saude = 1.0 + (regiao.indice_saude if regiao else 0.0)
+        nova_energia = min(energia + int(minutos * Config.ENERGIA_POR_MINUTO * multiplicador_saude), Config.MAX_ENERGIA)
+        
+        # No máximo, o timer não importa mais: recomeça a contar a partir de agora
+        if nova_energia >= Config.MAX_ENERGIA:
+            return nova_energia, now
+        return nova_energia, self.last_status_update + timedelta(minutes=minutos)
+
+    @property
+    def energia_atual(self):
+        """Energia atual do jogador (inclui a regeneração ainda não gravada)."""
+        return self.calcular_energia()[0]
+
+    def materializar_energia(self, now=None):
+        """
+        Grava a energia regenerada em 'energia' e 'last_status_update'.
+        Deve ser chamado antes de gastar energia ou de mudar a região atual.
+        """
+        self.energia, self.last_status_update = self.calcular_energia(now)
+        return self.energia
+
     def check_level_up(self):
         """Verifica se o jogador pode subir de nível e o faz, se possível."""
         
@@ -204,6 +244,10 @@ class Regiao(db.Model):
     reserva_ferro = db.Column(db.Float, default=10000.0)
     reserva_ferro_max = db.Column(db.Float, default=10000.0)
 
+    # Momento em que as reservas foram gravadas pela última vez; a recarga desde
+    # então é calculada na leitura (ver calcular_reserva)
+    last_reserve_update = db.Column(db.DateTime, default=datetime.utcnow)
+
     empresas = db.relationship('Empresa', 
                                backref='regiao', 
                                lazy='dynamic',
@@ -218,9 +262,51 @@ class Regiao(db.Model):
 
     taxa_imposto_geral = db.Column(db.Float, default=0.05)
 
+    # Somas das habilidades dos residentes (mantidas por delta, ver region_service)
+    soma_educacao = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    soma_saude = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    soma_filantropia = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    # Marcado quando alguma soma muda; o tick só recalcula os índices se houver pendência
+    indices_pendentes = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+
     def __repr__(self):
         return f'<Regiao {self.nome}>'
     
+    # ------------------ RESERVAS (RECARGA CONTÍNUA SOB DEMANDA) ------------------
+    RECURSOS_COM_RESERVA = ('ouro', 'ferro')
+
+    def calcular_reserva(self, recurso, now=None):
+        """
+        Reserva atual de 'ouro' ou 'ferro', sem gravar: a reserva gravada mais a
+        recarga contínua desde last_reserve_update (de 0 ao máximo em
+        RESERVE_REFILL_HOURS), limitada ao máximo.
+        """
+        now = now or datetime.utcnow()
+        atual = getattr(self, f'reserva_{recurso}') or 0.0
+        maximo = getattr(self, f'reserva_{recurso}_max') or 0.0
+
+        if atual >= maximo or self.last_reserve_update is None:
+            return atual
+
+        segundos = max(0.0, (now - self.last_reserve_update).total_seconds())
+        recarga = maximo * segundos / (Config.RESERVE_REFILL_HOURS * 3600.0)
+        return min(maximo, atual + recarga)
+
+    @property
+    def reserva_ouro_atual(self):
+        return self.calcular_reserva('ouro')
+
+    @property
+    def reserva_ferro_atual(self):
+        return self.calcular_reserva('ferro')
+
+    def materializar_reservas(self, now=None):
+        """Grava as reservas recarregadas e reinicia o relógio da recarga."""
+        now = now or datetime.utcnow()
+        for recurso in self.RECURSOS_COM_RESERVA:
+            setattr(self, f'reserva_{recurso}', self.calcular_reserva(recurso, now))
+        self.last_reserve_update = now
+
     def calcular_taxa_imposto(self):
         """Calcula a taxa de imposto com base no indice_desenvolvimento (1 a 10)."""
         
@@ -257,7 +343,7 @@ class TreinamentoAtivo(db.Model):
     nivel_alvo = db.Column(db.Float, nullable=False)
     
     # Momento em que o treino deve ser concluído
-    data_fim = db.Column(db.DateTime, nullable=False) 
+    data_fim = db.Column(db.DateTime, nullable=False, index=True) 
 
     def __repr__(self):
         return f'<Treino: Jogador {self.jogador_id} -> {self.habilidade} (Nv {self.nivel_alvo})>'
@@ -303,7 +389,7 @@ class ProductionJob(db.Model):
     # Multiplicador usado (Quantos ciclos foram iniciados)
     quantity_multiplier = db.Column(db.Integer, nullable=False) 
     
-    data_fim = db.Column(db.DateTime, nullable=False) 
+    data_fim = db.Column(db.DateTime, nullable=False, index=True) 
 
     # Relações
     jogador = db.relationship('Jogador', backref='production_jobs')
@@ -354,7 +440,7 @@ class ViagemAtiva(db.Model):
     destino_id = db.Column(db.Integer, db.ForeignKey('regiao.id'), nullable=False)
     
     # Momento em que a viagem deve ser concluída
-    data_fim = db.Column(db.DateTime, nullable=False) 
+    data_fim = db.Column(db.DateTime, nullable=False, index=True) 
 
     # RELACIONAMENTO: Conecta ViagemAtiva ao Jogador
     jogador = db.relationship('Jogador', backref='viagem_ativa', uselist=False) 
@@ -372,7 +458,7 @@ class PedidoResidencia(db.Model):
     regiao_destino_id = db.Column(db.Integer, db.ForeignKey('regiao.id'), nullable=False)
     
     # Momento em que o pedido será aprovado (6 horas após o pedido)
-    data_aprovacao = db.Column(db.DateTime, nullable=False) 
+    data_aprovacao = db.Column(db.DateTime, nullable=False, index=True) 
 
     jogador = db.relationship('Jogador', backref='pedido_residencia_ativo', uselist=False)
     regiao_destino = db.relationship('Regiao', foreign_keys=[regiao_destino_id])
@@ -401,6 +487,10 @@ class HistoricoAcao(db.Model):
     # Relacionamento para acesso fácil ao jogador
     jogador = db.relationship('Jogador', backref=db.backref('historico_acoes', order_by=timestamp.desc()))
 
+    __table_args__ = (
+        db.Index('ix_historico_acao_jogador_timestamp', 'jogador_id', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<Ação {self.tipo_acao} por Jogador {self.jogador_id}>'
     
@@ -538,6 +628,7 @@ class Veiculo(db.Model):
     # Duração e Nível
     data_compra = db.Column(db.DateTime, default=datetime.utcnow)
     validade_dias = db.Column(db.Integer, nullable=False) # Duração (ex: 30 dias)
+    data_expiracao = db.Column(db.DateTime, nullable=True, index=True) # data_compra + validade_dias (gravada na compra)
     nivel_especializacao_req = db.Column(db.Integer, default=1) # Nível do Armazém necessário
 
 class TipoVeiculo(db.Model):
@@ -576,7 +667,7 @@ class TransporteAtivo(db.Model):
     tipo_recurso = db.Column(db.String(50), nullable=False)
     quantidade = db.Column(db.Float, nullable=False)
     
-    data_fim = db.Column(db.DateTime, nullable=False) 
+    data_fim = db.Column(db.DateTime, nullable=False, index=True) 
 
     # Relações
     jogador = db.relationship('Jogador', backref='transporte_ativo')
@@ -591,11 +682,15 @@ class RecursoNaMina(db.Model):
     jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
     regiao_id = db.Column(db.Integer, db.ForeignKey('regiao.id'), nullable=False)
 
-    data_expiracao = db.Column(db.DateTime, nullable=False)
+    data_expiracao = db.Column(db.DateTime, nullable=False, index=True)
     
     tipo_recurso = db.Column(db.String(50), nullable=False) # e.g., 'ferro', 'ouro'
     quantidade = db.Column(db.Float, default=0.0)
 
+    __table_args__ = (
+        db.Index('ix_recurso_na_mina_jogador_regiao_tipo', 'jogador_id', 'regiao_id', 'tipo_recurso'),
+    )
+
     # Relacionamentos
     jogador = db.relationship('Jogador', backref='recursos_na_mina')
     regiao = db.relationship('Regiao', backref='recursos_minerados')
@@ -617,11 +712,67 @@ class MarketOrder(db.Model):
     
     status = db.Column(db.String(10), default='ACTIVE') # ACTIVE, COMPLETED, CANCELLED, EXPIRED
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
-    data_expiracao = db.Column(db.DateTime, nullable=False)
+    data_expiracao = db.Column(db.DateTime, nullable=False, index=True)
 
     jogador = db.relationship('Jogador', backref='market_orders')
     regiao = db.relationship('Regiao')
 
+    __table_args__ = (
+        # Livro de ofertas: ordens ativas de um lado/recurso ordenadas por preço
+        # (o id desempata a paginação por chave)
+        db.Index('ix_market_order_book', 'status', 'order_type', 'resource_type', 'price_per_unit', 'id'),
+        # Mesma ordem sem filtro de recurso (listagem geral ou só por região)
+        db.Index('ix_market_order_price', 'status', 'order_type', 'price_per_unit', 'id'),
+    )
+
+class MarketTrade(db.Model):
+    """Negócio executado no mercado (uma execução de ordem), ver app/services/trade_service.py."""
+    __tablename__ = 'market_trade'
+    __table_args__ = (
+        # Histórico de preços de um recurso
+        db.Index('ix_market_trade_recurso_data', 'resource_type', 'data'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('market_order.id'), nullable=False, index=True)
+    comprador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
+    vendedor_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
+    resource_type = db.Column(db.String(50), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    price_per_unit = db.Column(db.Float, nullable=False)
+    total_value = db.Column(db.Float, nullable=False)
+    imposto = db.Column(db.Float, nullable=False, default=0.0)     # Pago pelo criador da ordem
+    lado_agressor = db.Column(db.String(4), nullable=False)         # 'BUY' (taker comprou) ou 'SELL' (taker vendeu)
+    data = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MarketTrade {self.resource_type} {self.quantity:.0f} @ {self.price_per_unit:.2f}>'
+
+class MarketCandle(db.Model):
+    """
+    Vela OHLCV de um recurso em um intervalo ('1m', '1h', '1d'), atualizada a cada
+    negócio (não recalculada), ver app/services/trade_service.py.
+    """
+    __tablename__ = 'market_candle'
+    __table_args__ = (
+        db.UniqueConstraint('resource_type', 'intervalo', 'inicio', name='uq_market_candle_recurso_intervalo_inicio'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    resource_type = db.Column(db.String(50), nullable=False)
+    intervalo = db.Column(db.String(3), nullable=False)
+    inicio = db.Column(db.DateTime, nullable=False)                 # Início do intervalo (UTC)
+    abertura = db.Column(db.Float, nullable=False)
+    maxima = db.Column(db.Float, nullable=False)
+    minima = db.Column(db.Float, nullable=False)
+    fechamento = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.Float, nullable=False, default=0.0)       # Quantidade negociada
+    valor = db.Column(db.Float, nullable=False, default=0.0)        # Soma de quantidade * preço
+    negocios = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MarketCandle {self.resource_type} {self.intervalo} {self.inicio}>'
+
 class CampoAgricola(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -635,7 +786,7 @@ class CampoAgricola(db.Model):
     usos_restantes = db.Column(db.Integer, default=6) 
     
     # Regra de Descanso: 6 horas
-    data_descanso_fim = db.Column(db.DateTime, nullable=True) # Data que o descanso termina
+    data_descanso_fim = db.Column(db.DateTime, nullable=True, index=True) # Data que o descanso termina
 
     proprietario = db.relationship('Jogador', backref='campos_proprios')
     regiao = db.relationship('Regiao', backref='campos_agricolas')
@@ -650,7 +801,7 @@ class PlantioAtivo(db.Model):
     campo_id = db.Column(db.Integer, db.ForeignKey('campo_agricola.id'), nullable=False)
     
     # Regra 2: 1 hora de crescimento
-    data_fim = db.Column(db.DateTime, nullable=False) 
+    data_fim = db.Column(db.DateTime, nullable=False, index=True) 
     
     # A quantidade final (já calculada com bônus) que será criada
     quantidade_produzida = db.Column(db.Float, nullable=False) 
@@ -658,4 +809,51 @@ class PlantioAtivo(db.Model):
     jogador = db.relationship('Jogador', backref='plantios_ativos')
     
     def __repr__(self):
-        return f'<Plantio: {self.quantidade_produzida:.0f} Milho no Campo {self.campo_id}>'
\ No newline at end of file
+        return f'<Plantio: {self.quantidade_produzida:.0f} Milho no Campo {self.campo_id}>'
+
+class SchedulerLease(db.Model):
+    """
+    Concessão (lease) de liderança dos jobs em segundo plano.
+    Só o processo dono de uma concessão não expirada roda o scheduler.
+    """
+    __tablename__ = 'scheduler_lease'
+
+    nome = db.Column(db.String(50), primary_key=True)
+    dono = db.Column(db.String(120), nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.nome}: {self.dono} até {self.expira_em}>'
+
+class TickMetrica(db.Model):
+    """Registro de um tick do job de status (tempos por fase), ver app/tick_metrics.py."""
+    __tablename__ = 'tick_metrica'
+
+    id = db.Column(db.Integer, primary_key=True)
+    inicio = db.Column(db.DateTime, nullable=False)
+    duracao_ms = db.Column(db.Float, nullable=False)
+    erros = db.Column(db.Integer, nullable=False, default=0)
+    fases = db.Column(db.Text, nullable=False)     # JSON: lista de fases com tempos e contagens
+
+    def __repr__(self):
+        return f'<TickMetrica {self.inicio} {self.duracao_ms:.0f}ms>'
+
+class FalhaConclusao(db.Model):
+    """
+    Fila de falhas (dead-letter) das conclusões temporizadas.
+    Com TICK_MAX_TENTATIVAS falhas a entidade fica em quarentena: o tick e o motor
+    de conclusões deixam de tentá-la até um admin liberar a falha.
+    """
+    __tablename__ = 'falha_conclusao'
+    __table_args__ = (db.UniqueConstraint('tipo', 'entidade_id', name='uq_falha_conclusao_tipo_entidade'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)         # Chave de TIMED_ENTITIES ('treino', 'transporte'...)
+    entidade_id = db.Column(db.Integer, nullable=False)
+    tentativas = db.Column(db.Integer, nullable=False, default=1)
+    erro = db.Column(db.String(255))
+    primeira_falha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ultima_falha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FalhaConclusao {self.tipo} ID {self.entidade_id}: {self.tentativas}x>'
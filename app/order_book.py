@@ -0,0 +1,228 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.transacoes import PendentesDaTransacao
+
+# Uma ordem ativa no livro (cópia do MarketOrder no último commit visto)
+OrdemNoLivro = namedtuple('OrdemNoLivro', 'id jogador_id preco restante')
+
+class _Lado:
+    """Um lado (BUY ou SELL) de um recurso: preços ordenados, fila FIFO por preço."""
+
+    def __init__(self, compra):
+        self.compra = compra            # BUY: melhor preço é o maior; SELL: o menor
+        self.precos = []                # Ordem crescente
+        self.niveis = {}                # preço -> OrderedDict(id -> OrdemNoLivro), em ordem de chegada
+
+    def inserir(self, ordem):
+        nivel = self.niveis.get(ordem.preco)
+        if nivel is None:
+            nivel = self.niveis[ordem.preco] = OrderedDict()
+            bisect.insort(self.precos, ordem.preco)
+        # Atualizar uma ordem existente (execução parcial) mantém a posição na fila
+        nivel[ordem.id] = ordem
+
+    def remover(self, ordem_id, preco):
+        nivel = self.niveis.get(preco)
+        if nivel is None or nivel.pop(ordem_id, None) is None:
+            return
+        if not nivel:
+            del self.niveis[preco]
+            self.precos.pop(bisect.bisect_left(self.precos, preco))
+
+    def precos_por_prioridade(self):
+        return reversed(self.precos) if self.compra else iter(self.precos)
+
+class OrderBook:
+    """
+    Livro de ofertas em memória (prioridade preço-tempo) por recurso.
+
+    É um cache do MarketOrder: reconstruído do banco na primeira consulta e
+    atualizado só após o commit das transações que criam, executam, cancelam ou
+    expiram ordens (como o heap do motor de conclusões). Ordens criadas por outros
+    processos entram pelo reconcile(): as de id novo na hora, e as confirmadas fora
+    da ordem dos ids na varredura periódica das ordens ativas. O banco continua sendo a fonte da verdade:
+    quem executa uma ordem do livro relê a linha e descarta entradas obsoletas.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lados = {}                # (recurso, 'BUY'/'SELL') -> _Lado
+        self._indice = {}               # id -> (recurso, tipo, preço)
+        self._ultimo_id = 0
+        self._carregado = False
+        self._varrido_em = 0.0          # time.monotonic() da última varredura das ordens ativas
+        self.intervalo_varredura = 30.0
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.app = app
+        self.intervalo_varredura = app.config.get('MARKET_BOOK_RESCAN_SECONDS', self.intervalo_varredura)
+
+    @property
+    def loaded(self):
+        return self._carregado
+
+    # ------------------ CARGA ------------------
+    def rebuild(self):
+        """Recarrega todas as ordens ativas (dentro de um app context)."""
+        from app import db
+        from app.models import MarketOrder
+
+        linhas = db.session.execute(
+            select(MarketOrder.id, MarketOrder.jogador_id, MarketOrder.order_type, MarketOrder.resource_type,
+                   MarketOrder.price_per_unit, MarketOrder.quantity_remaining)
+            .where(MarketOrder.status == 'ACTIVE')
+            .order_by(MarketOrder.data_criacao, MarketOrder.id)
+        ).all()
+
+        with self._lock:
+            self._lados = {}
+            self._indice = {}
+            self._ultimo_id = 0
+            for linha in linhas:
+                self._inserir(linha.id, linha.jogador_id, linha.order_type, linha.resource_type,
+                              linha.price_per_unit, linha.quantity_remaining)
+            self._carregado = True
+            self._varrido_em = time.monotonic()
+        return len(linhas)
+
+    def reconcile(self):
+        """
+        Inclui as ordens ativas criadas por outros processos. A cada chamada lê as de
+        id maior que o último visto (varredura pela chave primária: custo ~zero quando
+        não há nada novo). Uma ordem confirmada depois de outra de id maior fica abaixo
+        dessa marca; por isso, a cada MARKET_BOOK_RESCAN_SECONDS, os ids de todas as
+        ordens ativas são comparados com o livro e as que faltam são carregadas.
+        """
+        from app import db
+        from app.models import MarketOrder
+
+        if not self._carregado:
+            return self.rebuild()
+
+        colunas = (MarketOrder.id, MarketOrder.jogador_id, MarketOrder.order_type, MarketOrder.resource_type,
+                   MarketOrder.price_per_unit, MarketOrder.quantity_remaining)
+        linhas = db.session.execute(
+            select(*colunas).where(MarketOrder.id > self._ultimo_id, MarketOrder.status == 'ACTIVE')
+            .order_by(MarketOrder.id)
+        ).all()
+
+        if time.monotonic() - self._varrido_em > self.intervalo_varredura:
+            self._varrido_em = time.monotonic()
+            ativas = db.session.execute(select(MarketOrder.id).where(MarketOrder.status == 'ACTIVE')).scalars().all()
+            with self._lock:
+                faltando = set(ativas).difference(self._indice)
+            if faltando:
+                linhas += db.session.execute(
+                    select(*colunas).where(MarketOrder.id.in_(faltando), MarketOrder.status == 'ACTIVE')
+                    .order_by(MarketOrder.data_criacao, MarketOrder.id)
+                ).all()
+
+        with self._lock:
+            for linha in linhas:
+                if linha.id not in self._indice:
+                    self._inserir(linha.id, linha.jogador_id, linha.order_type, linha.resource_type,
+                                  linha.price_per_unit, linha.quantity_remaining)
+        return len(linhas)
+
+    # ------------------ ATUALIZAÇÃO ------------------
+    def _inserir(self, ordem_id, jogador_id, tipo, recurso, preco, restante):
+        lado = self._lados.get((recurso, tipo))
+        if lado is None:
+            lado = self._lados[(recurso, tipo)] = _Lado(compra=(tipo == 'BUY'))
+        lado.inserir(OrdemNoLivro(ordem_id, jogador_id, preco, restante))
+        self._indice[ordem_id] = (recurso, tipo, preco)
+        self._ultimo_id = max(self._ultimo_id, ordem_id)
+
+    def apply(self, ordem_id, jogador_id, tipo, recurso, preco, restante, status):
+        """Aplica o estado confirmado de uma ordem: ativa com saldo fica, o resto sai."""
+        with self._lock:
+            if not self._carregado:
+                return
+            anterior = self._indice.get(ordem_id)
+            if anterior and anterior[2] != preco:
+                self.discard(ordem_id)
+            if status == 'ACTIVE' and restante > 0.001:
+                self._inserir(ordem_id, jogador_id, tipo, recurso, preco, restante)
+            else:
+                self.discard(ordem_id)
+
+    def discard(self, ordem_id):
+        """Tira uma ordem do livro (executada, cancelada, expirada ou obsoleta)."""
+        with self._lock:
+            chave = self._indice.pop(ordem_id, None)
+            if chave:
+                recurso, tipo, preco = chave
+                self._lados[(recurso, tipo)].remover(ordem_id, preco)
+
+    # ------------------ CONSULTA ------------------
+    def ensure_loaded(self):
+        if not self._carregado:
+            self.rebuild()
+
+    def crossing(self, recurso, tipo, preco_limite):
+        """
+        Ordens do lado 'tipo' que cruzam o preço limite, em prioridade preço-tempo:
+        SELL com preço <= limite (mais barata primeiro) ou BUY com preço >= limite
+        (mais cara primeiro). Gerador: copia um nível de preço por vez.
+        """
+        lado = self._lados.get((recurso, tipo))
+        if lado is None:
+            return
+        with self._lock:
+            precos = list(lado.precos_por_prioridade())
+        for preco in precos:
+            if (preco < preco_limite) if lado.compra else (preco > preco_limite):
+                return
+            with self._lock:
+                nivel = list(lado.niveis.get(preco, {}).values())
+            yield from nivel
+
+    def best(self, recurso):
+        """(melhor compra, melhor venda) do recurso; None se o lado estiver vazio."""
+        with self._lock:
+            compra = self._lados.get((recurso, 'BUY'))
+            venda = self._lados.get((recurso, 'SELL'))
+            return (compra.precos[-1] if compra and compra.precos else None,
+                    venda.precos[0] if venda and venda.precos else None)
+
+order_book = OrderBook()
+
+# ------------------ ALIMENTAÇÃO PELAS TRANSAÇÕES ------------------
+# As ordens alteradas são guardadas no flush e só chegam ao livro após o commit
+# da transação externa (um rollback descarta a lista; um SAVEPOINT desfeito, só a
+# parte dele). Alterações em lote por SQL (ex: expire_orders) usam discard_after_commit.
+
+def _aplicar_apos_commit(pendentes):
+    for ordem_id, estado in pendentes.items():
+        if estado is None:
+            order_book.discard(ordem_id)
+        else:
+            order_book.apply(ordem_id, *estado)
+
+_pendentes = PendentesDaTransacao('order_book_pendentes', _aplicar_apos_commit, nova=dict, somar=dict.update)
+
+def discard_after_commit(session, ordem_ids):
+    """Tira as ordens do livro quando a transação atual for confirmada."""
+    pendentes = _pendentes.atual(session)
+    for ordem_id in ordem_ids:
+        pendentes[ordem_id] = None
+
+@event.listens_for(Session, 'after_flush')
+def _coletar_ordens(session, flush_context):
+    if not order_book.loaded:
+        return
+    from app.models import MarketOrder
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, MarketOrder):
+            _pendentes.atual(session)[obj.id] = (
+                obj.jogador_id, obj.order_type, obj.resource_type, obj.price_per_unit, obj.quantity_remaining, obj.status
+            )
+    for obj in session.deleted:
+        if isinstance(obj, MarketOrder):
+            _pendentes.atual(session)[obj.id] = None
@@ -2,6 +2,7 @@ from flask import render_template, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from app.profile import bp
 from app.models import Jogador, ViagemAtiva, PedidoResidencia, Regiao
+from app.services.player_service import catch_up_player
 from datetime import datetime, timezone
 from config import Config
 
@@ -17,6 +18,12 @@ def view_profile():
         from flask_login import logout_user
         logout_user()
         return redirect(url_for('auth.login'))
+
+    # Conclui só os temporizadores vencidos deste jogador antes de montar a tela
+    try:
+        catch_up_player(jogador.id)
+    except Exception as e:
+        current_app.logger.error(f"Erro ao atualizar o status do jogador na view profile: {e}")
     
     rank_regioes = Regiao.query.order_by(
         Regiao.indice_desenvolvimento.desc(),
@@ -46,12 +53,6 @@ def view_profile():
         if tempo_restante.total_seconds() > 0:
             tempo_restante_residencia = int(tempo_restante.total_seconds())
     
-    try:
-        from app.background_tasks import regenerate_player_status
-        regenerate_player_status(current_app._get_current_object()) 
-    except Exception as e:
-        current_app.logger.error(f"Erro ao forçar regeneração na view profile: {e}")
-
     return render_template('profile/view_profile.html',
                             title='Meu Perfil',
                             jogador=jogador,
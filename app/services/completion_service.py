@@ -0,0 +1,435 @@
+from app import db
+from app.models import (Jogador, Regiao, TreinamentoAtivo, ViagemAtiva, PedidoResidencia,
+                        TransporteAtivo, PlantioAtivo, ProductionJob, ArmazemRecurso,
+                        RecursoNaMina, FalhaConclusao, CampoAgricola, Armazem)
+from app.services import manufacturing_service, region_service, logistics_service
+from app.services.history_service import record_history, record_history_many
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, delete, exists, insert, select, update
+from sqlalchemy.orm import joinedload
+
+# Cada função conclui UMA entidade temporizada (treino, viagem, colheita...).
+# Nenhuma faz commit: quem chama (tick, motor de conclusões) é dono da transação.
+
+def complete_production(job: ProductionJob):
+    """Conclui um Job de Produção (credita os itens no armazém do jogador)."""
+    jogador_job = db.session.get(Jogador, job.jogador_id)
+
+    if jogador_job:
+        manufacturing_service.complete_manufacturing_jobs(job, jogador_job)
+    else:
+        db.session.delete(job)
+
+def complete_harvest(plantio: PlantioAtivo):
+    """Conclui um plantio: cria o milho na mina para quem plantou (e a taxa do dono do campo)."""
+    jogador_plantou = plantio.jogador
+    campo = plantio.campo
+
+    if not jogador_plantou or not campo:
+        db.session.delete(plantio)
+        return
+
+    dono_campo = campo.proprietario
+
+    # 1. Calcular XP (Regra 1)
+    # Damos 15 XP por cada 10 energia usados (ex: 100 energia = 150 XP)
+    # (Precisamos estimar a energia gasta, pois não salvamos ela)
+    xp_ganho = current_app.config['FARMING_XP_PER_10_ENERGY'] * (plantio.quantidade_produzida / current_app.config['MILHO_POR_ENERGIA'])
+    jogador_plantou.experiencia_trabalho += xp_ganho
+
+    # 2. Calcular Divisão do Lucro
+    lucro_dono = 0.0
+
+    # Se quem plantou não é o dono, o dono ganha uma taxa
+    if jogador_plantou.id != dono_campo.id:
+        lucro_dono = plantio.quantidade_produzida * campo.taxa_lucro
+
+    lucro_jogador = plantio.quantidade_produzida - lucro_dono
+
+    # 3. Criar RecursoNaMina para o Jogador que Plantou
+    expiracao_min = current_app.config['RECURSO_NA_MINA_EXPIRACAO_MIN']
+
+    recurso_jogador = RecursoNaMina(
+        jogador_id=jogador_plantou.id,
+        regiao_id=campo.regiao_id,
+        tipo_recurso='milho',
+        quantidade=lucro_jogador,
+        data_expiracao = datetime.utcnow() + timedelta(minutes=expiracao_min)
+    )
+    db.session.add(recurso_jogador)
+
+    # 4. Criar RecursoNaMina para o Dono (se houver lucro)
+    if lucro_dono > 0:
+        recurso_dono = RecursoNaMina(
+            jogador_id=dono_campo.id,
+            regiao_id=campo.regiao_id,
+            tipo_recurso='milho',
+            quantidade=lucro_dono,
+            data_expiracao = datetime.utcnow() + timedelta(minutes=expiracao_min)
+        )
+        db.session.add(recurso_dono)
+        record_history(jogador_id=dono_campo.id, tipo_acao='TAXA_COLHEITA', descricao=f"Recebeu {lucro_dono:.0f}t de Milho (taxa) de {campo.nome}.")
+
+    record_history(jogador_id=jogador_plantou.id, tipo_acao='COLHEITA', descricao=f"Colheu {lucro_jogador:.0f}t de Milho em {campo.nome}.")
+
+    # 5. Lógica de Descanso PÓS-COLHEITA
+    # Se o campo atingiu 0 usos, inicia o período de descanso AGORA.
+    if campo.usos_restantes <= 0:
+        tempo_descanso_h = current_app.config['FARMING_FIELD_REST_HOURS']
+        campo.data_descanso_fim = datetime.utcnow() + timedelta(hours=tempo_descanso_h)
+        db.session.add(campo)
+
+    # 6. Deletar o plantio
+    db.session.delete(plantio)
+
+def complete_harvests_bulk(plantios, now=None):
+    """
+    Conclui vários plantios de uma vez (mesmas regras de complete_harvest).
+    Espera os plantios carregados com jogador, campo e dono (ver load_options);
+    soma a XP por jogador e grava pilhas de milho, histórico, descanso dos campos
+    e XP com um comando em lote cada, em vez de uma linha por plantio.
+    """
+    now = now or datetime.utcnow()
+    expiracao = now + timedelta(minutes=current_app.config['RECURSO_NA_MINA_EXPIRACAO_MIN'])
+    xp_por_10_energia = current_app.config['FARMING_XP_PER_10_ENERGY']
+    milho_por_energia = current_app.config['MILHO_POR_ENERGIA']
+
+    xp_por_jogador = {}
+    jogadores = set()
+    pilhas = []
+    historico = []
+    campos_colhidos = set()
+
+    for plantio in plantios:
+        jogador_plantou = plantio.jogador
+        campo = plantio.campo
+        db.session.delete(plantio)
+
+        if not jogador_plantou or not campo:
+            continue
+
+        jogadores.add(jogador_plantou)
+        xp_por_jogador[jogador_plantou.id] = (xp_por_jogador.get(jogador_plantou.id, 0.0)
+                                              + xp_por_10_energia * (plantio.quantidade_produzida / milho_por_energia))
+
+        # Se quem plantou não é o dono, o dono ganha uma taxa
+        dono_campo = campo.proprietario
+        lucro_dono = 0.0
+        if dono_campo and jogador_plantou.id != dono_campo.id:
+            lucro_dono = plantio.quantidade_produzida * campo.taxa_lucro
+        lucro_jogador = plantio.quantidade_produzida - lucro_dono
+
+        pilhas.append({'jogador_id': jogador_plantou.id, 'regiao_id': campo.regiao_id, 'tipo_recurso': 'milho',
+                       'quantidade': lucro_jogador, 'data_expiracao': expiracao})
+        if lucro_dono > 0:
+            pilhas.append({'jogador_id': dono_campo.id, 'regiao_id': campo.regiao_id, 'tipo_recurso': 'milho',
+                           'quantidade': lucro_dono, 'data_expiracao': expiracao})
+            historico.append({'jogador_id': dono_campo.id, 'tipo_acao': 'TAXA_COLHEITA',
+                              'descricao': f"Recebeu {lucro_dono:.0f}t de Milho (taxa) de {campo.nome}."})
+        historico.append({'jogador_id': jogador_plantou.id, 'tipo_acao': 'COLHEITA',
+                          'descricao': f"Colheu {lucro_jogador:.0f}t de Milho em {campo.nome}."})
+        campos_colhidos.add(campo.id)
+
+    # XP somada no banco (atômico); os jogadores já carregados recarregam a coluna
+    if xp_por_jogador:
+        tabela = Jogador.__table__
+        db.session.execute(
+            update(tabela).where(tabela.c.id == bindparam('b_id'))
+            .values(experiencia_trabalho=tabela.c.experiencia_trabalho + bindparam('xp')),
+            [{'b_id': jogador_id, 'xp': xp} for jogador_id, xp in xp_por_jogador.items()]
+        )
+        for jogador in jogadores:
+            db.session.expire(jogador, ['experiencia_trabalho'])
+
+    if pilhas:
+        db.session.execute(insert(RecursoNaMina), pilhas)
+    record_history_many(historico)
+
+    # Descanso PÓS-COLHEITA dos campos que chegaram a 0 usos
+    if campos_colhidos:
+        db.session.execute(
+            update(CampoAgricola)
+            .where(CampoAgricola.id.in_(campos_colhidos), CampoAgricola.usos_restantes <= 0)
+            .values(data_descanso_fim=now + timedelta(hours=current_app.config['FARMING_FIELD_REST_HOURS']))
+            .execution_options(synchronize_session='fetch')
+        )
+
+def _atualizar_em_lote(alteracoes):
+    """
+    Grava alterações já feitas em objetos carregados com um UPDATE executemany por
+    (modelo, colunas), em vez de um UPDATE por objeto no flush. 'alteracoes' é uma
+    lista de (objeto, [colunas]); as colunas gravadas são expiradas nos objetos.
+    """
+    grupos = {}
+    for objeto, colunas in alteracoes:
+        grupos.setdefault((type(objeto), tuple(colunas)), []).append(objeto)
+
+    with db.session.no_autoflush:
+        for (modelo, colunas), objetos in grupos.items():
+            tabela = modelo.__table__
+            db.session.execute(
+                update(tabela).where(tabela.c.id == bindparam('b_id'))
+                .values({coluna: bindparam(f'b_{coluna}') for coluna in colunas}),
+                [dict({'b_id': objeto.id}, **{f'b_{coluna}': getattr(objeto, coluna) for coluna in colunas})
+                 for objeto in objetos]
+            )
+            for objeto in objetos:
+                db.session.expire(objeto, list(colunas))
+
+def _aplicar_treino(jogador, treino):
+    """
+    Aplica o nível alvo de um treino ao jogador e soma a XP (500).
+    Melhorias 'armazem_*' vão para as colunas de nível do Armazem (nivel_capacidade,
+    nivel_frota, nivel_especializacao); as demais para habilidade_*.
+    Retorna (nível anterior, entrada do histórico).
+    """
+    if treino.habilidade.startswith('armazem_'):
+        melhoria = treino.habilidade.replace('armazem_', '')
+        coluna = f'nivel_{melhoria}'
+        armazem = jogador.armazem
+        if armazem is None or not hasattr(Armazem, coluna):
+            raise ValueError(f"Melhoria de armazém inválida para o jogador {jogador.id}: {treino.habilidade}")
+
+        nivel_anterior = getattr(armazem, coluna)
+        setattr(armazem, coluna, int(treino.nivel_alvo))
+        entrada = {'jogador_id': jogador.id, 'tipo_acao': 'ARMAZEM_UPGRADE',
+                   'descricao': f"Melhoria de Armazém ({melhoria.capitalize()}) para Nv {treino.nivel_alvo:.0f} concluída."}
+    else:
+        skill_attr = f'habilidade_{treino.habilidade}'
+        nivel_anterior = getattr(jogador, skill_attr, None)
+        setattr(jogador, skill_attr, treino.nivel_alvo)
+        entrada = {'jogador_id': jogador.id, 'tipo_acao': 'TREINO',
+                   'descricao': f"Treinamento de {treino.habilidade.capitalize()} concluído. XP ganha: 500."}
+
+    jogador.experiencia += 500
+    if jogador.check_level_up():
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] NÍVEL UP: Jogador {jogador.username} alcançou Nível {jogador.nivel}!")
+
+    return nivel_anterior, entrada
+
+def complete_training(treino: TreinamentoAtivo):
+    """Conclui um treino de habilidade (ou melhoria de armazém)."""
+    jogador = db.session.get(Jogador, treino.jogador_id)
+
+    if jogador:
+        nivel_anterior, entrada = _aplicar_treino(jogador, treino)
+        region_service.registrar_mudanca_habilidade(jogador, treino.habilidade, nivel_anterior, treino.nivel_alvo)
+        record_history(**entrada)
+        db.session.add(jogador)
+
+    # Remove o registro de treino ativo (mesmo que o jogador seja None)
+    db.session.delete(treino)
+
+def complete_trainings_bulk(treinos, now=None):
+    """
+    Conclui vários treinos de uma vez (mesmas regras de complete_training).
+    Espera os treinos carregados com jogador e armazém (ver load_options): jogadores
+    e armazéns são gravados com um UPDATE em lote por conjunto de colunas, os
+    agregados regionais com um UPDATE por região e o histórico com um INSERT em lote.
+    """
+    deltas_por_regiao = {}
+    historico = []
+    alteracoes = []
+
+    for treino in treinos:
+        jogador = treino.jogador
+        db.session.delete(treino)
+        if not jogador:
+            continue
+
+        nivel_anterior, entrada = _aplicar_treino(jogador, treino)
+        historico.append(entrada)
+
+        if treino.habilidade.startswith('armazem_'):
+            alteracoes.append((jogador.armazem, [treino.habilidade.replace('armazem_', 'nivel_')]))
+            alteracoes.append((jogador, ['experiencia', 'nivel']))
+        else:
+            alteracoes.append((jogador, ['experiencia', 'nivel', f'habilidade_{treino.habilidade}']))
+
+        if treino.habilidade in region_service.HABILIDADES_REGIONAIS:
+            deltas = deltas_por_regiao.setdefault(jogador.regiao_residencia_id, {})
+            deltas[treino.habilidade] = deltas.get(treino.habilidade, 0.0) + (treino.nivel_alvo or 0.0) - (nivel_anterior or 0.0)
+
+    # Antes de qualquer outro comando: o autoflush gravaria os objetos um a um
+    _atualizar_em_lote(alteracoes)
+
+    for regiao_id, deltas in deltas_por_regiao.items():
+        region_service.aplicar_delta_habilidades(regiao_id, deltas)
+    record_history_many(historico)
+
+def complete_travel(viagem: ViagemAtiva):
+    """Conclui uma viagem: move o jogador para o destino."""
+    jogador = db.session.get(Jogador, viagem.jogador_id)
+
+    if jogador:
+        # A energia acumulada na região de origem é gravada antes da troca
+        jogador.materializar_energia()
+        jogador.regiao_atual_id = viagem.destino_id
+
+        destino_nome = db.session.get(Regiao, viagem.destino_id).nome
+        print(f"Viagem concluída: Jogador {jogador.username} moveu-se para {destino_nome}.")
+        db.session.add(jogador)
+
+    db.session.delete(viagem)
+
+def approve_residency(pedido: PedidoResidencia):
+    """Aprova um pedido de residência."""
+    jogador = db.session.get(Jogador, pedido.jogador_id)
+    regiao_destino = db.session.get(Regiao, pedido.regiao_destino_id)
+
+    if jogador and regiao_destino:
+        region_service.registrar_mudanca_residencia(jogador, jogador.regiao_residencia_id, regiao_destino.id)
+        jogador.regiao_residencia_id = regiao_destino.id
+        print(f"Residência de {jogador.username} aprovada para {regiao_destino.nome}.")
+        db.session.add(jogador)
+
+    db.session.delete(pedido)
+
+def complete_transport(transporte: TransporteAtivo):
+    """Conclui um transporte: credita o recurso no armazém do jogador."""
+    jogador = db.session.get(Jogador, transporte.jogador_id)
+    armazem = jogador.armazem if jogador else None
+
+    if jogador and armazem:
+        # 1. Credita o recurso no Armazém
+        recurso = armazem.recursos.filter_by(tipo=transporte.tipo_recurso).first()
+        if not recurso:
+            recurso = ArmazemRecurso(armazem_id=armazem.id, tipo=transporte.tipo_recurso, quantidade=0.0)
+            db.session.add(recurso)
+
+        recurso.quantidade += transporte.quantidade
+
+        print(f"Transporte concluído: {transporte.quantidade:.0f} {transporte.tipo_recurso} creditados no armazém de {jogador.username}.")
+        db.session.add(armazem)
+
+    db.session.delete(transporte)
+
+def complete_transports_bulk(transportes, now=None):
+    """
+    Conclui vários transportes de uma vez (mesmas regras de complete_transport):
+    agrupa as entregas por (armazém, recurso), soma as quantidades e credita cada
+    grupo com um único upsert (logistics_service.creditar_armazens).
+    """
+    jogador_ids = {transporte.jogador_id for transporte in transportes}
+    armazem_de = dict(db.session.execute(
+        select(Armazem.jogador_id, Armazem.id).where(Armazem.jogador_id.in_(jogador_ids))
+    ).all())
+
+    creditos = {}
+    for transporte in transportes:
+        armazem_id = armazem_de.get(transporte.jogador_id)
+        if armazem_id is not None:
+            chave = (armazem_id, transporte.tipo_recurso)
+            creditos[chave] = creditos.get(chave, 0.0) + transporte.quantidade
+        db.session.delete(transporte)
+
+    logistics_service.creditar_armazens(creditos)
+
+    if creditos:
+        print(f"Transportes concluídos: {len(transportes)} entregas creditadas em {len(creditos)} estoques.")
+
+# Registro das entidades temporizadas, na ordem em que o tick as processa:
+# tipo -> (Modelo, nome da coluna de prazo, função de conclusão)
+TIMED_ENTITIES = {
+    'producao': (ProductionJob, 'data_fim', complete_production),
+    'colheita': (PlantioAtivo, 'data_fim', complete_harvest),
+    'treino': (TreinamentoAtivo, 'data_fim', complete_training),
+    'viagem': (ViagemAtiva, 'data_fim', complete_travel),
+    'residencia': (PedidoResidencia, 'data_aprovacao', approve_residency),
+    'transporte': (TransporteAtivo, 'data_fim', complete_transport),
+}
+
+# Conclusão em lote (opcional) por tipo: recebe a lista de entidades vencidas.
+# Quem chama cai para a conclusão uma a uma se o lote falhar.
+BULK_HANDLERS = {
+    'colheita': complete_harvests_bulk,
+    'treino': complete_trainings_bulk,
+    'transporte': complete_transports_bulk,
+}
+
+def load_options(tipo):
+    """Opções de carregamento (eager) para ler um lote do tipo sem lazy loads por linha."""
+    if tipo == 'colheita':
+        return [joinedload(PlantioAtivo.jogador),
+                joinedload(PlantioAtivo.campo).joinedload(CampoAgricola.proprietario)]
+    if tipo == 'treino':
+        return [joinedload(TreinamentoAtivo.jogador).joinedload(Jogador.armazem)]
+    return []
+
+def complete_due(tipo, entidade_id, now=None):
+    """
+    Conclui uma entidade pelo ID, se ela ainda existir e já estiver vencida.
+    Retorna True se concluiu. Usado pelo motor de conclusões.
+    """
+    modelo, coluna, handler = TIMED_ENTITIES[tipo]
+    entidade = db.session.get(modelo, entidade_id)
+
+    if entidade is None or getattr(entidade, coluna) > (now or datetime.utcnow()):
+        return False
+    if em_quarentena(tipo, entidade_id):
+        return False
+
+    handler(entidade)
+    return True
+
+def complete_due_many(tipo, entidade_ids, now=None):
+    """
+    Conclui em lote (BULK_HANDLERS) as entidades do tipo que ainda existem, estão
+    vencidas e fora da quarentena. Retorna os IDs concluídos. Usado pelo motor de
+    conclusões quando vários prazos do mesmo tipo vencem juntos.
+    """
+    now = now or datetime.utcnow()
+    modelo, coluna, _ = TIMED_ENTITIES[tipo]
+    entidades = (modelo.query.options(*load_options(tipo))
+                 .filter(modelo.id.in_(entidade_ids), getattr(modelo, coluna) <= now, sem_quarentena(tipo))
+                 .all())
+    concluidas = [entidade.id for entidade in entidades]
+    if entidades:
+        BULK_HANDLERS[tipo](entidades, now)
+    return concluidas
+
+# ------------------ FALHAS (DEAD-LETTER) ------------------
+# Uma conclusão que falha é registrada em falha_conclusao. Após TICK_MAX_TENTATIVAS
+# falhas ela fica em quarentena e não trava mais o tick dos outros jogadores.
+
+def sem_quarentena(tipo):
+    """Filtro SQL que exclui as entidades do tipo que estão em quarentena."""
+    modelo = TIMED_ENTITIES[tipo][0]
+    return ~exists().where(
+        FalhaConclusao.tipo == tipo,
+        FalhaConclusao.entidade_id == modelo.id,
+        FalhaConclusao.tentativas >= current_app.config['TICK_MAX_TENTATIVAS']
+    )
+
+def em_quarentena(tipo, entidade_id):
+    falha = FalhaConclusao.query.filter_by(tipo=tipo, entidade_id=entidade_id).first()
+    return falha is not None and falha.tentativas >= current_app.config['TICK_MAX_TENTATIVAS']
+
+def registrar_falha(tipo, entidade_id, erro, now=None):
+    """
+    Registra (ou soma) uma falha de conclusão na transação atual.
+    Retorna True se a entidade entrou em quarentena.
+    """
+    now = now or datetime.utcnow()
+    falha = FalhaConclusao.query.filter_by(tipo=tipo, entidade_id=entidade_id).first()
+
+    if falha:
+        falha.tentativas += 1
+        falha.ultima_falha = now
+    else:
+        falha = FalhaConclusao(tipo=tipo, entidade_id=entidade_id, tentativas=1,
+                               primeira_falha=now, ultima_falha=now)
+        db.session.add(falha)
+    falha.erro = str(erro)[:255]
+
+    return falha.tentativas >= current_app.config['TICK_MAX_TENTATIVAS']
+
+def limpar_falhas(tipo, entidade_ids):
+    """Remove as falhas anteriores de entidades que acabaram de ser concluídas."""
+    if not entidade_ids:
+        return
+    db.session.execute(
+        delete(FalhaConclusao).where(FalhaConclusao.tipo == tipo, FalhaConclusao.entidade_id.in_(entidade_ids))
+        .execution_options(synchronize_session=False)
+    )
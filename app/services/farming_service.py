@@ -11,6 +11,9 @@ def start_planting(jogador: Jogador, campo: CampoAgricola, energia_gasta: int):
     Retorna (True, "Mensagem") ou (False, "Erro")
     """
     
+    # Grava a energia regenerada antes de validar/gastar
+    jogador.materializar_energia()
+
     # --- 1. Validações (Guards) ---
     if energia_gasta < 10:
         return (False, "Você deve usar no mínimo 10 de energia.")
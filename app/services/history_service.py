@@ -0,0 +1,56 @@
+from app import db
+from app.models import HistoricoAcao
+from app.history_writer import history_writer, pendentes_historico
+from datetime import datetime
+from sqlalchemy import insert
+
+def record_history(jogador_id, tipo_acao, descricao, dinheiro_delta=0.0, gold_delta=0.0):
+    """
+    Registra uma ação no histórico do jogador.
+
+    Com o gravador em segundo plano ativo (HISTORY_WRITE_MODE = 'buffered') a entrada
+    fica na transação atual e só é gravada, em lote, depois do commit. Sem ele
+    (modo 'sync', scripts e testes) o HistoricoAcao é adicionado à sessão como antes.
+    """
+    if not history_writer.running:
+        db.session.add(HistoricoAcao(
+            jogador_id=jogador_id,
+            tipo_acao=tipo_acao,
+            descricao=descricao,
+            dinheiro_delta=dinheiro_delta,
+            gold_delta=gold_delta
+        ))
+        return
+
+    pendentes_historico.atual(db.session).append({
+        'jogador_id': jogador_id,
+        'tipo_acao': tipo_acao,
+        'descricao': descricao[:255],
+        'timestamp': datetime.utcnow(),
+        'dinheiro_delta': dinheiro_delta,
+        'gold_delta': gold_delta,
+    })
+
+def record_history_many(entradas):
+    """
+    Registra várias ações de uma vez (ex: jobs em lote). Cada entrada é um dict
+    com jogador_id, tipo_acao, descricao e, opcionalmente, dinheiro_delta/gold_delta.
+    No modo 'sync' grava com um único INSERT executemany na transação atual.
+    """
+    if not entradas:
+        return
+
+    agora = datetime.utcnow()
+    linhas = [{
+        'jogador_id': entrada['jogador_id'],
+        'tipo_acao': entrada['tipo_acao'],
+        'descricao': entrada['descricao'][:255],
+        'timestamp': agora,
+        'dinheiro_delta': entrada.get('dinheiro_delta', 0.0),
+        'gold_delta': entrada.get('gold_delta', 0.0),
+    } for entrada in entradas]
+
+    if history_writer.running:
+        pendentes_historico.atual(db.session).extend(linhas)
+    else:
+        db.session.execute(insert(HistoricoAcao), linhas)
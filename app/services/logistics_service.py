@@ -2,8 +2,10 @@ import math
 from datetime import datetime, timedelta
 from flask import current_app
 from app import db
-from app.models import (Jogador, Regiao, TransporteAtivo, Veiculo, RecursoNaMina, HistoricoAcao)
-from app.utils import calculate_distance_km
+from app.models import (Jogador, Regiao, TransporteAtivo, Veiculo, RecursoNaMina, ArmazemRecurso)
+from app.utils import calculate_distance_km, sql_upsert
+from app.services.history_service import record_history
+from sqlalchemy import func
 
 def schedule_transport(jogador, armazem, form_data: dict) -> tuple:
     """
@@ -169,7 +171,7 @@ def schedule_transport(jogador, armazem, form_data: dict) -> tuple:
     descricao_acao = (
         f"Frete agendado para {total_viagens_agendadas} viagens. Custo: R${custo_frete_total:.2f}."
     )
-    hist = HistoricoAcao(
+    record_history(
         jogador_id=jogador.id,
         tipo_acao='FRETE_COBRADO',
         descricao=descricao_acao,
@@ -178,9 +180,30 @@ def schedule_transport(jogador, armazem, form_data: dict) -> tuple:
     )
 
     db.session.add_all(transporte_jobs)
-    db.session.add(hist)
     db.session.add(jogador)
     
     # Retorna o status e dados para a rota
     message_to_user = "AVISO: " + str(recurso_restante) + "t permanecerão na mina. Frete cobrado." if recurso_restante > 0 else "Logística agendada com sucesso!"
     return (True, message_to_user, ultima_data_fim, custo_frete_total, total_viagens_agendadas)
+
+def creditar_armazens(creditos):
+    """
+    Soma quantidades nos estoques (ArmazemRecurso) de vários armazéns de uma vez.
+    'creditos' é {(armazem_id, tipo): quantidade}. Cada par vira um único upsert
+    sobre uq_armazem_recurso_tipo (INSERT ... ON CONFLICT / ON DUPLICATE KEY),
+    executado em lote; em outros bancos, um UPDATE em lote + INSERT dos que faltam.
+    Não faz commit. Os ArmazemRecurso já carregados na sessão recarregam a quantidade.
+    """
+    if not creditos:
+        return
+
+    tabela = ArmazemRecurso.__table__
+    linhas = [{'armazem_id': armazem_id, 'tipo': tipo, 'quantidade': quantidade, 'quantidade_reservada': 0.0}
+              for (armazem_id, tipo), quantidade in creditos.items()]
+    sql_upsert(db.session, tabela, linhas, ('armazem_id', 'tipo'),
+               lambda novo: {'quantidade': func.coalesce(tabela.c.quantidade, 0.0) + novo.quantidade})
+
+    for objeto in list(db.session.identity_map.values()):
+        if isinstance(objeto, ArmazemRecurso) and (objeto.armazem_id, objeto.tipo) in creditos:
+            db.session.expire(objeto, ['quantidade'])
+
@@ -1,6 +1,7 @@
 from app import db
-from app.models import Jogador, Empresa, ArmazemRecurso, ProductionRecipe, ProductionJob, HistoricoAcao
+from app.models import Jogador, Empresa, ArmazemRecurso, ProductionRecipe, ProductionJob
 from app.services.player_service import calculate_player_factors
+from app.services.history_service import record_history
 from datetime import datetime, timedelta
 from flask import current_app
 from math import ceil
@@ -31,6 +32,9 @@ def start_manufacturing(jogador: Jogador, empresa: Empresa, recipe_id: int, cycl
     desconto_energia = fatores['desconto_energia']
     real_energy_cost = ceil(total_energy_cost * (1.0 - desconto_energia))
     
+    # Grava a energia regenerada antes de validar/gastar
+    jogador.materializar_energia()
+    
     if jogador.energia < real_energy_cost:
         return (False, f"Energia insuficiente. Você precisa de {real_energy_cost} E (Base: {total_energy_cost} E).")
 
@@ -65,7 +69,7 @@ def start_manufacturing(jogador: Jogador, empresa: Empresa, recipe_id: int, cycl
         descricao_acao = (
             f"🏭 Iniciou produção de {recipe.output_item_type} ({cycles} ciclos). Custo: {total_input_quantity:.0f}t {recipe.input_item_type} e {real_energy_cost} E."
         )
-        hist = HistoricoAcao(
+        record_history(
             jogador_id=jogador.id,
             tipo_acao='PRODUCAO_INICIO',
             descricao=descricao_acao,
@@ -73,7 +77,7 @@ def start_manufacturing(jogador: Jogador, empresa: Empresa, recipe_id: int, cycl
             gold_delta=0.0
         )
 
-        db.session.add_all([production_job, armazem_recurso, jogador, hist])
+        db.session.add_all([production_job, armazem_recurso, jogador])
         
         return (True, f"Produção de {recipe.output_item_type.capitalize()} iniciada ({cycles} ciclos). Conclusão em {total_time_minutes} minutos.")
 
@@ -104,7 +108,7 @@ def complete_manufacturing_jobs(job: ProductionJob, jogador: Jogador):
     descricao_acao = (
         f"✅ Produção concluída: {output_quantity:.0f}t de {output_item_type.capitalize()} (Receita: {recipe.name})."
     )
-    hist = HistoricoAcao(
+    record_history(
         jogador_id=jogador.id,
         tipo_acao='PRODUCAO_FIM',
         descricao=descricao_acao,
@@ -117,5 +121,5 @@ def complete_manufacturing_jobs(job: ProductionJob, jogador: Jogador):
     xp_ganho = job.quantity_multiplier * current_app.config.get('XP_MANUFATURA_POR_CICLO', 50.0)
     jogador.experiencia_trabalho += xp_ganho
     
-    db.session.add_all([armazem_recurso, jogador, hist])
+    db.session.add_all([armazem_recurso, jogador])
     db.session.delete(job)
@@ -1,9 +1,14 @@
 from app import db
-from app.models import Jogador, Regiao, ArmazemRecurso, MarketOrder, RecursoNaMina, HistoricoAcao
+from app.models import Jogador, Regiao, Armazem, ArmazemRecurso, MarketOrder, RecursoNaMina
 from app.services.player_service import calculate_player_factors
+from app.services.history_service import record_history, record_history_many
+from app.services.trade_service import record_trades
+from app.order_book import order_book, discard_after_commit
+from app.market_depth import invalidate_after_commit
 from datetime import datetime, timedelta
 from flask import current_app
-from sqlalchemy import func
+from sqlalchemy import func, select, update, insert, case, bindparam, and_, or_
+from sqlalchemy.orm import joinedload
 
 def _calculate_tax(creator_jogador: Jogador, order_regiao: Regiao, total_value: float):
     """
@@ -21,11 +26,201 @@ def _calculate_tax(creator_jogador: Jogador, order_regiao: Regiao, total_value:
     
     return imposto_devido
 
+def _ordens_cruzadas(jogador: Jogador, order_type: str, resource_type: str, quantity: float, price_per_unit: float):
+    """
+    Percorre o lado oposto do livro em memória (prioridade preço-tempo) e escolhe as
+    ordens que uma ordem 'order_type' de 'quantity' a 'price_per_unit' executaria.
+    As ordens são relidas do banco em lotes (um SELECT ... FOR UPDATE por lote, com
+    saldo do livro suficiente para cobrir o que falta); entradas obsoletas saem do livro.
+    Retorna [(MarketOrder, quantidade a executar)].
+    """
+    order_book.reconcile()
+    lado_oposto = 'BUY' if order_type == 'SELL' else 'SELL'
+    candidatos = (entrada for entrada in order_book.crossing(resource_type, lado_oposto, price_per_unit)
+                  if entrada.jogador_id != jogador.id)
+
+    execucoes = []
+    restante = quantity
+    while restante > 0.001:
+        lote, saldo_no_livro = [], 0.0
+        for entrada in candidatos:
+            lote.append(entrada.id)
+            saldo_no_livro += entrada.restante
+            if saldo_no_livro >= restante or len(lote) >= 100:
+                break
+        if not lote:
+            break
+
+        ordens = {ordem.id: ordem for ordem in db.session.execute(
+            select(MarketOrder).where(MarketOrder.id.in_(lote))
+            .with_for_update().execution_options(populate_existing=True)
+        ).scalars()}
+        for ordem_id in lote:
+            ordem = ordens.get(ordem_id)
+            if not ordem or ordem.status != 'ACTIVE' or ordem.quantity_remaining <= 0.001:
+                order_book.discard(ordem_id) # Executada/cancelada em outro processo
+                continue
+            quantidade = min(restante, ordem.quantity_remaining)
+            execucoes.append((ordem, quantidade))
+            restante -= quantidade
+            if restante <= 0.001:
+                break
+
+    return execucoes
+
+def _varrer_livro(jogador: Jogador, order_type: str, resource_type: str, quantity: float, price_per_unit: float):
+    """
+    Executa de uma vez, na transação atual, as ordens do lado oposto que cruzam o
+    preço limite, cada uma ao preço DELA (mesmas regras do fill_order). O jogador é
+    o Taker; 'order_type' é o lado dele ('BUY' compra de ordens SELL, 'SELL' vende
+    para ordens BUY).
+
+    Os criadores e regiões das ordens são carregados com uma consulta cada, e os
+    saldos deles (dinheiro, escrow, armazém) são alterados com um UPDATE executemany
+    por tabela, somados por jogador/armazém. Os recursos na mina são agrupados por
+    região (compra) ou por comprador (venda). Não faz commit.
+    Retorna (True, quantidade executada, valor executado) ou (False, "Erro").
+    """
+    execucoes = _ordens_cruzadas(jogador, order_type, resource_type, quantity, price_per_unit)
+    if not execucoes:
+        return (True, 0.0, 0.0)
+
+    executado = sum(quantidade for _, quantidade in execucoes)
+    valor = sum(quantidade * ordem.price_per_unit for ordem, quantidade in execucoes)
+    itens_por_criador = {}          # jogador_id -> quantidade (SELL: sai do escrow dele; BUY: vai para a mina dele)
+    for ordem, quantidade in execucoes:
+        itens_por_criador[ordem.jogador_id] = itens_por_criador.get(ordem.jogador_id, 0.0) + quantidade
+
+    # 1. Validações antes de qualquer alteração
+    if order_type == 'BUY':
+        if jogador.dinheiro - jogador.dinheiro_reservado < valor:
+            return (False, "Dinheiro insuficiente para esta compra.")
+        reservas = {linha.jogador_id: linha for linha in db.session.execute(
+            select(Armazem.jogador_id, ArmazemRecurso.armazem_id, ArmazemRecurso.quantidade_reservada)
+            .join(ArmazemRecurso, ArmazemRecurso.armazem_id == Armazem.id)
+            .where(Armazem.jogador_id.in_(itens_por_criador), ArmazemRecurso.tipo == resource_type)
+        )}
+        for criador_id, quantidade in itens_por_criador.items():
+            reserva = reservas.get(criador_id)
+            if not reserva or reserva.quantidade_reservada < quantidade - 0.001:
+                raise Exception("Erro crítico de Escrow do Vendedor.") # Falha de segurança, reverte
+    else:
+        recurso_taker = jogador.armazem.recursos.filter_by(tipo=resource_type).first() if jogador.armazem else None
+        if not recurso_taker or recurso_taker.quantidade - recurso_taker.quantidade_reservada < executado:
+            return (False, f"Você não tem {executado:.0f}t de {resource_type} disponíveis para vender.")
+
+    criadores = {j.id: j for j in Jogador.query.filter(Jogador.id.in_(itens_por_criador))}
+    regioes = {r.id: r for r in Regiao.query.filter(Regiao.id.in_({ordem.regiao_id for ordem, _ in execucoes}))}
+    expiracao_mina = datetime.utcnow() + timedelta(minutes=current_app.config['RECURSO_NA_MINA_EXPIRACAO_MIN'])
+
+    # 2. Cada execução: imposto, saldos dos criadores, negócio, histórico e ordem
+    negocios, historico = [], []
+    dinheiro_por_criador = {}       # jogador_id -> (delta dinheiro, delta dinheiro_reservado)
+    mina_por_regiao = {}            # regiao_id -> quantidade comprada pelo Taker
+
+    for ordem, quantidade in execucoes:
+        criador = criadores[ordem.jogador_id]
+        total_value = quantidade * ordem.price_per_unit
+        imposto_devido = _calculate_tax(criador, regioes[ordem.regiao_id], total_value)
+        dinheiro, reservado = dinheiro_por_criador.get(criador.id, (0.0, 0.0))
+
+        if order_type == 'BUY':
+            # Ordem SELL: o criador (Vendedor) recebe o valor menos o imposto
+            dinheiro_por_criador[criador.id] = (dinheiro + total_value - imposto_devido, reservado)
+            mina_por_regiao[ordem.regiao_id] = mina_por_regiao.get(ordem.regiao_id, 0.0) + quantidade
+            historico.append({'jogador_id': criador.id, 'tipo_acao': 'VENDA_MERCADO',
+                              'descricao': f"Vendeu {quantidade:.0f}t de {resource_type} por R$ {total_value:,.2f} (Líquido: R$ {total_value - imposto_devido:,.2f})",
+                              'dinheiro_delta': total_value - imposto_devido})
+        else:
+            # Ordem BUY: o criador (Comprador) paga valor + imposto do escrow
+            dinheiro_por_criador[criador.id] = (dinheiro - total_value - imposto_devido, reservado - total_value - imposto_devido)
+            historico.append({'jogador_id': criador.id, 'tipo_acao': 'COMPRA_MERCADO',
+                              'descricao': f"Comprou {quantidade:.0f}t de {resource_type} por R$ {total_value:,.2f} (Imposto: R$ {imposto_devido:,.2f}). Recurso em {jogador.regiao_atual.nome}.",
+                              'dinheiro_delta': -(total_value + imposto_devido)})
+
+        negocios.append({'order_id': ordem.id, 'resource_type': resource_type, 'quantity': quantidade,
+                         'price_per_unit': ordem.price_per_unit, 'imposto': imposto_devido, 'lado_agressor': order_type,
+                         'comprador_id': jogador.id if order_type == 'BUY' else criador.id,
+                         'vendedor_id': criador.id if order_type == 'BUY' else jogador.id})
+
+        ordem.quantity_remaining -= quantidade
+        if ordem.quantity_remaining <= 0.001: # Evitar problemas de float
+            ordem.status = 'COMPLETED'
+
+    # 3. Taker (um objeto, ORM) e recursos na mina
+    if order_type == 'BUY':
+        jogador.dinheiro -= valor
+        linhas_mina = [{'jogador_id': jogador.id, 'regiao_id': regiao_id, 'tipo_recurso': resource_type,
+                        'quantidade': quantidade, 'data_expiracao': expiracao_mina}
+                       for regiao_id, quantidade in mina_por_regiao.items()]
+        historico.append({'jogador_id': jogador.id, 'tipo_acao': 'COMPRA_MERCADO',
+                          'descricao': f"Comprou {executado:.0f}t de {resource_type} por R$ {valor:,.2f} de {len(execucoes)} ordem(ns). "
+                                       f"Recurso em {', '.join(sorted(regioes[r].nome for r in mina_por_regiao))}.",
+                          'dinheiro_delta': -valor})
+    else:
+        recurso_taker.quantidade -= executado
+        jogador.dinheiro += valor
+        # Recurso na mina da *região do Taker* (Vendedor) para cada Comprador buscar
+        linhas_mina = [{'jogador_id': criador_id, 'regiao_id': jogador.regiao_atual_id, 'tipo_recurso': resource_type,
+                        'quantidade': quantidade, 'data_expiracao': expiracao_mina}
+                       for criador_id, quantidade in itens_por_criador.items()]
+        historico.append({'jogador_id': jogador.id, 'tipo_acao': 'VENDA_MERCADO',
+                          'descricao': f"Vendeu {executado:.0f}t de {resource_type} por R$ {valor:,.2f} para {len(execucoes)} ordem(ns) de compra.",
+                          'dinheiro_delta': valor})
+    db.session.execute(insert(RecursoNaMina), linhas_mina)
+
+    # 4. Saldos dos criadores: um UPDATE executemany por tabela
+    with db.session.no_autoflush:
+        if order_type == 'BUY':
+            tabela = ArmazemRecurso.__table__
+            db.session.execute(
+                update(tabela)
+                .where(tabela.c.armazem_id == bindparam('a_id'), tabela.c.tipo == bindparam('r_tipo'))
+                .values(quantidade_reservada=tabela.c.quantidade_reservada - bindparam('retirar'),
+                        quantidade=tabela.c.quantidade - bindparam('retirar')),
+                [{'a_id': reservas[criador_id].armazem_id, 'r_tipo': resource_type, 'retirar': quantidade}
+                 for criador_id, quantidade in itens_por_criador.items()]
+            )
+            armazens = {reserva.armazem_id for reserva in reservas.values()}
+            for objeto in list(db.session.identity_map.values()):
+                if isinstance(objeto, ArmazemRecurso) and objeto.armazem_id in armazens and objeto.tipo == resource_type:
+                    db.session.expire(objeto, ['quantidade', 'quantidade_reservada'])
+
+        tabela = Jogador.__table__
+        db.session.execute(
+            update(tabela).where(tabela.c.id == bindparam('j_id'))
+            .values(dinheiro=tabela.c.dinheiro + bindparam('d_dinheiro'),
+                    dinheiro_reservado=tabela.c.dinheiro_reservado + bindparam('d_reservado')),
+            [{'j_id': criador_id, 'd_dinheiro': dinheiro, 'd_reservado': reservado}
+             for criador_id, (dinheiro, reservado) in dinheiro_por_criador.items()]
+        )
+        for criador in criadores.values():
+            db.session.expire(criador, ['dinheiro', 'dinheiro_reservado'])
+
+    record_trades(negocios)
+    record_history_many(historico)
+    return (True, executado, valor)
+
+def _casar_com_livro(jogador: Jogador, order_type: str, resource_type: str, quantity: float, price_per_unit: float):
+    """
+    Casa uma ordem nova com o lado oposto do livro (ver _varrer_livro) antes de
+    ela entrar no livro. Desligado com MARKET_MATCHING = False.
+    Retorna (True, quantidade executada, valor executado) ou (False, "Erro").
+    """
+    if not current_app.config.get('MARKET_MATCHING', True):
+        return (True, 0.0, 0.0)
+    return _varrer_livro(jogador, order_type, resource_type, quantity, price_per_unit)
+
+def _resumo_execucao(resource_type: str, executado: float, valor: float):
+    return f"Executadas {executado:.0f}t de {resource_type} no livro por R$ {valor:,.2f} (preço médio R$ {valor / executado:,.2f})."
+
 # --- FUNÇÃO 1: CRIAR ORDEM DE VENDA ---
 def create_sell_order(creator_jogador: Jogador, resource_type: str, quantity: float, price_per_unit: float):
     """
     Cria uma ordem de VENDA.
-    Tranca os recursos no armazém do Vendedor (Creator).
+    Primeiro vende para as ordens de compra que pagam pelo menos price_per_unit
+    (livro de ofertas); só o restante vira ordem, com os recursos trancados no
+    armazém do Vendedor (Creator).
     Retorna (True, "Mensagem") ou (False, "Erro")
     """
     if quantity <= 0 or price_per_unit <= 0:
@@ -44,10 +239,21 @@ def create_sell_order(creator_jogador: Jogador, resource_type: str, quantity: fl
         return (False, f"Recursos insuficientes. Você tem {available_quantity:.0f}t disponíveis para vender.")
         
     try:
-        # 3. Trancar (Escrow) o recurso
-        recurso_armazem.quantidade_reservada += quantity
+        # 3. Casar com as ordens de compra do livro
+        resultado = _casar_com_livro(creator_jogador, 'SELL', resource_type, quantity, price_per_unit)
+        if not resultado[0]:
+            return resultado
+        _, executado, valor = resultado
+        restante = quantity - executado
+
+        resumo = _resumo_execucao(resource_type, executado, valor) if executado > 0 else ""
+        if restante <= 0.001:
+            return (True, resumo)
+
+        # 4. Trancar (Escrow) o recurso restante
+        recurso_armazem.quantidade_reservada += restante
         
-        # 4. Criar a Ordem
+        # 5. Criar a Ordem
         duration_hours = current_app.config['MARKET_ORDER_DURATION_HOURS']
         data_expiracao = datetime.utcnow() + timedelta(hours=duration_hours)
         
@@ -56,8 +262,8 @@ def create_sell_order(creator_jogador: Jogador, resource_type: str, quantity: fl
             regiao_id=creator_jogador.regiao_atual_id, # Imposto será baseado na região do vendedor
             order_type='SELL',
             resource_type=resource_type,
-            quantity=quantity,
-            quantity_remaining=quantity,
+            quantity=restante,
+            quantity_remaining=restante,
             price_per_unit=price_per_unit,
             data_expiracao=data_expiracao,
             status='ACTIVE'
@@ -67,7 +273,7 @@ def create_sell_order(creator_jogador: Jogador, resource_type: str, quantity: fl
         db.session.add(nova_ordem)
         # O commit será feito na rota
         
-        return (True, f"Ordem de venda de {quantity:.0f}t de {resource_type} criada com sucesso.")
+        return (True, f"{resumo} Ordem de venda de {restante:.0f}t de {resource_type} criada com sucesso.".strip())
 
     except Exception as e:
         db.session.rollback()
@@ -77,7 +283,9 @@ def create_sell_order(creator_jogador: Jogador, resource_type: str, quantity: fl
 def create_buy_order(creator_jogador: Jogador, resource_type: str, quantity: float, price_per_unit: float):
     """
     Cria uma ordem de COMPRA.
-    Tranca o dinheiro na carteira do Comprador (Creator).
+    Primeiro compra das ordens de venda com preço até price_per_unit (livro de
+    ofertas); só o restante vira ordem, com o dinheiro trancado na carteira do
+    Comprador (Creator).
     Retorna (True, "Mensagem") ou (False, "Erro")
     """
     if quantity <= 0 or price_per_unit <= 0:
@@ -95,10 +303,23 @@ def create_buy_order(creator_jogador: Jogador, resource_type: str, quantity: flo
         return (False, f"Dinheiro insuficiente. Você precisa de R$ {custo_total_com_imposto:,.2f} (R$ {total_cost:,.2f} + R$ {imposto_devido:,.2f} de imposto) e tem R$ {available_money:,.2f} disponíveis.")
         
     try:
-        # 2. Trancar (Escrow) o dinheiro
-        creator_jogador.dinheiro_reservado += custo_total_com_imposto
+        # 2. Casar com as ordens de venda do livro (sempre a preço <= limite, então
+        #    o dinheiro validado acima cobre as execuções e o escrow do restante)
+        resultado = _casar_com_livro(creator_jogador, 'BUY', resource_type, quantity, price_per_unit)
+        if not resultado[0]:
+            return resultado
+        _, executado, valor = resultado
+        restante = quantity - executado
+
+        resumo = _resumo_execucao(resource_type, executado, valor) if executado > 0 else ""
+        if restante <= 0.001:
+            return (True, resumo)
+
+        # 3. Trancar (Escrow) o dinheiro do restante
+        custo_restante = restante * price_per_unit
+        creator_jogador.dinheiro_reservado += custo_restante + _calculate_tax(creator_jogador, order_regiao, custo_restante)
         
-        # 3. Criar a Ordem
+        # 4. Criar a Ordem
         duration_hours = current_app.config['MARKET_ORDER_DURATION_HOURS']
         data_expiracao = datetime.utcnow() + timedelta(hours=duration_hours)
         
@@ -107,8 +328,8 @@ def create_buy_order(creator_jogador: Jogador, resource_type: str, quantity: flo
             regiao_id=creator_jogador.regiao_atual_id, # Imposto será baseado na região do comprador
             order_type='BUY',
             resource_type=resource_type,
-            quantity=quantity,
-            quantity_remaining=quantity,
+            quantity=restante,
+            quantity_remaining=restante,
             price_per_unit=price_per_unit,
             data_expiracao=data_expiracao,
             status='ACTIVE'
@@ -118,7 +339,7 @@ def create_buy_order(creator_jogador: Jogador, resource_type: str, quantity: flo
         db.session.add(nova_ordem)
         # O commit será feito na rota
         
-        return (True, f"Ordem de compra de {quantity:.0f}t de {resource_type} criada com sucesso.")
+        return (True, f"{resumo} Ordem de compra de {restante:.0f}t de {resource_type} criada com sucesso.".strip())
 
     except Exception as e:
         db.session.rollback()
@@ -200,8 +421,13 @@ def fill_order(taker_jogador: Jogador, order_id: int, quantity_to_fill: float):
                 order.status = 'COMPLETED'
 
             # 7. Histórico
-            db.session.add(HistoricoAcao(jogador_id=creator_jogador.id, tipo_acao='VENDA_MERCADO', descricao=f"Vendeu {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f} (Líquido: R$ {lucro_liquido_creator:,.2f})", dinheiro_delta=lucro_liquido_creator))
-            db.session.add(HistoricoAcao(jogador_id=taker_jogador.id, tipo_acao='COMPRA_MERCADO', descricao=f"Comprou {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f}. Recurso em {order_regiao.nome}.", dinheiro_delta=-total_value))
+            record_history(jogador_id=creator_jogador.id, tipo_acao='VENDA_MERCADO', descricao=f"Vendeu {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f} (Líquido: R$ {lucro_liquido_creator:,.2f})", dinheiro_delta=lucro_liquido_creator)
+            record_history(jogador_id=taker_jogador.id, tipo_acao='COMPRA_MERCADO', descricao=f"Comprou {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f}. Recurso em {order_regiao.nome}.", dinheiro_delta=-total_value)
+
+            # 8. Registro do negócio (histórico de preços e velas)
+            record_trades([{'order_id': order.id, 'comprador_id': taker_jogador.id, 'vendedor_id': creator_jogador.id,
+                            'resource_type': order.resource_type, 'quantity': quantity_to_fill,
+                            'price_per_unit': order.price_per_unit, 'imposto': imposto_devido, 'lado_agressor': 'BUY'}])
             
             return (True, f"Compra de {quantity_to_fill:.0f}t realizada! O recurso está em {order_regiao.nome} aguardando seu transporte.")
 
@@ -224,8 +450,9 @@ def fill_order(taker_jogador: Jogador, order_id: int, quantity_to_fill: float):
 
             custo_total_com_imposto = total_value + imposto_devido
             
+            # Libera o escrow e paga valor + imposto
             creator_jogador.dinheiro_reservado -= custo_total_com_imposto
-            creator_jogador.dinheiro -= imposto_devido # Paga o imposto
+            creator_jogador.dinheiro -= custo_total_com_imposto
             taker_jogador.dinheiro += total_value
             
             # 5. Transação de Itens
@@ -248,10 +475,15 @@ def fill_order(taker_jogador: Jogador, order_id: int, quantity_to_fill: float):
                 order.status = 'COMPLETED'
                 
             # 8. Histórico
-            db.session.add(HistoricoAcao(jogador_id=creator_jogador.id, tipo_acao='COMPRA_MERCADO', descricao=f"Comprou {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f} (Imposto: R$ {imposto_devido:,.2f}). Recurso em {taker_jogador.regiao_atual.nome}.", 
-                                         dinheiro_delta=0,
-                                         gold_delta=0))
-            db.session.add(HistoricoAcao(jogador_id=taker_jogador.id, tipo_acao='VENDA_MERCADO', descricao=f"Vendeu {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f} para uma ordem de compra.", dinheiro_delta=total_value))
+            record_history(jogador_id=creator_jogador.id, tipo_acao='COMPRA_MERCADO', descricao=f"Comprou {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f} (Imposto: R$ {imposto_devido:,.2f}). Recurso em {taker_jogador.regiao_atual.nome}.", 
+                           dinheiro_delta=-custo_total_com_imposto,
+                           gold_delta=0)
+            record_history(jogador_id=taker_jogador.id, tipo_acao='VENDA_MERCADO', descricao=f"Vendeu {quantity_to_fill:.0f}t de {order.resource_type} por R$ {total_value:,.2f} para uma ordem de compra.", dinheiro_delta=total_value)
+
+            # 9. Registro do negócio (histórico de preços e velas)
+            record_trades([{'order_id': order.id, 'comprador_id': creator_jogador.id, 'vendedor_id': taker_jogador.id,
+                            'resource_type': order.resource_type, 'quantity': quantity_to_fill,
+                            'price_per_unit': order.price_per_unit, 'imposto': imposto_devido, 'lado_agressor': 'SELL'}])
 
             return (True, f"Venda de {quantity_to_fill:.0f}t realizada com sucesso!")
 
@@ -304,4 +536,193 @@ def cancel_order(jogador: Jogador, order_id: int):
     except Exception as e:
         db.session.rollback()
         return (False, f"Erro ao cancelar ordem: {e}")
-    
\ No newline at end of file
+
+# --- FUNÇÃO 5: EXPIRAR ORDENS (EM LOTE) ---
+def expire_orders(now, limite=1000):
+    """
+    Expira até 'limite' ordens ATIVAS vencidas e devolve o escrow em lote.
+
+    1. Um UPDATE marca o lote como EXPIRED (e devolve as ordens, via RETURNING
+       quando o banco suporta), então nenhuma ordem é devolvida duas vezes.
+    2. As devoluções são somadas por jogador (BUY: valor restante + imposto, igual
+       ao cancel_order) e por armazém/recurso (SELL: quantidade restante).
+    3. Cada grupo é aplicado com um único UPDATE executemany.
+
+    Não faz commit. Retorna a lista de ordens expiradas (linhas).
+    """
+    colunas = (MarketOrder.id, MarketOrder.jogador_id, MarketOrder.regiao_id, MarketOrder.order_type,
+               MarketOrder.resource_type, MarketOrder.quantity_remaining, MarketOrder.price_per_unit)
+    # IDs lidos antes: o MySQL/MariaDB não aceita LIMIT em subconsulta de IN
+    ids = db.session.execute(
+        select(MarketOrder.id)
+        .where(MarketOrder.status == 'ACTIVE', MarketOrder.data_expiracao <= now)
+        .order_by(MarketOrder.data_expiracao)
+        .limit(limite)
+    ).scalars().all()
+    if not ids:
+        return []
+
+    if db.session.get_bind().dialect.update_returning:
+        ordens = db.session.execute(
+            update(MarketOrder)
+            .where(MarketOrder.id.in_(ids), MarketOrder.status == 'ACTIVE')
+            .values(status='EXPIRED')
+            .returning(*colunas)
+            .execution_options(synchronize_session=False)
+        ).all()
+    else:
+        ordens = db.session.execute(
+            select(*colunas).where(MarketOrder.id.in_(ids), MarketOrder.status == 'ACTIVE')
+        ).all()
+        if ordens:
+            db.session.execute(
+                update(MarketOrder)
+                .where(MarketOrder.id.in_([ordem.id for ordem in ordens]))
+                .values(status='EXPIRED')
+                .execution_options(synchronize_session=False)
+            )
+
+    if not ordens:
+        return []
+
+    # Saem do livro em memória (e dos níveis da escada) quando o lote for confirmado
+    discard_after_commit(db.session, [ordem.id for ordem in ordens])
+    invalidate_after_commit(db.session, {(ordem.resource_type, ordem.order_type, ordem.price_per_unit) for ordem in ordens})
+
+    # --- Devoluções de dinheiro (BUY) por jogador ---
+    compras = [ordem for ordem in ordens if ordem.order_type == 'BUY']
+    if compras:
+        jogadores = {j.id: j for j in Jogador.query.filter(Jogador.id.in_({o.jogador_id for o in compras}))}
+        regioes = {r.id: r for r in Regiao.query.filter(Regiao.id.in_({o.regiao_id for o in compras}))}
+
+        dinheiro_por_jogador = {}
+        for ordem in compras:
+            jogador = jogadores.get(ordem.jogador_id)
+            regiao = regioes.get(ordem.regiao_id)
+            if not jogador:
+                continue
+            valor_restante = ordem.quantity_remaining * ordem.price_per_unit
+            imposto_restante = _calculate_tax(jogador, regiao, valor_restante) if regiao else 0.0
+            dinheiro_por_jogador[jogador.id] = dinheiro_por_jogador.get(jogador.id, 0.0) + valor_restante + imposto_restante
+
+        tabela = Jogador.__table__
+        novo_reservado = tabela.c.dinheiro_reservado - bindparam('devolver')
+        db.session.execute(
+            update(tabela)
+            .where(tabela.c.id == bindparam('j_id'))
+            .values(dinheiro_reservado=case((novo_reservado < 0, 0.0), else_=novo_reservado)),
+            [{'j_id': jogador_id, 'devolver': valor} for jogador_id, valor in dinheiro_por_jogador.items()]
+        )
+
+    # --- Devoluções de itens (SELL) por armazém e recurso ---
+    vendas = [ordem for ordem in ordens if ordem.order_type == 'SELL']
+    if vendas:
+        armazem_por_jogador = dict(db.session.execute(
+            select(Armazem.jogador_id, Armazem.id).where(Armazem.jogador_id.in_({o.jogador_id for o in vendas}))
+        ).all())
+
+        itens_por_recurso = {}
+        for ordem in vendas:
+            armazem_id = armazem_por_jogador.get(ordem.jogador_id)
+            if armazem_id is None:
+                continue
+            chave = (armazem_id, ordem.resource_type)
+            itens_por_recurso[chave] = itens_por_recurso.get(chave, 0.0) + ordem.quantity_remaining
+
+        if itens_por_recurso:
+            tabela = ArmazemRecurso.__table__
+            nova_reserva = tabela.c.quantidade_reservada - bindparam('devolver')
+            db.session.execute(
+                update(tabela)
+                .where(tabela.c.armazem_id == bindparam('a_id'), tabela.c.tipo == bindparam('r_tipo'))
+                .values(quantidade_reservada=case((nova_reserva < 0, 0.0), else_=nova_reserva)),
+                [{'a_id': armazem_id, 'r_tipo': tipo, 'devolver': quantidade}
+                 for (armazem_id, tipo), quantidade in itens_por_recurso.items()]
+            )
+
+    return ordens
+
+# --- FUNÇÃO 6: LISTAR O LIVRO (PAGINADO) ---
+def list_orders(order_type: str, resource_type=None, regiao_id=None, excluir_jogador_id=None, apos=None, limite=50):
+    """
+    Uma página das ordens ATIVAS de um lado, da melhor para a pior: SELL por
+    preço crescente e BUY por preço decrescente (o id desempata no mesmo sentido).
+
+    Paginação por chave (keyset): 'apos' é o (preço, id) da última ordem da
+    página anterior. A consulta percorre o índice ix_market_order_book (com
+    recurso) ou ix_market_order_price (sem recurso) a partir desse ponto, então o
+    custo depende do tamanho da página e não do total de ordens abertas.
+    Região e "excluir minhas ordens" são filtros residuais.
+
+    Retorna (ordens, cursor da próxima página ou None).
+    """
+    decrescente = order_type == 'BUY'
+    preco, ordem_id = MarketOrder.price_per_unit, MarketOrder.id
+
+    consulta = (select(MarketOrder)
+                .options(joinedload(MarketOrder.jogador))
+                .where(MarketOrder.status == 'ACTIVE', MarketOrder.order_type == order_type))
+    if resource_type:
+        consulta = consulta.where(MarketOrder.resource_type == resource_type)
+    if regiao_id:
+        consulta = consulta.where(MarketOrder.regiao_id == regiao_id)
+    if excluir_jogador_id:
+        consulta = consulta.where(MarketOrder.jogador_id != excluir_jogador_id)
+
+    if apos:
+        preco_apos, id_apos = apos
+        if decrescente:
+            consulta = consulta.where(or_(preco < preco_apos, and_(preco == preco_apos, ordem_id < id_apos)))
+        else:
+            consulta = consulta.where(or_(preco > preco_apos, and_(preco == preco_apos, ordem_id > id_apos)))
+
+    ordenacao = (preco.desc(), ordem_id.desc()) if decrescente else (preco.asc(), ordem_id.asc())
+    ordens = db.session.execute(consulta.order_by(*ordenacao).limit(limite + 1)).scalars().all()
+
+    if len(ordens) > limite:
+        ordens = ordens[:limite]
+        ultima = ordens[-1]
+        return (ordens, (ultima.price_per_unit, ultima.id))
+    return (ordens, None)
+
+# --- FUNÇÃO 7: VARREDURA (EXECUTAR VÁRIAS ORDENS DE UMA VEZ) ---
+def sweep_orders(taker_jogador: Jogador, resource_type: str, side: str, quantity: float, limit_price: float):
+    """
+    Executa até 'quantity' contra o livro, da melhor ordem para a pior, sem passar
+    do preço limite: side='BUY' compra das ordens de venda com preço <= limite,
+    side='SELL' vende para as ordens de compra com preço >= limite.
+    Tudo em uma transação, com os saldos atualizados em lote (ver _varrer_livro).
+    O que o livro não cobrir até o limite simplesmente não é executado (nenhuma ordem é criada).
+    Retorna (True, "Mensagem") ou (False, "Erro")
+    """
+    if quantity <= 0 or limit_price <= 0 or side not in ('BUY', 'SELL'):
+        return (False, "Valores inválidos.")
+
+    # 1. Validação do pior caso (tudo executado no preço limite), como na criação de ordens
+    if side == 'BUY':
+        custo_maximo = quantity * limit_price
+        available_money = taker_jogador.dinheiro - taker_jogador.dinheiro_reservado
+        if available_money < custo_maximo:
+            return (False, f"Dinheiro insuficiente. A varredura pode custar até R$ {custo_maximo:,.2f} e você tem R$ {available_money:,.2f} disponíveis.")
+    else:
+        recurso_armazem = taker_jogador.armazem.recursos.filter_by(tipo=resource_type).first() if taker_jogador.armazem else None
+        available_quantity = recurso_armazem.quantidade - recurso_armazem.quantidade_reservada if recurso_armazem else 0
+        if available_quantity < quantity:
+            return (False, f"Recursos insuficientes. Você tem {available_quantity:.0f}t disponíveis para vender.")
+
+    try:
+        resultado = _varrer_livro(taker_jogador, side, resource_type, quantity, limit_price)
+        if not resultado[0]:
+            return resultado
+        _, executado, valor = resultado
+
+        if executado <= 0:
+            return (False, f"Nenhuma ordem de {resource_type} disponível até R$ {limit_price:,.2f}.")
+        mensagem = _resumo_execucao(resource_type, executado, valor)
+        if quantity - executado > 0.001:
+            mensagem += f" {quantity - executado:.0f}t não encontraram ordens até o preço limite."
+        return (True, mensagem)
+
+    except Exception as e:
+        db.session.rollback()
+        return (False, f"Erro ao processar varredura: {e}")
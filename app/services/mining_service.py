@@ -1,10 +1,12 @@
 from app import db
-from app.models import Jogador, Empresa, Regiao, HistoricoAcao, RecursoNaMina
+from app.models import Jogador, Empresa, Regiao, RecursoNaMina
 from app.services.player_service import calculate_player_factors
-from app.utils import format_currency_python
+from app.services.history_service import record_history
+from app.utils import format_currency_python, SQL_DIALETOS_SUPORTADOS, sql_seconds_between
 from datetime import datetime, timedelta
 from flask import current_app
 from math import ceil
+from sqlalchemy import case, func, literal, update
 
 def get_money_production(xp_trabalho):
     """Calcula o valor total em dinheiro gerado pela ação, escalado pela XP."""
@@ -15,12 +17,51 @@ def get_money_production(xp_trabalho):
 
     return base_production * multiplicador
 
+def consumir_reserva(regiao: Regiao, recurso: str, quantidade: float, now=None):
+    """
+    Desconta 'quantidade' da reserva de 'ouro' ou 'ferro' da região, aplicando antes
+    a recarga contínua acumulada (ver Regiao.calcular_reserva), em um único UPDATE
+    atômico: duas extrações simultâneas na mesma região não se sobrescrevem.
+    """
+    now = now or datetime.utcnow()
+    dialect_name = db.engine.dialect.name
+
+    if dialect_name not in SQL_DIALETOS_SUPORTADOS:
+        regiao.materializar_reservas(now)
+        atual = getattr(regiao, f'reserva_{recurso}')
+        setattr(regiao, f'reserva_{recurso}', max(0.0, atual - quantidade))
+        return
+
+    segundos = sql_seconds_between(dialect_name, func.coalesce(Regiao.last_reserve_update, literal(now)), now)
+    periodo = current_app.config['RESERVE_REFILL_HOURS'] * 3600.0
+
+    valores = []
+    for nome in Regiao.RECURSOS_COM_RESERVA:
+        coluna = getattr(Regiao, f'reserva_{nome}')
+        maximo = getattr(Regiao, f'reserva_{nome}_max')
+        recarregada = coluna + maximo * segundos / periodo
+        nova = case((coluna >= maximo, coluna), (recarregada > maximo, maximo), else_=recarregada)
+        if nome == recurso:
+            nova = case((nova - quantidade < 0, 0.0), else_=nova - quantidade)
+        valores.append((coluna, nova))
+    # last_reserve_update por último: o MySQL avalia o SET da esquerda para a direita
+    valores.append((Regiao.last_reserve_update, now))
+
+    db.session.execute(
+        update(Regiao).where(Regiao.id == regiao.id).ordered_values(*valores),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.expire(regiao, ['reserva_ouro', 'reserva_ferro', 'last_reserve_update'])
+
 def mine_gold_action(jogador: Jogador, empresa: Empresa, regiao: Regiao, energia_gasta: int):
     """
     Executa a lógica de negócio de minerar ouro.
     Retorna (sucesso: bool, mensagem: str)
     """
 
+    # Grava a energia regenerada antes do gasto
+    jogador.materializar_energia()
+
     # --- 1. CÁLCULO DE FATORES (Agora do Serviço) ---
     fatores = calculate_player_factors(jogador)
     desconto_energia = fatores['desconto_energia']
@@ -68,7 +109,7 @@ def mine_gold_action(jogador: Jogador, empresa: Empresa, regiao: Regiao, energia
 
     # D. Subtração de Reserva
     esgotamento_total = current_app.config['ESGOTAMENTO_POR_ENERGIA'] * energia_gasta 
-    regiao.reserva_ouro = max(0.0, regiao.reserva_ouro - esgotamento_total)
+    consumir_reserva(regiao, 'ouro', esgotamento_total)
 
     # --- ATUALIZAÇÃO DO JOGADOR, EMPRESA E REGIÃO ---
 
@@ -101,14 +142,13 @@ def mine_gold_action(jogador: Jogador, empresa: Empresa, regiao: Regiao, energia
         f"⛏️ Gastou {energia_gasta} E extraindo ouro em {empresa.nome} - {regiao.nome}. Lucro líquido: {format_currency_python(dinheiro_liquido_jogador)} e {gold_liquido_jogador:.2f} Kg."
     )
 
-    hist = HistoricoAcao(
+    record_history(
         jogador_id=jogador.id,
         tipo_acao='MINERACAO',
         descricao=descricao_acao,
         dinheiro_delta=dinheiro_liquido_jogador,
         gold_delta=gold_liquido_jogador
     )
-    db.session.add(hist)
 
     # O commit será feito na rota, após o serviço retornar
 
@@ -120,6 +160,9 @@ def mine_iron_action(jogador: Jogador, empresa: Empresa, regiao: Regiao, energia
     Retorna (sucesso: bool, mensagem: str, levelup: bool)
     """
     
+    # Grava a energia regenerada antes do gasto
+    jogador.materializar_energia()
+
     # --- 1. CALCULAR FATORES (Do Serviço) ---
     fatores = calculate_player_factors(jogador)
     desconto_energia = fatores['desconto_energia']
@@ -140,7 +183,7 @@ def mine_iron_action(jogador: Jogador, empresa: Empresa, regiao: Regiao, energia
 
     # 1. ESGOOTAMENTO: Reduz a reserva regional
     esgotamento_total = current_app.config['ESGOTAMENTO_POR_ENERGIA'] * energia_gasta
-    regiao.reserva_ferro = max(0.0, regiao.reserva_ferro - esgotamento_total) 
+    consumir_reserva(regiao, 'ferro', esgotamento_total)
 
     # 2. REGISTRAR RECURSO NA MINA (À ESPERA DE TRANSPORTE)
     recurso_mina = RecursoNaMina.query.filter_by(
@@ -174,11 +217,11 @@ def mine_iron_action(jogador: Jogador, empresa: Empresa, regiao: Regiao, energia
     descricao_acao = (
         f"⛏️ Gastou {energia_gasta} E extraindo ferro em {empresa.nome} - {regiao.nome}. Lucro: {ferro_obtido:.0f} toneladas."
     )
-    hist = HistoricoAcao(
+    record_history(
         jogador_id=jogador.id, tipo_acao='MINERACAO',
         descricao=descricao_acao, dinheiro_delta=0.0, gold_delta=0.0
     )
     
-    db.session.add_all([recurso_mina, hist])
+    db.session.add(recurso_mina)
     
     return (True, descricao_acao, levelup)
\ No newline at end of file
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 def calculate_player_factors(jogador):
     """Calcula os fatores de bônus/desconto com base nas habilidades do jogador."""
 
@@ -18,3 +20,118 @@ def calculate_player_factors(jogador):
         'multiplicador_xp_educacao': 1.0 + bonus_xp_geral,
         'desconto_imposto': desconto_imposto
     }
+
+def catch_up_player(jogador_id, now=None):
+    """
+    Acerta os temporizadores vencidos e a energia de UM jogador (treino, viagem,
+    residência, colheitas, produções e transportes dele), sem tocar no resto do mundo.
+    Mesmo isolamento do tick (_concluir_lote): cada entidade roda no seu próprio
+    SAVEPOINT; se ela falhar, só ela é desfeita e vai para falha_conclusao, e as que
+    estão em quarentena são puladas. Retorna o número de entidades concluídas.
+    """
+    from app import db
+    from app.models import Jogador
+    from app.services.completion_service import TIMED_ENTITIES, limpar_falhas, registrar_falha, sem_quarentena
+
+    now = now or datetime.utcnow()
+    ok = {}
+
+    try:
+        for tipo, (modelo, coluna, handler) in TIMED_ENTITIES.items():
+            vencidas = modelo.query.filter(
+                modelo.jogador_id == jogador_id,
+                getattr(modelo, coluna) <= now,
+                sem_quarentena(tipo)
+            ).order_by(getattr(modelo, coluna)).all()
+
+            for entidade in vencidas:
+                entidade_id = entidade.id
+                try:
+                    with db.session.begin_nested():
+                        handler(entidade)
+                    ok.setdefault(tipo, []).append(entidade_id)
+                except Exception as e:
+                    try:
+                        with db.session.begin_nested():
+                            quarentena = registrar_falha(tipo, entidade_id, e, now)
+                    except Exception:
+                        quarentena = False
+                    print(f"ERRO ao concluir {tipo} ID {entidade_id}{' (em quarentena)' if quarentena else ''}: {e}")
+
+        for tipo, ids in ok.items():
+            limpar_falhas(tipo, ids)
+
+        jogador = db.session.get(Jogador, jogador_id)
+        if jogador:
+            jogador.materializar_energia(now)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return sum(len(ids) for ids in ok.values())
+
+def regenerate_energy_bulk(now, dialect_name, regiao_ids=None):
+    """
+    Regeneração de energia em um único UPDATE (modo 'bulk').
+    Mesma regra do modo 'python': minutos completos * taxa * (1 + índice de saúde
+    da região atual), limitado a MAX_ENERGIA, preservando o resto dos segundos.
+    Só toca jogadores abaixo de MAX_ENERGIA; com 'regiao_ids', só os que estão nessas regiões.
+    """
+    from datetime import timedelta
+    from sqlalchemy import case, func, select, update
+    from app import db
+    from app.models import Jogador, Regiao
+    from app.utils import sql_add_seconds, sql_floor_int, sql_seconds_between
+    from config import Config
+
+    minutos = sql_floor_int(dialect_name, sql_seconds_between(dialect_name, Jogador.last_status_update, now) / 60.0)
+
+    indice_saude = select(Regiao.indice_saude).where(
+        Regiao.id == Jogador.regiao_atual_id
+    ).scalar_subquery()
+
+    energia_ganha = sql_floor_int(
+        dialect_name, minutos * Config.ENERGIA_POR_MINUTO * (1.0 + func.coalesce(indice_saude, 0.0))
+    )
+    nova_energia = case(
+        (Jogador.energia + energia_ganha >= Config.MAX_ENERGIA, Config.MAX_ENERGIA),
+        else_=Jogador.energia + energia_ganha
+    )
+
+    # A energia é atribuída antes do timestamp (o MySQL avalia o SET em ordem)
+    stmt = update(Jogador).where(
+        Jogador.energia < Config.MAX_ENERGIA,
+        Jogador.last_status_update <= now - timedelta(minutes=1)
+    ).ordered_values(
+        (Jogador.energia, nova_energia),
+        (Jogador.last_status_update, sql_add_seconds(dialect_name, Jogador.last_status_update, minutos * 60)),
+    ).execution_options(synchronize_session=False)
+    if regiao_ids is not None:
+        stmt = stmt.where(Jogador.regiao_atual_id.in_(regiao_ids))
+
+    return db.session.execute(stmt).rowcount
+
+def materialize_energy(now, regiao_ids):
+    """
+    Grava a energia regenerada até 'now' dos jogadores abaixo de MAX_ENERGIA que
+    estão nas regiões dadas, com o índice de saúde atual delas. No modo 'lazy' a
+    energia é calculada na leitura com o índice vigente; por isso é chamado antes de
+    o índice mudar (recalcular_indices_regionais), para o novo valor não valer
+    retroativamente. Quem já está cheio fica de fora. Não faz commit.
+    Retorna o número de jogadores atualizados.
+    """
+    from app import db
+    from app.models import Jogador
+    from app.utils import SQL_DIALETOS_SUPORTADOS
+    from config import Config
+
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name in SQL_DIALETOS_SUPORTADOS:
+        return regenerate_energy_bulk(now, dialect_name, regiao_ids)
+
+    jogadores = Jogador.query.filter(Jogador.regiao_atual_id.in_(regiao_ids), Jogador.energia < Config.MAX_ENERGIA).all()
+    for jogador in jogadores:
+        jogador.materializar_energia(now)
+    return len(jogadores)
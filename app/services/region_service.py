@@ -0,0 +1,156 @@
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import Jogador, Regiao
+from app.services.player_service import materialize_energy
+from sqlalchemy import select, update, func
+
+# Habilidades que compõem os índices regionais: habilidade -> coluna agregada em Regiao
+HABILIDADES_REGIONAIS = {
+    'educacao': 'soma_educacao',
+    'saude': 'soma_saude',
+    'filantropia': 'soma_filantropia',
+}
+
+# ------------------ AGREGADOS (DELTAS) ------------------
+# As somas por região são mantidas por delta nos pontos que alteram habilidades
+# ou residência. Nenhuma função faz commit: o delta entra na transação de quem chama.
+
+def aplicar_delta_habilidades(regiao_id, deltas):
+    """
+    Soma os deltas ({'educacao': x, ...}) nos agregados da região e marca os
+    índices como pendentes. UPDATE atômico (não depende do objeto carregado).
+    """
+    if regiao_id is None:
+        return
+
+    valores = {}
+    for habilidade, delta in deltas.items():
+        if delta:
+            coluna = getattr(Regiao, HABILIDADES_REGIONAIS[habilidade])
+            valores[coluna] = coluna + delta
+
+    if not valores:
+        return
+
+    valores[Regiao.indices_pendentes] = True
+    db.session.execute(
+        update(Regiao).where(Regiao.id == regiao_id).values(valores)
+        .execution_options(synchronize_session=False)
+    )
+
+def habilidades_do_jogador(jogador, sinal=1.0):
+    """Contribuição do jogador para os agregados da sua região de residência."""
+    return {h: sinal * (getattr(jogador, f'habilidade_{h}') or 0.0) for h in HABILIDADES_REGIONAIS}
+
+def registrar_mudanca_habilidade(jogador, habilidade, valor_antigo, valor_novo):
+    """Chamado quando uma habilidade regional do jogador muda (ex.: treino concluído)."""
+    if habilidade not in HABILIDADES_REGIONAIS:
+        return
+    aplicar_delta_habilidades(jogador.regiao_residencia_id,
+                              {habilidade: (valor_novo or 0.0) - (valor_antigo or 0.0)})
+
+def registrar_mudanca_residencia(jogador, origem_id, destino_id):
+    """Move a contribuição do jogador da região de origem para a de destino."""
+    if origem_id == destino_id:
+        return
+    aplicar_delta_habilidades(origem_id, habilidades_do_jogador(jogador, -1.0))
+    aplicar_delta_habilidades(destino_id, habilidades_do_jogador(jogador))
+
+def registrar_remocao_jogador(jogador):
+    """Retira a contribuição de um jogador que está sendo excluído."""
+    aplicar_delta_habilidades(jogador.regiao_residencia_id, habilidades_do_jogador(jogador, -1.0))
+
+# ------------------ ÍNDICES ------------------
+
+def recalcular_indices_regionais():
+    """
+    Recalcula Educação/Saúde/Filantropia/Desenvolvimento/Imposto a partir dos agregados.
+
+    Os índices são proporções do total global, então qualquer mudança afeta todas
+    as regiões: o recálculo é O(regiões) e só acontece se alguma região estiver
+    marcada como pendente. Retorna o número de regiões recalculadas (0 = nada mudou).
+    """
+    pendentes = db.session.execute(
+        select(func.count(Regiao.id)).where(Regiao.indices_pendentes.is_(True))
+    ).scalar()
+    if not pendentes:
+        return 0
+
+    # Limpa as marcas antes de ler as somas: um delta que chegar depois marca de novo
+    db.session.execute(
+        update(Regiao).where(Regiao.indices_pendentes.is_(True)).values(indices_pendentes=False)
+        .execution_options(synchronize_session=False)
+    )
+
+    todas_regioes = Regiao.query.populate_existing().all()
+
+    total_global = {h: 0.0 for h in HABILIDADES_REGIONAIS}
+    for regiao in todas_regioes:
+        for habilidade, coluna in HABILIDADES_REGIONAIS.items():
+            total_global[habilidade] += getattr(regiao, coluna) or 0.0
+
+    # Soma total dos 3 índices globalmente (necessário para o ID)
+    soma_global_id = sum(total_global.values())
+
+    novo_indice_saude = {
+        regiao.id: (regiao.soma_saude or 0.0) / total_global['saude'] if total_global['saude'] > 0 else 0.0
+        for regiao in todas_regioes
+    }
+    # Energia preguiçosa (calculada com o índice de saúde vigente): grava a regeneração
+    # até agora com o índice antigo, para o novo não valer para o tempo já decorrido.
+    # Como os índices são proporções globais, quase toda mudança mexe em todas as regiões;
+    # só as que variam além da tolerância pagam a gravação dos seus jogadores.
+    if current_app.config.get('ENERGY_REGEN_MODE') == 'lazy':
+        tolerancia = current_app.config.get('ENERGY_INDEX_TOLERANCE', 0.0)
+        regioes_saude = [regiao.id for regiao in todas_regioes
+                         if abs(novo_indice_saude[regiao.id] - (regiao.indice_saude or 0.0)) > tolerancia]
+        if regioes_saude:
+            materialize_energy(datetime.utcnow(), regioes_saude)
+
+    for regiao in todas_regioes:
+        soma_educacao = regiao.soma_educacao or 0.0
+        soma_saude = regiao.soma_saude or 0.0
+        soma_filantropia = regiao.soma_filantropia or 0.0
+
+        # --- CÁLCULO DAS PROPORÇÕES (0.00 a 1.00) ---
+        regiao.indice_educacao = soma_educacao / total_global['educacao'] if total_global['educacao'] > 0 else 0.0
+        regiao.indice_saude = novo_indice_saude[regiao.id]
+        regiao.indice_filantropia = soma_filantropia / total_global['filantropia'] if total_global['filantropia'] > 0 else 0.0
+
+        # --- CÁLCULO DO ÍNDICE DE DESENVOLVIMENTO (ID) ---
+        if soma_global_id > 0:
+            # ID = (Soma Localização / Soma Global) * 10
+            indice_dev = ((soma_educacao + soma_saude + soma_filantropia) / soma_global_id) * 10
+            indice_dev = max(1.0, min(10.0, indice_dev))
+        else:
+            indice_dev = 1.0
+
+        regiao.indice_desenvolvimento = indice_dev
+
+        # Calcular Imposto (Taxa)
+        regiao.calcular_taxa_imposto()
+
+    return len(todas_regioes)
+
+def reconstruir_agregados():
+    """
+    Recalcula as somas de todas as regiões a partir dos jogadores residentes
+    (GROUP BY) e marca os índices como pendentes. Usado na migração e para corrigir
+    desvios; o caminho normal é por delta.
+    """
+    somas = db.session.execute(
+        select(Jogador.regiao_residencia_id,
+               func.coalesce(func.sum(Jogador.habilidade_educacao), 0.0),
+               func.coalesce(func.sum(Jogador.habilidade_saude), 0.0),
+               func.coalesce(func.sum(Jogador.habilidade_filantropia), 0.0))
+        .where(Jogador.regiao_residencia_id.isnot(None))
+        .group_by(Jogador.regiao_residencia_id)
+    ).all()
+    por_regiao = {regiao_id: (edu, saude, filan) for regiao_id, edu, saude, filan in somas}
+
+    regioes = Regiao.query.all()
+    for regiao in regioes:
+        regiao.soma_educacao, regiao.soma_saude, regiao.soma_filantropia = por_regiao.get(regiao.id, (0.0, 0.0, 0.0))
+        regiao.indices_pendentes = True
+    return len(regioes)
@@ -0,0 +1,86 @@
+from app import db
+from app.models import MarketTrade, MarketCandle
+from datetime import datetime
+from app.utils import sql_upsert
+from sqlalchemy import case, insert, select
+
+# Intervalos das velas: início do intervalo de um instante
+INTERVALOS_VELA = {
+    '1m': lambda data: data.replace(second=0, microsecond=0),
+    '1h': lambda data: data.replace(minute=0, second=0, microsecond=0),
+    '1d': lambda data: data.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+def record_trades(negocios, now=None):
+    """
+    Registra negócios executados no mercado. Cada negócio é um dict com order_id,
+    comprador_id, vendedor_id, resource_type, quantity, price_per_unit, imposto e
+    lado_agressor.
+
+    1. Um INSERT (executemany) no MarketTrade.
+    2. Os negócios são somados por vela (recurso, intervalo, início) em memória.
+    3. Cada vela vira um único upsert sobre uq_market_candle_recurso_intervalo_inicio:
+       mantém a abertura, estende máxima/mínima, troca o fechamento e soma volume,
+       valor e número de negócios. As velas nunca são recalculadas a partir do MarketTrade.
+
+    Não faz commit.
+    """
+    if not negocios:
+        return
+
+    now = now or datetime.utcnow()
+    db.session.execute(insert(MarketTrade), [{
+        'order_id': negocio['order_id'],
+        'comprador_id': negocio['comprador_id'],
+        'vendedor_id': negocio['vendedor_id'],
+        'resource_type': negocio['resource_type'],
+        'quantity': negocio['quantity'],
+        'price_per_unit': negocio['price_per_unit'],
+        'total_value': negocio['quantity'] * negocio['price_per_unit'],
+        'imposto': negocio.get('imposto', 0.0),
+        'lado_agressor': negocio['lado_agressor'],
+        'data': now,
+    } for negocio in negocios])
+
+    # Uma linha por vela (um upsert não pode tocar a mesma linha duas vezes no mesmo comando)
+    velas = {}
+    for negocio in negocios:
+        preco, quantidade = negocio['price_per_unit'], negocio['quantity']
+        for intervalo, inicio_de in INTERVALOS_VELA.items():
+            chave = (negocio['resource_type'], intervalo, inicio_de(now))
+            vela = velas.get(chave)
+            if vela is None:
+                velas[chave] = {'resource_type': chave[0], 'intervalo': intervalo, 'inicio': chave[2],
+                                'abertura': preco, 'maxima': preco, 'minima': preco, 'fechamento': preco,
+                                'volume': quantidade, 'valor': quantidade * preco, 'negocios': 1}
+            else:
+                vela['maxima'] = max(vela['maxima'], preco)
+                vela['minima'] = min(vela['minima'], preco)
+                vela['fechamento'] = preco
+                vela['volume'] += quantidade
+                vela['valor'] += quantidade * preco
+                vela['negocios'] += 1
+
+    _somar_velas(list(velas.values()))
+
+def _somar_velas(linhas):
+    """Upsert das velas: mantém a abertura, estende máxima/mínima, troca o fechamento e soma o resto."""
+    tabela = MarketCandle.__table__
+    sql_upsert(db.session, tabela, linhas, ('resource_type', 'intervalo', 'inicio'), lambda novo: {
+        'maxima': case((novo.maxima > tabela.c.maxima, novo.maxima), else_=tabela.c.maxima),
+        'minima': case((novo.minima < tabela.c.minima, novo.minima), else_=tabela.c.minima),
+        'fechamento': novo.fechamento,
+        'volume': tabela.c.volume + novo.volume,
+        'valor': tabela.c.valor + novo.valor,
+        'negocios': tabela.c.negocios + novo.negocios,
+    })
+
+def get_candles(resource_type, intervalo, limite=100):
+    """As 'limite' velas mais recentes de um recurso, em ordem cronológica (intervalos sem negócios não aparecem)."""
+    velas = db.session.execute(
+        select(MarketCandle)
+        .where(MarketCandle.resource_type == resource_type, MarketCandle.intervalo == intervalo)
+        .order_by(MarketCandle.inicio.desc())
+        .limit(limite)
+    ).scalars().all()
+    return list(reversed(velas))
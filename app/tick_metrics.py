@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+
+class PhaseMetrics:
+    """Medições de uma fase do tick (preenchidas pela própria fase)."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.linhas_lidas = 0
+        self.linhas_alteradas = 0
+        self.duracao_ms = 0.0
+        self.commit_ms = 0.0
+        self.erros = 0
+        self.ultimo_erro = None
+
+    def erro(self, e):
+        self.erros += 1
+        self.ultimo_erro = str(e)[:200]
+
+    @contextmanager
+    def commit(self):
+        """Mede o tempo do commit: 'with fase.commit(): db.session.commit()'."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.commit_ms += (time.perf_counter() - inicio) * 1000.0
+
+    def as_dict(self):
+        return {
+            'nome': self.nome,
+            'duracao_ms': round(self.duracao_ms, 2),
+            'commit_ms': round(self.commit_ms, 2),
+            'linhas_lidas': self.linhas_lidas,
+            'linhas_alteradas': self.linhas_alteradas,
+            'erros': self.erros,
+            'ultimo_erro': self.ultimo_erro,
+        }
+
+class TickMetrics:
+    """
+    Instrumentação do tick (run_core_status_updates).
+
+    Cada tick vira um registro com o tempo de cada fase, linhas lidas/alteradas,
+    tempo de commit e erros. Os últimos TICK_METRICS_HISTORY registros ficam em um
+    buffer circular em memória e são espelhados na tabela tick_metrica (também
+    limitada), para que o painel do admin funcione mesmo quando o tick roda em
+    outro processo ('flask run-worker').
+    """
+
+    def __init__(self, tamanho=120):
+        self.app = None
+        self._historico = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.app = app
+        tamanho = app.config.get('TICK_METRICS_HISTORY', self._historico.maxlen)
+        with self._lock:
+            self._historico = deque(self._historico, maxlen=tamanho)
+
+    # ------------------ COLETA ------------------
+    @contextmanager
+    def tick(self):
+        """Agrupa as fases executadas dentro do bloco em um único registro."""
+        registro = {'inicio': datetime.utcnow(), 'fases': []}
+        self._local.registro = registro
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            self._local.registro = None
+            registro['duracao_ms'] = (time.perf_counter() - inicio) * 1000.0
+            self._registrar(registro)
+
+    @contextmanager
+    def fase(self, nome):
+        """
+        Mede uma fase. Dentro de um tick() entra no registro do tick; fora dele
+        (ex: job chamado isoladamente) vira um registro próprio.
+        """
+        metricas = PhaseMetrics(nome)
+        inicio = time.perf_counter()
+        try:
+            yield metricas
+        except Exception as e:
+            metricas.erro(e)
+            raise
+        finally:
+            metricas.duracao_ms = (time.perf_counter() - inicio) * 1000.0
+            registro = getattr(self._local, 'registro', None)
+            if registro is not None:
+                registro['fases'].append(metricas.as_dict())
+            else:
+                self._registrar({'inicio': datetime.utcnow(), 'duracao_ms': metricas.duracao_ms,
+                                 'fases': [metricas.as_dict()]})
+
+    def _registrar(self, registro):
+        registro['erros'] = sum(f['erros'] for f in registro['fases'])
+        with self._lock:
+            self._historico.append(registro)
+        self._persistir(registro)
+
+    def _persistir(self, registro):
+        """Espelha o registro na tabela tick_metrica, mantendo só os mais recentes."""
+        if self.app is None:
+            return
+        from app import db
+        from app.models import TickMetrica
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(insert(TickMetrica).values(
+                        inicio=registro['inicio'],
+                        duracao_ms=registro['duracao_ms'],
+                        erros=registro['erros'],
+                        fases=json.dumps(registro['fases'])
+                    ))
+                    corte = conn.execute(
+                        select(TickMetrica.id).order_by(TickMetrica.id.desc())
+                        .offset(self._historico.maxlen).limit(1)
+                    ).scalar()
+                    if corte is not None:
+                        conn.execute(delete(TickMetrica).where(TickMetrica.id <= corte))
+        except Exception as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Métricas do tick não gravadas: {e}")
+
+    # ------------------ LEITURA ------------------
+    def recent(self, limite=None):
+        """
+        Registros mais recentes primeiro. Usa o buffer deste processo se ele roda
+        o tick; senão lê o espelho no banco (tick em outro processo).
+        """
+        with self._lock:
+            registros = list(reversed(self._historico))
+        if not registros:
+            registros = self._carregar_do_banco()
+        return registros[:limite] if limite else registros
+
+    def _carregar_do_banco(self):
+        from app.models import TickMetrica
+
+        linhas = TickMetrica.query.order_by(TickMetrica.id.desc()).limit(self._historico.maxlen).all()
+        return [{'inicio': linha.inicio, 'duracao_ms': linha.duracao_ms, 'erros': linha.erros,
+                 'fases': json.loads(linha.fases)} for linha in linhas]
+
+    def summary(self, registros):
+        """Média e pior tempo de cada fase nos registros informados."""
+        resumo = {}
+        for registro in registros:
+            for fase in registro['fases']:
+                item = resumo.setdefault(fase['nome'], {'nome': fase['nome'], 'execucoes': 0, 'soma_ms': 0.0,
+                                                        'max_ms': 0.0, 'erros': 0})
+                item['execucoes'] += 1
+                item['soma_ms'] += fase['duracao_ms']
+                item['max_ms'] = max(item['max_ms'], fase['duracao_ms'])
+                item['erros'] += fase['erros']
+        for item in resumo.values():
+            item['media_ms'] = round(item.pop('soma_ms') / item['execucoes'], 2)
+            item['max_ms'] = round(item['max_ms'], 2)
+        return list(resumo.values())
+
+tick_metrics = TickMetrics()
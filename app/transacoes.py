@@ -0,0 +1,77 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, scoped_session
+
+class PendentesDaTransacao:
+    """
+    Itens guardados durante uma transação (histórico, ordens do livro, níveis da
+    escada, prazos do motor de conclusões) que só podem ser usados depois do
+    commit da transação EXTERNA.
+
+    O SQLAlchemy dispara after_commit ao liberar um SAVEPOINT e after_rollback ao
+    desfazê-lo, então cada begin_nested() tem a sua própria coleção: liberado, ela
+    é somada à da transação de fora; desfeito, só ela é descartada. O commit da
+    transação externa entrega tudo a 'ao_confirmar'; o rollback dela descarta tudo.
+
+    'nova' cria uma coleção vazia (list, dict, set) e 'somar(destino, origem)'
+    junta duas coleções (list.extend, dict.update, set.update).
+    """
+
+    def __init__(self, chave, ao_confirmar, nova=list, somar=list.extend):
+        self.chave = chave
+        self.ao_confirmar = ao_confirmar
+        self.nova = nova
+        self.somar = somar
+        event.listen(Session, 'after_commit', self._apos_commit)
+        event.listen(Session, 'after_rollback', self._apos_rollback)
+
+    def atual(self, session):
+        """Coleção da transação (ou SAVEPOINT) em andamento, para acrescentar itens."""
+        if isinstance(session, scoped_session):
+            session = session()
+        transacao = session.get_nested_transaction() or session.get_transaction()
+        return session.info.setdefault(self.chave, {}).setdefault(transacao, self.nova())
+
+    def _apos_commit(self, session):
+        camadas = session.info.get(self.chave)
+        if not camadas:
+            return
+        savepoint = session.get_nested_transaction()
+        if savepoint is not None:
+            # SAVEPOINT liberado: os itens passam para a transação de fora
+            itens = camadas.pop(savepoint, None)
+            if itens:
+                self.somar(camadas.setdefault(savepoint.parent, self.nova()), itens)
+            return
+
+        todos = self.nova()
+        for itens in session.info.pop(self.chave).values():
+            self.somar(todos, itens)
+        if todos:
+            self.ao_confirmar(todos)
+
+    def _apos_rollback(self, session):
+        camadas = session.info.get(self.chave)
+        if not camadas:
+            return
+        savepoint = session.get_nested_transaction()
+        if savepoint is not None:
+            camadas.pop(savepoint, None)
+        else:
+            session.info.pop(self.chave, None)
+
+def habilitar_savepoints_sqlite(engine):
+    """
+    Faz o driver do SQLite (pysqlite) abrir a transação com um BEGIN explícito.
+
+    Por padrão o pysqlite só emite BEGIN antes de INSERT/UPDATE/DELETE: um SAVEPOINT
+    como primeiro comando abre a transação ele mesmo e o RELEASE vira um commit,
+    então o rollback do lote não desfaria o que já foi liberado (ex: _concluir_lote).
+    Receita da documentação do SQLAlchemy ("Serializable isolation / Savepoints").
+    """
+    @event.listens_for(engine, 'connect')
+    def _desligar_begin_do_driver(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _begin_explicito(conn):
+        conn.exec_driver_sql('BEGIN')
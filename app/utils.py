@@ -1,4 +1,6 @@
 from math import radians, sin, cos, sqrt, atan2
+from types import SimpleNamespace
+from sqlalchemy import func, cast, extract, literal, text, Integer, bindparam, insert, select, update
 import locale
 
 def format_currency_python(value, prefix='R$', separator='.'):
@@ -20,3 +22,86 @@ def calculate_distance_km(lat1, lon1, lat2, lon2):
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
     distance = R * c
     return round(distance, 2)
+
+# ------------------ EXPRESSÕES SQL DE DATA (POR DIALETO) ------------------
+# Usadas pelos UPDATEs em massa do background. Suportam sqlite, postgresql e mysql.
+
+SQL_DIALETOS_SUPORTADOS = ('sqlite', 'postgresql', 'mysql')
+
+def sql_seconds_between(dialect_name, inicio, fim):
+    """Expressão SQL com os segundos decorridos entre duas datas (coluna ou valor)."""
+    if dialect_name == 'sqlite':
+        return (func.julianday(fim) - func.julianday(inicio)) * 86400.0
+    if dialect_name == 'postgresql':
+        return extract('epoch', literal(fim) - inicio)
+    if dialect_name == 'mysql':
+        return func.timestampdiff(text('MICROSECOND'), inicio, fim) / 1000000.0
+    raise NotImplementedError(f"Dialeto SQL não suportado: {dialect_name}")
+
+def sql_add_seconds(dialect_name, coluna, segundos):
+    """Expressão SQL que soma uma quantidade (inteira) de segundos a uma coluna de data."""
+    if dialect_name == 'sqlite':
+        # Mantém o formato 'YYYY-MM-DD HH:MM:SS.SSS' (lido normalmente pelo SQLAlchemy)
+        return func.strftime('%Y-%m-%d %H:%M:%f', coluna, func.printf('%+d seconds', segundos))
+    if dialect_name == 'postgresql':
+        return coluna + func.make_interval(0, 0, 0, 0, 0, 0, segundos)
+    if dialect_name == 'mysql':
+        return func.timestampadd(text('SECOND'), segundos, coluna)
+    raise NotImplementedError(f"Dialeto SQL não suportado: {dialect_name}")
+
+def sql_floor_int(dialect_name, expressao):
+    """Trunca uma expressão numérica (não negativa) para inteiro, como o int() do Python."""
+    if dialect_name == 'sqlite':
+        return cast(expressao, Integer)
+    return cast(func.floor(expressao), Integer)
+
+def sql_upsert(session, tabela, linhas, chave, atualizar):
+    """
+    Grava 'linhas' (dicts com as mesmas colunas) em 'tabela' em lote: INSERT das
+    novas e, para as que já existem na restrição única 'chave' (nomes das colunas),
+    UPDATE com os valores de 'atualizar(novo)' ({coluna: expressão}); 'novo.coluna'
+    é o valor que a linha teria no INSERT.
+
+    sqlite/postgresql: INSERT ... ON CONFLICT DO UPDATE; mysql: INSERT ... ON
+    DUPLICATE KEY UPDATE; outros bancos: UPDATE em lote das existentes + INSERT
+    das que faltam. Cada chave deve aparecer uma só vez em 'linhas'.
+    """
+    if not linhas:
+        return
+
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name in ('sqlite', 'postgresql'):
+        if dialect_name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(tabela)
+        stmt = stmt.on_conflict_do_update(index_elements=[tabela.c[coluna] for coluna in chave],
+                                          set_=atualizar(stmt.excluded))
+        session.execute(stmt, linhas)
+        return
+    if dialect_name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as upsert
+        stmt = upsert(tabela)
+        session.execute(stmt.on_duplicate_key_update(atualizar(stmt.inserted)), linhas)
+        return
+
+    existentes = set(session.execute(
+        select(*(tabela.c[coluna] for coluna in chave))
+        .where(*(tabela.c[coluna].in_({linha[coluna] for linha in linhas}) for coluna in chave))
+    ).all())
+    chave_de = lambda linha: tuple(linha[coluna] for coluna in chave)
+    atualizar_linhas = [linha for linha in linhas if chave_de(linha) in existentes]
+    novas = [linha for linha in linhas if chave_de(linha) not in existentes]
+
+    if atualizar_linhas:
+        # Parâmetros com prefixo: nomes iguais aos das colunas virariam SET no UPDATE
+        novo = SimpleNamespace(**{coluna: bindparam('b_' + coluna) for coluna in linhas[0]})
+        stmt = (update(tabela)
+                .where(*(tabela.c[coluna] == getattr(novo, coluna) for coluna in chave))
+                .values(atualizar(novo)))
+        usados = stmt.compile().params.keys()
+        session.execute(stmt, [{'b_' + coluna: valor for coluna, valor in linha.items() if 'b_' + coluna in usados}
+                               for linha in atualizar_linhas])
+    if novas:
+        session.execute(insert(tabela), novas)
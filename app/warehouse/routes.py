@@ -2,7 +2,8 @@ from flask import render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.warehouse import bp
 from app import db
-from app.models import Jogador, Veiculo, ArmazemRecurso, TipoVeiculo, Armazem, TreinamentoAtivo, TransporteAtivo, HistoricoAcao, RecursoNaMina, Regiao
+from app.models import Jogador, Veiculo, ArmazemRecurso, TipoVeiculo, Armazem, TreinamentoAtivo, TransporteAtivo, RecursoNaMina, Regiao
+from app.services.history_service import record_history
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
 from datetime import datetime, timedelta
@@ -212,6 +213,7 @@ def buy_vehicle(tipo_veiculo):
             velocidade=tipo_modelo.velocidade,
             custo_tonelada_km=tipo_modelo.custo_tonelada_km,
             validade_dias=tipo_modelo.validade_dias,
+            data_expiracao=datetime.utcnow() + timedelta(days=tipo_modelo.validade_dias),
             nivel_especializacao_req=tipo_modelo.nivel_especializacao_req
         )
 
@@ -219,14 +221,14 @@ def buy_vehicle(tipo_veiculo):
         descricao_acao = (
             f"Compra de {novo_veiculo.nome}. Custo: R${tipo_modelo.custo_money} e G{tipo_modelo.custo_gold} e {tipo_modelo.custo_ferro} Ferro."
         )
-        hist = HistoricoAcao(
+        record_history(
             jogador_id=jogador.id,
             tipo_acao='VEICULO_COMPRA',
             descricao=descricao_acao,
             dinheiro_delta=-tipo_modelo.custo_money, 
             gold_delta=-tipo_modelo.custo_gold
         )
-        db.session.add_all([hist, novo_veiculo])
+        db.session.add(novo_veiculo)
 
         db.session.commit()
         
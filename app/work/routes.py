@@ -25,7 +25,7 @@ def work_dashboard():
         
     empresas_na_regiao = regiao.empresas.all()
     
-    energia_disponivel = jogador.energia
+    energia_disponivel = jogador.energia_atual
     energia_int = int(energia_disponivel)
     opcoes_energia = list(range(10, energia_int + 1, 10))
     
@@ -24,6 +24,10 @@ class Config:
     SCHEDULER_EXECUTORS = {
         'default': {'type': 'threadpool', 'max_workers': 20}
     }
+    # Por padrão os jobs rodam só no 'flask run-worker' (processo separado); '1' liga nos processos web
+    SCHEDULER_IN_WEB = os.environ.get('SCHEDULER_IN_WEB', '0') == '1'
+    SCHEDULER_LEADER_ELECTION = True   # Com vários workers (gunicorn), só o líder roda os jobs
+    SCHEDULER_LEASE_SECONDS = 30       # Validade da liderança; o líder renova a cada 1/3 desse tempo
     
     # Configurações do Flask-Admin
     FLASK_ADMIN_SWATCH = 'cerulean' # Tema visual
@@ -59,8 +63,31 @@ class Config:
     TEMPO_TRANSPORTE_LOCAL_MIN = 5
     CUSTO_MINIMO_FRETE_LOCAL = 500
     RECURSO_NA_MINA_EXPIRACAO_MIN = 360
+    RECURSO_EXPIRACAO_LOTE = 1000       # Recursos vencidos apagados por DELETE/commit na limpeza
+    VEICULO_EXPIRACAO_LOTE = 1000       # Veículos vencidos apagados por DELETE/commit na checagem
 
     MARKET_ORDER_DURATION_HOURS = 72            # Ordens expiram em 3 dias
+    MARKET_EXPIRY_BATCH = 1000                  # Ordens expiradas por lote (UPDATE/commit) na limpeza
+    MARKET_MATCHING = True                      # Ordens novas são casadas automaticamente com o livro (preço-tempo)
+    MARKET_BOOK_RESCAN_SECONDS = 30             # Varredura das ordens ativas que faltam no livro (commits fora de ordem)
+    MARKET_PAGE_SIZE = 50                       # Ordens por página no mercado (paginação por chave preço/id)
+    MARKET_DEPTH_LEVELS = 10                    # Níveis de preço por lado na escada de profundidade
+    MARKET_DEPTH_TTL_SECONDS = 30               # Recarga completa da escada (mudanças feitas por outros processos)
+
+    MAX_ENERGIA = 200                   # Energia máxima do jogador
+    ENERGIA_POR_MINUTO = 1              # Regeneração base (multiplicada pelo índice de saúde)
+    ENERGY_REGEN_MODE = 'lazy'          # 'bulk' (UPDATE em SQL), 'python' (loop) ou 'lazy' (calculada na leitura)
+    ENERGY_INDEX_TOLERANCE = 0.01       # Variação do índice de saúde que faz o modo 'lazy' gravar a energia dos jogadores da região
+    RESERVE_REFILL_HOURS = 6            # Tempo para uma reserva regional ir de 0 ao máximo (recarga contínua)
+    COMPLETION_ENGINE = 'heap'          # 'heap' (conclusão no prazo exato) ou 'poll' (varredura a cada tick)
+    COMPLETION_ENGINE_HORIZON_SECONDS = 3600  # Prazos carregados no heap ao iniciar; os mais distantes entram pelo reconcile()
+    HISTORY_WRITE_MODE = 'buffered'     # 'buffered' (gravação em lote após o commit) ou 'sync' (INSERT na transação)
+    HISTORY_BATCH_SIZE = 500            # Entradas por INSERT em lote
+    HISTORY_FLUSH_SECONDS = 2.0         # Intervalo máximo até gravar o buffer
+    TICK_METRICS_HISTORY = 120          # Ticks guardados para o painel de métricas (~2 horas)
+    TICK_CHUNK_SIZE = 500               # Conclusões por lote (commit próprio) no tick
+    TICK_CATCHUP_THRESHOLD = 1000       # Conclusões atrasadas que ativam o modo de recuperação (drenagem por prazo)
+    TICK_MAX_TENTATIVAS = 3             # Falhas seguidas até uma conclusão ir para a quarentena (falha_conclusao)
 
     FARMING_COST_MONEY_PER_10_ENERGY = 1000.0   # Custo (R$) para plantar (Regra 1)
     FARMING_GROW_TIME_MINUTES = 60              # Tempo de crescimento (Regra 2)
@@ -0,0 +1,51 @@
+import pytest
+from app import create_app, db
+from app.market_depth import market_depth
+from app.models import Armazem, ArmazemRecurso, Jogador, Regiao
+from app.order_book import order_book
+from config import Config
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SCHEDULER_IN_WEB = False
+        HISTORY_WRITE_MODE = 'sync'
+        COMPLETION_ENGINE = 'poll'
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        # Livro e escada são singletons do processo: cada teste começa do banco vazio
+        order_book.rebuild()
+        market_depth.clear()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def criar_jogador(app):
+    """Cria um jogador com armazém numa região (criada se preciso) e o estoque dado."""
+    def criar(nome, regiao='Centro', dinheiro=100000.0, estoque=None, taxa=0.05):
+        regiao_obj = Regiao.query.filter_by(nome=regiao).first()
+        if regiao_obj is None:
+            regiao_obj = Regiao(nome=regiao, taxa_imposto_geral=taxa)
+            db.session.add(regiao_obj)
+            db.session.flush()
+
+        jogador = Jogador(username=nome, password_hash='x', dinheiro=dinheiro, dinheiro_reservado=0.0,
+                          regiao_atual_id=regiao_obj.id)
+        db.session.add(jogador)
+        db.session.flush()
+
+        armazem = Armazem(jogador_id=jogador.id, regiao_id=regiao_obj.id)
+        db.session.add(armazem)
+        db.session.flush()
+        for tipo, quantidade in (estoque or {}).items():
+            db.session.add(ArmazemRecurso(armazem_id=armazem.id, tipo=tipo, quantidade=quantidade, quantidade_reservada=0.0))
+
+        db.session.commit()
+        return jogador
+    return criar
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import HistoricoAcao, Regiao, TreinamentoAtivo
+from app.services import completion_service
+
+def _treinar(jogador, habilidade, nivel_alvo, now):
+    """Treino (ou melhoria 'armazem_*') já vencido, com o jogador residente na sua região."""
+    jogador.regiao_residencia_id = jogador.regiao_atual_id
+    treino = TreinamentoAtivo(jogador_id=jogador.id, habilidade=habilidade, nivel_alvo=nivel_alvo,
+                              data_fim=now - timedelta(minutes=1))
+    db.session.add(treino)
+    db.session.commit()
+    return treino.id
+
+def _estado(jogador):
+    """Tudo o que a conclusão de um treino altera no jogador, no armazém e no histórico."""
+    db.session.refresh(jogador)
+    db.session.refresh(jogador.armazem)
+    historico = [(h.tipo_acao, h.descricao) for h in HistoricoAcao.query.filter_by(jogador_id=jogador.id)]
+    return (jogador.habilidade_saude, jogador.experiencia, jogador.nivel,
+            jogador.armazem.nivel_capacidade, historico)
+
+def test_conclusao_em_lote_igual_a_uma_a_uma(criar_jogador):
+    now = datetime.utcnow()
+    avulsos = [criar_jogador('avulso_treino', regiao='Centro'), criar_jogador('avulso_melhoria', regiao='Centro')]
+    em_lote = [criar_jogador('lote_treino', regiao='Norte'), criar_jogador('lote_melhoria', regiao='Norte')]
+
+    ids_avulsos = [_treinar(avulsos[0], 'saude', 5.0, now), _treinar(avulsos[1], 'armazem_capacidade', 3, now)]
+    ids_em_lote = [_treinar(em_lote[0], 'saude', 5.0, now), _treinar(em_lote[1], 'armazem_capacidade', 3, now)]
+
+    # Caminho do motor para um prazo isolado (uma a uma) e para prazos que vencem juntos (BULK_HANDLERS)
+    for treino_id in ids_avulsos:
+        assert completion_service.complete_due('treino', treino_id, now)
+    assert sorted(completion_service.complete_due_many('treino', ids_em_lote, now)) == sorted(ids_em_lote)
+    db.session.commit()
+
+    assert TreinamentoAtivo.query.count() == 0
+    for avulso, lote in zip(avulsos, em_lote):
+        assert _estado(avulso) == _estado(lote)
+
+    assert _estado(avulsos[0])[:4] == (5.0, 500.0, 1, 1)
+    assert _estado(avulsos[1])[:4] == (0.0, 500.0, 1, 3)
+
+    # Agregados regionais: só o treino de saúde soma, nos dois caminhos
+    centro, norte = Regiao.query.filter_by(nome='Centro').one(), Regiao.query.filter_by(nome='Norte').one()
+    assert (centro.soma_saude, centro.indices_pendentes) == (norte.soma_saude, norte.indices_pendentes) == (5.0, True)
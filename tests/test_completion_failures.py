@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from flask import url_for
+from app import db
+from app.background_tasks import _concluir_lote, complete_due_entities
+from app.models import FalhaConclusao, TreinamentoAtivo
+from app.services import completion_service
+from tests.test_completion import _treinar
+
+def _quebrar_e_concluir(criar_jogador, now):
+    """Três treinos vencidos no mesmo lote; o do meio é uma melhoria de armazém inexistente."""
+    jogadores = [criar_jogador(nome) for nome in ('primeiro', 'quebrado', 'terceiro')]
+    ids = [_treinar(jogadores[0], 'saude', 5.0, now),
+           _treinar(jogadores[1], 'armazem_inexistente', 2, now),
+           _treinar(jogadores[2], 'educacao', 4.0, now)]
+    itens = [('treino', db.session.get(TreinamentoAtivo, treino_id)) for treino_id in ids]
+    return jogadores, ids, _concluir_lote(itens, now)
+
+def test_falha_isolada_nao_desfaz_o_lote(criar_jogador):
+    now = datetime.utcnow()
+    jogadores, ids, concluidos = _quebrar_e_concluir(criar_jogador, now)
+
+    # O lote (BULK_HANDLERS) falha e cai para uma a uma: só a quebrada é desfeita
+    assert concluidos == {'treino': 2}
+    db.session.expire_all()
+    assert [treino.id for treino in TreinamentoAtivo.query] == [ids[1]]
+    assert (jogadores[0].habilidade_saude, jogadores[2].habilidade_educacao) == (5.0, 4.0)
+    assert jogadores[1].experiencia == 0.0
+
+    falha = FalhaConclusao.query.one()
+    assert (falha.tipo, falha.entidade_id, falha.tentativas) == ('treino', ids[1], 1)
+    assert 'armazem_inexistente' in falha.erro
+
+def test_quarentena_e_liberacao_pelo_admin(app, criar_jogador):
+    now = datetime.utcnow()
+    jogadores, ids, _ = _quebrar_e_concluir(criar_jogador, now)
+
+    # Até TICK_MAX_TENTATIVAS falhas o tick tenta de novo; depois a entidade fica de fora
+    for _ in range(app.config['TICK_MAX_TENTATIVAS'] - 1):
+        complete_due_entities(now + timedelta(minutes=1))
+    falha = FalhaConclusao.query.one()
+    assert falha.tentativas == app.config['TICK_MAX_TENTATIVAS']
+    assert completion_service.em_quarentena('treino', ids[1])
+    assert complete_due_entities(now + timedelta(minutes=2))['treino'] == 0
+    assert db.session.get(FalhaConclusao, falha.id).tentativas == app.config['TICK_MAX_TENTATIVAS']
+
+    # O admin corrige o dado e libera a falha: o próximo tick conclui o treino
+    admin = criar_jogador('admin')
+    admin.is_admin = True
+    treino = db.session.get(TreinamentoAtivo, ids[1])
+    treino.habilidade = 'armazem_capacidade'
+    db.session.commit()
+
+    with app.test_client() as cliente:
+        with cliente.session_transaction() as sessao:
+            sessao['_user_id'] = str(admin.id)
+        with app.test_request_context():
+            url = url_for('manage.release_completion_failure', id=falha.id)
+        assert cliente.post(url).status_code == 302
+
+    db.session.expire_all()
+    assert FalhaConclusao.query.count() == 0
+    assert complete_due_entities(now + timedelta(minutes=3))['treino'] == 1
+    assert TreinamentoAtivo.query.count() == 0
+    assert jogadores[1].armazem.nivel_capacidade == 2
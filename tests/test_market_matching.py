@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import func, select, update
+from app import db
+from app.models import ArmazemRecurso, MarketOrder, MarketTrade, RecursoNaMina
+from app.order_book import order_book
+from app.services import market_service
+
+def _estoque(jogador, tipo='ferro'):
+    return jogador.armazem.recursos.filter_by(tipo=tipo).one()
+
+def _ordens(jogador, order_type):
+    return MarketOrder.query.filter_by(jogador_id=jogador.id, order_type=order_type).order_by(MarketOrder.id).all()
+
+def _ids_no_livro(recurso='ferro', tipo='SELL'):
+    preco_limite = float('inf') if tipo == 'SELL' else 0.0
+    return {entrada.id for entrada in order_book.crossing(recurso, tipo, preco_limite)}
+
+def _ids_ativos():
+    return set(db.session.execute(select(MarketOrder.id).where(MarketOrder.status == 'ACTIVE')).scalars())
+
+def _na_mina(jogador):
+    """{região: quantidade} dos recursos na mina do jogador."""
+    return dict(db.session.execute(
+        select(RecursoNaMina.regiao_id, func.sum(RecursoNaMina.quantidade))
+        .where(RecursoNaMina.jogador_id == jogador.id).group_by(RecursoNaMina.regiao_id)
+    ).all())
+
+def test_execucao_parcial_e_restante_vira_ordem(criar_jogador):
+    vendedor = criar_jogador('vendedor', estoque={'ferro': 50.0})
+    assert market_service.create_sell_order(vendedor, 'ferro', 10.0, 100.0)[0]
+    db.session.commit()
+
+    comprador = criar_jogador('comprador', dinheiro=10000.0)
+    ok, mensagem = market_service.create_buy_order(comprador, 'ferro', 25.0, 120.0)
+    db.session.commit()
+    assert ok, mensagem
+
+    # 10t executadas ao preço da ordem do livro (100), não ao limite do comprador
+    venda = _ordens(vendedor, 'SELL')[0]
+    assert venda.status == 'COMPLETED' and venda.quantity_remaining == pytest.approx(0.0)
+    trade = MarketTrade.query.one()
+    assert (trade.quantity, trade.price_per_unit, trade.lado_agressor) == (10.0, 100.0, 'BUY')
+
+    # Só o restante (15t) entra no livro, com escrow de valor + imposto
+    compra = _ordens(comprador, 'BUY')
+    assert [(ordem.quantity, ordem.price_per_unit, ordem.status) for ordem in compra] == [(15.0, 120.0, 'ACTIVE')]
+    assert comprador.dinheiro == pytest.approx(10000.0 - 1000.0)
+    assert comprador.dinheiro_reservado == pytest.approx(15 * 120.0 * 1.05)
+    assert _na_mina(comprador) == {vendedor.regiao_atual_id: pytest.approx(10.0)}
+
+    assert vendedor.dinheiro == pytest.approx(100000.0 + 1000.0 - 50.0)
+    estoque = _estoque(vendedor)
+    assert (estoque.quantidade, estoque.quantidade_reservada) == (pytest.approx(40.0), pytest.approx(0.0))
+
+    assert order_book.best('ferro') == (120.0, None)
+    assert _ids_no_livro('ferro', 'BUY') | _ids_no_livro('ferro', 'SELL') == _ids_ativos()
+
+def test_nao_negocia_com_as_proprias_ordens(criar_jogador):
+    jogador = criar_jogador('jogador', estoque={'ferro': 20.0})
+    outro = criar_jogador('outro', estoque={'ferro': 20.0})
+    market_service.create_sell_order(jogador, 'ferro', 10.0, 100.0)
+    market_service.create_sell_order(outro, 'ferro', 10.0, 105.0)
+    db.session.commit()
+
+    ok, mensagem = market_service.create_buy_order(jogador, 'ferro', 10.0, 110.0)
+    db.session.commit()
+    assert ok, mensagem
+
+    # A venda mais barata é do próprio jogador: é pulada, e a compra executa a de 'outro'
+    propria = _ordens(jogador, 'SELL')[0]
+    assert propria.status == 'ACTIVE' and propria.quantity_remaining == pytest.approx(10.0)
+    assert _ordens(outro, 'SELL')[0].status == 'COMPLETED'
+    trade = MarketTrade.query.one()
+    assert (trade.comprador_id, trade.vendedor_id, trade.price_per_unit) == (jogador.id, outro.id, 105.0)
+    assert _ordens(jogador, 'BUY') == []
+    assert _ids_no_livro() == {propria.id}
+
+def test_entrada_obsoleta_no_livro_e_descartada(criar_jogador):
+    cancelada_fora = criar_jogador('cancelada', estoque={'ferro': 20.0})
+    vendedor = criar_jogador('vendedor', estoque={'ferro': 20.0})
+    market_service.create_sell_order(cancelada_fora, 'ferro', 10.0, 100.0)
+    market_service.create_sell_order(vendedor, 'ferro', 10.0, 105.0)
+    db.session.commit()
+    obsoleta = _ordens(cancelada_fora, 'SELL')[0].id
+
+    # Outro processo cancela a ordem por SQL: o livro deste processo não fica sabendo
+    db.session.execute(update(MarketOrder).where(MarketOrder.id == obsoleta).values(status='CANCELLED'))
+    db.session.commit()
+    assert obsoleta in _ids_no_livro()
+
+    comprador = criar_jogador('comprador', dinheiro=10000.0)
+    ok, mensagem = market_service.create_buy_order(comprador, 'ferro', 10.0, 110.0)
+    db.session.commit()
+    assert ok, mensagem
+
+    trade = MarketTrade.query.one()
+    assert (trade.vendedor_id, trade.price_per_unit) == (vendedor.id, 105.0)
+    assert db.session.get(MarketOrder, obsoleta).status == 'CANCELLED'
+    assert obsoleta not in _ids_no_livro()
+    assert _ids_no_livro() == _ids_ativos() == set()
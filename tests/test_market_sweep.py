@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import update
+from app import db
+from app.models import ArmazemRecurso, MarketOrder, MarketTrade, RecursoNaMina
+from app.order_book import order_book
+from app.services import market_service
+from tests.test_market_matching import _estoque, _ids_no_livro, _na_mina, _ordens
+
+def _saldos(*jogadores):
+    return {jogador.id: (jogador.dinheiro, jogador.dinheiro_reservado) for jogador in jogadores}
+
+def test_erro_de_escrow_desfaz_a_varredura_inteira(criar_jogador):
+    bom = criar_jogador('bom', estoque={'ferro': 10.0})
+    corrompido = criar_jogador('corrompido', estoque={'ferro': 10.0})
+    market_service.create_sell_order(bom, 'ferro', 10.0, 100.0)
+    market_service.create_sell_order(corrompido, 'ferro', 10.0, 105.0)
+    db.session.commit()
+
+    # O escrow do segundo vendedor some: a varredura não pode executar nem a primeira ordem
+    db.session.execute(update(ArmazemRecurso).where(ArmazemRecurso.armazem_id == corrompido.armazem.id)
+                       .values(quantidade_reservada=0.0))
+    db.session.commit()
+
+    comprador = criar_jogador('comprador', dinheiro=5000.0)
+    antes = _saldos(bom, corrompido, comprador)
+    ok, mensagem = market_service.sweep_orders(comprador, 'ferro', 'BUY', 20.0, 110.0)
+    db.session.commit()
+
+    assert not ok and 'Escrow' in mensagem
+    assert _saldos(bom, corrompido, comprador) == antes
+    assert [(ordem.status, ordem.quantity_remaining) for ordem in MarketOrder.query.order_by(MarketOrder.id)] == \
+        [('ACTIVE', 10.0), ('ACTIVE', 10.0)]
+    assert _estoque(bom).quantidade_reservada == pytest.approx(10.0)
+    assert MarketTrade.query.count() == 0 and RecursoNaMina.query.count() == 0
+    assert len(_ids_no_livro()) == 2
+
+def test_varredura_de_compra_conserva_os_saldos(criar_jogador):
+    centro = criar_jogador('centro', regiao='Centro', taxa=0.05, estoque={'ferro': 30.0})
+    norte = criar_jogador('norte', regiao='Norte', taxa=0.10, estoque={'ferro': 30.0})
+    caro = criar_jogador('caro', regiao='Sul', taxa=0.02, estoque={'ferro': 30.0})
+    market_service.create_sell_order(centro, 'ferro', 10.0, 100.0)
+    market_service.create_sell_order(norte, 'ferro', 10.0, 110.0)
+    market_service.create_sell_order(caro, 'ferro', 10.0, 130.0)
+    db.session.commit()
+
+    comprador = criar_jogador('comprador', regiao='Sul', dinheiro=5000.0)
+    antes = _saldos(centro, norte, caro, comprador)
+    ok, mensagem = market_service.sweep_orders(comprador, 'ferro', 'BUY', 25.0, 120.0)
+    db.session.commit()
+    assert ok, mensagem
+
+    # Executa 100 e 110; a de 130 passa do limite e fica no livro
+    depois = _saldos(centro, norte, caro, comprador)
+    delta = {jogador_id: depois[jogador_id][0] - antes[jogador_id][0] for jogador_id in antes}
+    assert delta[comprador.id] == pytest.approx(-(1000.0 + 1100.0))
+    assert delta[centro.id] == pytest.approx(1000.0 - 50.0)
+    assert delta[norte.id] == pytest.approx(1100.0 - 110.0)
+    assert delta[caro.id] == 0.0
+
+    impostos = db.session.query(db.func.sum(MarketTrade.imposto)).scalar()
+    assert impostos == pytest.approx(160.0)
+    assert sum(delta.values()) == pytest.approx(-impostos)
+
+    # Recursos: saem do escrow de cada vendedor e vão para a mina do comprador, na região da ordem
+    for vendedor in (centro, norte):
+        estoque = _estoque(vendedor)
+        assert (estoque.quantidade, estoque.quantidade_reservada) == (pytest.approx(20.0), pytest.approx(0.0))
+    assert _estoque(caro).quantidade_reservada == pytest.approx(10.0)
+    assert _na_mina(comprador) == {centro.regiao_atual_id: pytest.approx(10.0), norte.regiao_atual_id: pytest.approx(10.0)}
+    assert _ids_no_livro() == {_ordens(caro, 'SELL')[0].id}
+
+def test_varredura_de_venda_conserva_os_saldos(criar_jogador):
+    centro = criar_jogador('centro', regiao='Centro', taxa=0.05, dinheiro=5000.0)
+    norte = criar_jogador('norte', regiao='Norte', taxa=0.10, dinheiro=5000.0)
+    market_service.create_buy_order(centro, 'ferro', 10.0, 100.0)
+    market_service.create_buy_order(norte, 'ferro', 10.0, 90.0)
+    db.session.commit()
+    assert centro.dinheiro_reservado == pytest.approx(1050.0)
+    assert norte.dinheiro_reservado == pytest.approx(990.0)
+
+    vendedor = criar_jogador('vendedor', regiao='Sul', dinheiro=0.0, estoque={'ferro': 30.0})
+    antes = _saldos(centro, norte, vendedor)
+    ok, mensagem = market_service.sweep_orders(vendedor, 'ferro', 'SELL', 15.0, 80.0)
+    db.session.commit()
+    assert ok, mensagem
+
+    # 10t a 100 para 'centro' e 5t a 90 para 'norte'; cada comprador paga valor + imposto do escrow
+    depois = _saldos(centro, norte, vendedor)
+    assert depois[vendedor.id] == (pytest.approx(1000.0 + 450.0), 0.0)
+    assert depois[centro.id] == (pytest.approx(5000.0 - 1050.0), pytest.approx(0.0))
+    assert depois[norte.id] == (pytest.approx(5000.0 - 495.0), pytest.approx(990.0 - 495.0))
+
+    impostos = db.session.query(db.func.sum(MarketTrade.imposto)).scalar()
+    assert impostos == pytest.approx(50.0 + 45.0)
+    assert sum(depois[jogador_id][0] - antes[jogador_id][0] for jogador_id in antes) == pytest.approx(-impostos)
+
+    # Recursos: saem do armazém do vendedor e vão para a mina de cada comprador, na região do vendedor
+    assert _estoque(vendedor).quantidade == pytest.approx(15.0)
+    assert _na_mina(centro) == {vendedor.regiao_atual_id: pytest.approx(10.0)}
+    assert _na_mina(norte) == {vendedor.regiao_atual_id: pytest.approx(5.0)}
+    assert _ordens(norte, 'BUY')[0].quantity_remaining == pytest.approx(5.0)
+    assert _ids_no_livro('ferro', 'BUY') == {_ordens(norte, 'BUY')[0].id}
@@ -0,0 +1,42 @@
+from datetime import datetime
+import pytest
+from app import db
+from app.models import MarketCandle, MarketTrade
+from app.services import market_service, trade_service
+from tests.test_market_matching import _ordens
+
+def _vela(intervalo, inicio):
+    vela = MarketCandle.query.filter_by(resource_type='ferro', intervalo=intervalo, inicio=inicio).one()
+    return (vela.abertura, vela.maxima, vela.minima, vela.fechamento, vela.volume, vela.valor, vela.negocios)
+
+def test_lotes_no_mesmo_minuto_somam_na_mesma_vela(criar_jogador):
+    vendedor = criar_jogador('vendedor', estoque={'ferro': 50.0})
+    comprador = criar_jogador('comprador')
+    market_service.create_sell_order(vendedor, 'ferro', 50.0, 100.0)
+    db.session.commit()
+    ordem_id = _ordens(vendedor, 'SELL')[0].id
+
+    def negocios(*precos_e_quantidades):
+        return [{'order_id': ordem_id, 'comprador_id': comprador.id, 'vendedor_id': vendedor.id,
+                 'resource_type': 'ferro', 'quantity': quantidade, 'price_per_unit': preco,
+                 'imposto': 0.0, 'lado_agressor': 'BUY'} for preco, quantidade in precos_e_quantidades]
+
+    trade_service.record_trades(negocios((100.0, 2.0), (110.0, 1.0)), now=datetime(2026, 1, 5, 12, 0, 10))
+    db.session.commit()
+    trade_service.record_trades(negocios((95.0, 1.0), (105.0, 4.0)), now=datetime(2026, 1, 5, 12, 0, 40))
+    db.session.commit()
+
+    # Abertura do primeiro lote, máxima/mínima estendidas, fechamento do segundo, somas dos dois
+    esperado = (100.0, 110.0, 95.0, 105.0, pytest.approx(8.0), pytest.approx(310.0 + 95.0 + 420.0), 4)
+    assert _vela('1m', datetime(2026, 1, 5, 12, 0)) == esperado
+    assert _vela('1h', datetime(2026, 1, 5, 12, 0)) == esperado
+    assert _vela('1d', datetime(2026, 1, 5)) == esperado
+
+    # Outro minuto: vela nova de 1m; as de 1h e 1d continuam somando
+    trade_service.record_trades(negocios((120.0, 1.0)), now=datetime(2026, 1, 5, 12, 1, 5))
+    db.session.commit()
+    assert _vela('1m', datetime(2026, 1, 5, 12, 1)) == (120.0, 120.0, 120.0, 120.0, 1.0, 120.0, 1)
+    assert _vela('1h', datetime(2026, 1, 5, 12, 0)) == (100.0, 120.0, 95.0, 120.0, pytest.approx(9.0),
+                                                         pytest.approx(945.0), 5)
+    assert MarketCandle.query.count() == 4
+    assert MarketTrade.query.count() == 5